@@ -0,0 +1,83 @@
+"""
+Test de charge local de l'API (hdh_api.py), sans dépendance externe.
+
+Chaque client garde une connexion HTTP/1.1 persistante (keep-alive) et
+rejoue en boucle un jeu de requêtes représentatives.
+
+    uvicorn hdh_api:app --port 8000 --workers 4
+    python benchmarks/bench_api.py --clients 32 --duration 20
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlencode
+
+REQUESTS = [
+    "/search?" + urlencode({"q": "cancer"}),
+    "/search?" + urlencode([("sources", "SNDS"), ("statut", "En cours")]),
+    "/search?" + urlencode([("aires", "Oncologie"), ("annees", 2022), ("annees", 2023)]),
+    "/search?" + urlencode({"q": "diabète", "limit": 200}),
+    "/facets",
+]
+
+
+def run_client(host, port, deadline, latencies, errors, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    local_latencies = []
+    local_errors = 0
+    i = 0
+    while time.perf_counter() < deadline:
+        path = REQUESTS[i % len(REQUESTS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                local_errors += 1
+        except (OSError, http.client.HTTPException):
+            local_errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        local_latencies.append(time.perf_counter() - start)
+    conn.close()
+    with lock:
+        latencies.extend(local_latencies)
+        errors.append(local_errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=run_client, args=(args.host, args.port, deadline, latencies, errors, lock))
+               for _ in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if not latencies:
+        print("Aucune requête réussie")
+        return
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"clients={args.clients} requêtes={len(latencies)} erreurs={sum(errors)}")
+    print(f"débit      : {len(latencies) / args.duration:.1f} req/s")
+    print(f"latence p50: {quantiles[49] * 1000:.1f} ms")
+    print(f"latence p95: {quantiles[94] * 1000:.1f} ms")
+    print(f"latence p99: {quantiles[98] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Temps de construction du jeu de données (enrichissement, vocabulaire des
+facettes, index temporel, index des sources et index du texte) selon le nombre
+de processus, sur un catalogue synthétique.
+
+    python benchmarks/bench_build.py --scale 100
+
+Chaque mesure est comparée au résultat séquentiel (un seul processus) : jeu de
+données, comptages et index doivent être identiques quel que soit le découpage.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from synthetic import synthetic_catalogue
+
+import hdh_engine
+
+
+def check_same_indexes(indexes, reference):
+    temporal, ref_temporal = indexes["temporal"], reference["temporal"]
+    assert np.array_equal(temporal.sorted_ns, ref_temporal.sorted_ns)
+    assert np.array_equal(temporal.row_ids, ref_temporal.row_ids)
+
+    sources, ref_sources = indexes["sources"], reference["sources"]
+    for name in ("labels", "nodes"):
+        merged, expected = getattr(sources, name), getattr(ref_sources, name)
+        assert merged.keys() == expected.keys(), name
+        assert all(np.array_equal(merged[key], expected[key]) for key in expected), name
+
+    text, ref_text = indexes["text"], reference["text"]
+    assert text.terms == ref_text.terms
+    assert np.array_equal(text.doc_freq, ref_text.doc_freq)
+    assert np.array_equal(text._postings.flat, ref_text._postings.flat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=100, help="Taille du catalogue (× export HDH)")
+    parser.add_argument("--workers", type=int, nargs="*",
+                        help="Nombres de processus à mesurer (défaut : 1, 2, 4, … jusqu'au nombre de cœurs)")
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    workers_list = args.workers
+    if not workers_list:
+        workers_list = [1]
+        while workers_list[-1] * 2 <= cpu_count:
+            workers_list.append(workers_list[-1] * 2)
+        if workers_list[-1] != cpu_count:
+            workers_list.append(cpu_count)
+    if workers_list[0] != 1:
+        workers_list = [1] + workers_list  # Référence séquentielle
+
+    raw_df = synthetic_catalogue(args.scale)
+    print(f"Catalogue ×{args.scale} : {len(raw_df)} projets, {cpu_count} cœurs")
+
+    reference = None
+    baseline = None
+    for workers in workers_list:
+        start = time.perf_counter()
+        df, facet_counts, indexes = hdh_engine.build_dataset(raw_df, workers=workers, text_index=True)
+        elapsed = time.perf_counter() - start
+
+        # Le résultat doit être identique quel que soit le découpage
+        if reference is None:
+            reference = (df, facet_counts, indexes)
+        else:
+            assert df["search_text"].equals(reference[0]["search_text"])
+            assert facet_counts == reference[1]
+            check_same_indexes(indexes, reference[2])
+
+        baseline = baseline or elapsed
+        print(f"workers={workers:3d}  {elapsed:8.2f} s  accélération ×{baseline / elapsed:.2f}"
+              f"  ({len(df) / elapsed:,.0f} projets/s)")
+
+
+if __name__ == "__main__":
+    main()
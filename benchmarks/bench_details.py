@@ -0,0 +1,301 @@
+"""
+Exploration des pages détaillées (hdh_details.py) contre un serveur HDH
+simulé en local : vérifications puis débit selon la concurrence.
+
+Le serveur (http.server, HTTP/1.1 keep-alive) sert une page par référence avec
+une latence fixe, répond 404 pour une partie des références et 503 / 429
+(Retry-After) une fois pour d'autres. Le script vérifie :
+  - toutes les pages sont en cache (pages absentes mémorisées), sans échec ;
+  - au plus `concurrency` requêtes simultanées et connexions ouvertes (pool) ;
+  - la limite de débit par hôte est respectée ;
+  - une exploration interrompue (dernière ligne du cache tronquée) reprend
+    sans redemander les pages déjà enregistrées ;
+  - une page dont l'extraction du texte échoue compte comme un échec sans
+    interrompre l'exploration ;
+  - le texte des pages alimente la recherche du moteur au fil de l'exploration.
+
+    python benchmarks/bench_details.py --pages 300 --latency 0.05
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import random_catalogue
+
+import hdh_engine
+
+
+# ==================== SERVEUR SIMULÉ ====================
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        reference = self.path.rsplit("/", 1)[-1]
+        with server.lock:
+            server.requests.append((time.perf_counter(), reference))
+            server.connections.add(self.client_address)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            failures = server.failures.get(reference, 0)
+            if failures:
+                server.failures[reference] = failures - 1
+        try:
+            time.sleep(server.latency)
+            if reference in server.absent:
+                self._send(404, "<html><body>Page introuvable</body></html>")
+            elif failures:
+                self._send(429 if failures % 2 else 503, "", {"Retry-After": "0.05"} if failures % 2 else {})
+            else:
+                self._send(200, page(reference))
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send(self, status, body, headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def marker(reference):
+    """Mot présent uniquement dans la page détaillée de `reference`"""
+    return f"pagedetaillee{reference.lower()}"
+
+
+def page(reference):
+    return (f"<html><head><script>var x = 1;</script></head><body><nav>Menu</nav>"
+            f"<main><h1>Projet {reference}</h1><p>Description détaillée : {marker(reference)}</p></main>"
+            f"<footer>Pied de page</footer></body></html>")
+
+
+def start_server(references, latency, absent_every=20, flaky_every=15):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.absent = set(references[::absent_every])
+    server.failures = {reference: 1 + i % 2 for i, reference in enumerate(references[1::flaky_every])}
+    reset(server)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url_template = f"http://127.0.0.1:{server.server_address[1]}/projets/{{reference}}"
+    return server
+
+
+def reset(server):
+    server.requests = []
+    server.connections = set()
+    server.in_flight = server.max_in_flight = 0
+
+
+# ==================== VÉRIFICATIONS ====================
+def check_crawl(hdh_details, server, references, directory, concurrency, rate):
+    reset(server)
+    cache = hdh_details.PageCache(directory)
+    crawler = hdh_details.DetailCrawler(cache, url_template=server.url_template, concurrency=concurrency,
+                                        rate=rate, backoff=0.05)
+    start = time.perf_counter()
+    stats = crawler.crawl(references)
+    elapsed = time.perf_counter() - start
+
+    assert stats["échecs"] == 0, stats
+    assert set(cache.records) == set(references), "pages manquantes dans le cache"
+    for reference in references:
+        record = cache.records[reference]
+        if reference in server.absent:
+            assert record["status"] == 404 and record["text"] == "", record
+        else:
+            assert marker(reference) in record["text"] and "Menu" not in record["text"], record
+    assert server.max_in_flight <= concurrency, f"{server.max_in_flight} requêtes simultanées"
+    assert len(server.connections) <= concurrency, f"{len(server.connections)} connexions ouvertes"
+    times = sorted(t for t, _ in server.requests)
+    min_duration = (len(times) - 1) / rate
+    assert times[-1] - times[0] >= 0.9 * min_duration, f"débit dépassé : {len(times)} requêtes en {times[-1] - times[0]:.2f} s"
+    print(f"exploration conforme : {len(server.requests)} requêtes ({stats}), {server.max_in_flight} simultanées au plus, "
+          f"{len(server.connections)} connexions, {len(times) / elapsed:.1f} requêtes/s (limite {rate}/s)")
+
+
+def check_resume(hdh_details, server, references, directory):
+    reset(server)
+    half = len(references) // 2
+    crawler = hdh_details.DetailCrawler(hdh_details.PageCache(directory), url_template=server.url_template,
+                                        concurrency=8, rate=0, backoff=0.05)
+    crawler.crawl(references[:half])
+
+    # Interruption pendant l'écriture d'un lot : dernière ligne tronquée
+    path = os.path.join(directory, hdh_details.PAGES_FILENAME)
+    with open(path, "rb") as f:
+        data = f.read()
+    interrupted = json.loads(data.splitlines()[-1])["reference"]
+    with open(path, "wb") as f:
+        f.write(data[:-10])
+
+    reset(server)
+    cache = hdh_details.PageCache(directory)
+    assert len(cache.records) == half - 1, len(cache.records)
+    hdh_details.DetailCrawler(cache, url_template=server.url_template, concurrency=8, rate=0,
+                              backoff=0.05).crawl(references)
+    fetched = {reference for _, reference in server.requests}
+    expected = set(references[half:]) | {interrupted}
+    assert fetched == expected, f"{len(fetched - expected)} page(s) redemandée(s), {len(expected - fetched)} oubliée(s)"
+    assert set(cache.records) == set(references)
+    print(f"reprise conforme : {half - 1} pages reprises du cache, {len(fetched)} récupérées")
+
+
+def check_parse_errors(hdh_details, server, references, directory):
+    """Extraction du texte en échec sur une partie des pages (HTML inattendu)"""
+    reset(server)
+    broken = {reference for reference in references[2::10] if reference not in server.absent}
+    extract_text = hdh_details.extract_text
+
+    def failing_extract(html):
+        if any(marker(reference).encode() in html for reference in broken):
+            raise ValueError("HTML inattendu")
+        return extract_text(html)
+
+    hdh_details.extract_text = failing_extract
+    logging.getLogger(hdh_details.__name__).disabled = True
+    try:
+        cache = hdh_details.PageCache(directory)
+        stats = hdh_details.DetailCrawler(cache, url_template=server.url_template, concurrency=8, rate=0,
+                                          backoff=0.05).crawl(references)
+    finally:
+        hdh_details.extract_text = extract_text
+        logging.getLogger(hdh_details.__name__).disabled = False
+    assert stats["échecs"] == len(broken), stats
+    assert set(cache.records) == set(references) - broken, "pages manquantes après des erreurs d'extraction"
+    print(f"erreurs d'extraction isolées : {len(broken)} pages en échec, {len(cache.records)} enregistrées")
+
+
+def check_write_errors(hdh_details, server, references, directory):
+    """Écriture d'un lot en échec (disque plein) : le lot est compté, l'exploration continue"""
+    reset(server)
+    cache = hdh_details.PageCache(directory)
+    add = cache.add
+    failed = []
+
+    def failing_add(records):
+        if records and not failed:
+            failed.extend(record["reference"] for record in records)
+            raise OSError(28, "No space left on device")
+        add(records)
+
+    cache.add = failing_add
+    logging.getLogger(hdh_details.__name__).disabled = True
+    try:
+        stats = hdh_details.DetailCrawler(cache, url_template=server.url_template, concurrency=8, rate=0,
+                                          backoff=0.05, batch_size=10).crawl(references)
+    finally:
+        logging.getLogger(hdh_details.__name__).disabled = False
+    assert failed and stats["non enregistrées"] == len(failed), stats
+    assert set(cache.records) == set(references) - set(failed), "exploration interrompue par l'échec d'écriture"
+    print(f"échec d'écriture isolé : lot de {len(failed)} pages non enregistré, {len(cache.records)} enregistrées")
+
+
+def check_reader(hdh_details, server, references, directory):
+    """Un lecteur (worker) reprend les pages ajoutées par le constructeur depuis sa dernière lecture"""
+    reset(server)
+    half = len(references) // 2
+    writer = hdh_details.PageCache(directory)
+    crawler = hdh_details.DetailCrawler(writer, url_template=server.url_template, concurrency=8, rate=0,
+                                        backoff=0.05)
+    crawler.crawl(references[:half])
+    reader = hdh_details.PageCache(directory, compact=False)
+    assert set(reader.records) == set(references[:half])
+    crawler.crawl(references)
+    added = reader.refresh()
+    assert added == len(references) - half and reader.records == writer.records, added
+    print(f"lecture par un worker : {half} pages au démarrage, {added} reprises après l'exploration")
+
+
+def check_search(hdh_details, server, engine, references):
+    reset(server)
+    probe = next(reference for reference in references if reference not in server.absent)
+    assert engine.search(query_global=marker(probe)).empty, "marqueur trouvé avant l'exploration"
+
+    crawler = hdh_details.DetailCrawler(hdh_details.get_cache(), url_template=server.url_template,
+                                        concurrency=8, rate=0, backoff=0.05, batch_size=10)
+    start = time.perf_counter()
+    thread = threading.Thread(target=crawler.crawl, args=(references,))
+    thread.start()
+    first_hit = None
+    while thread.is_alive() and first_hit is None:
+        if not engine.search(query_global=marker(probe)).empty:
+            first_hit = time.perf_counter() - start
+        time.sleep(0.01)
+    thread.join()
+    total = time.perf_counter() - start
+
+    found = [reference for reference in references
+             if reference not in server.absent
+             and engine.search(query_global=marker(reference))["Référence"].tolist() == [reference]]
+    assert len(found) == len(references) - len(server.absent & set(references)), f"{len(found)} pages trouvées"
+    hit = f"{first_hit:.2f} s" if first_hit is not None else "après la fin"
+    print(f"recherche enrichie : {len(found)} projets trouvés par le texte de leur page, "
+          f"premier résultat {hit} (exploration complète {total:.2f} s)")
+
+
+def throughput(hdh_details, server, references, concurrency):
+    reset(server)
+    directory = tempfile.mkdtemp(prefix="hdh_bench_details_")
+    try:
+        crawler = hdh_details.DetailCrawler(hdh_details.PageCache(directory), url_template=server.url_template,
+                                            concurrency=concurrency, rate=0, backoff=0.05)
+        start = time.perf_counter()
+        crawler.crawl(references)
+        return len(server.requests) / (time.perf_counter() - start), len(server.connections)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300, help="Nombre de projets (pages)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latence du serveur simulé (secondes)")
+    parser.add_argument("--rate", type=float, default=100.0, help="Limite par hôte pour la vérification (requêtes/s)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="hdh_bench_details_")
+    os.environ["HDH_CACHE_DIR"] = root
+    os.environ["HDH_DETAILS"] = "1"
+    import hdh_details
+
+    try:
+        engine = hdh_engine.SearchEngine.from_raw(random_catalogue(args.pages))
+        references = engine.df["Référence"].astype(str).tolist()
+        server = start_server(references, args.latency)
+
+        check_crawl(hdh_details, server, references, os.path.join(root, "crawl"), concurrency=8, rate=args.rate)
+        check_resume(hdh_details, server, references, os.path.join(root, "resume"))
+        check_parse_errors(hdh_details, server, references, os.path.join(root, "parse"))
+        check_write_errors(hdh_details, server, references, os.path.join(root, "write"))
+        check_reader(hdh_details, server, references, os.path.join(root, "reader"))
+        check_search(hdh_details, server, engine, references)
+
+        print(f"\nDébit (latence {args.latency * 1000:.0f} ms, sans limite de débit)")
+        print(f"{'concurrence':>12} {'pages/s':>10} {'connexions':>11}")
+        for concurrency in args.concurrency:
+            rate, connections = throughput(hdh_details, server, references, concurrency)
+            print(f"{concurrency:>12} {rate:>10.1f} {connections:>11}")
+        server.shutdown()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Débit et pic mémoire de l'export en flux (catalogue complet) par format,
+comparés à une sérialisation en une fois du DataFrame.
+
+    python benchmarks/bench_export.py --scale 100
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+from synthetic import synthetic_catalogue
+
+import hdh_engine
+import hdh_export
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=100, help="Taille du catalogue (× export HDH)")
+    parser.add_argument("--all-columns", action="store_true", help="Exporter tous les champs")
+    args = parser.parse_args()
+
+    df, _, _ = hdh_engine.build_dataset(synthetic_catalogue(args.scale))
+    columns = hdh_export.select_columns(df, args.all_columns)
+    print(f"{len(df)} projets, {len(columns)} colonnes, blocs de {hdh_export.CHUNK_ROWS} lignes")
+
+    _, elapsed, peak = measure(lambda: df[columns].to_csv(index=False).encode("utf-8"))
+    print(f"{'csv en une fois':<22} {len(df) / elapsed:>10.0f} lignes/s  pic {peak / 2 ** 20:8.1f} Mo")
+
+    for fmt in hdh_export.EXPORT_FORMATS:
+        for compress in (False, True):
+            path, elapsed, peak = measure(lambda: hdh_export.write_export(df, None, columns, fmt, compress))
+            size = os.path.getsize(path)
+            os.unlink(path)
+            label = hdh_export.export_filename(fmt, compress, stem="flux ")
+            print(f"{label:<22} {len(df) / elapsed:>10.0f} lignes/s  {size / 2 ** 20 / elapsed:7.1f} Mo/s  "
+                  f"pic {peak / 2 ** 20:8.1f} Mo  fichier {size / 2 ** 20:8.1f} Mo")
+
+
+if __name__ == "__main__":
+    main()
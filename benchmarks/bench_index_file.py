@@ -0,0 +1,202 @@
+"""
+Fichier d'index binaire (hdh_index_file.py) : vérifications, taille sur disque
+et temps de chargement comparés à la reconstruction des index à partir du
+DataFrame (ce que ferait chaque worker sans le fichier).
+
+    python benchmarks/bench_index_file.py --scale 20
+
+Le script s'arrête en erreur si les index relus diffèrent des index construits,
+si une recherche indexée diffère d'un parcours complet de search_text, si un
+fichier altéré n'est pas détecté par les sommes de contrôle (au chargement, ou
+à la première lecture du bloc altéré en vérification différée) ou si le moteur
+ne se replie pas sur un parcours complet quand la recherche lit un bloc altéré.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from synthetic import synthetic_catalogue
+
+import hdh_engine
+import hdh_index_file
+import hdh_indexes
+
+
+def best_of(function, repeat=5):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def sample_queries(terms, n, seed=0):
+    """Mots entiers, sous-chaînes, expressions de plusieurs mots et requêtes sans préfiltre possible"""
+    rng = random.Random(seed)
+    words = [term for term in terms if len(term) > 3]
+    queries = ["cancer", "diabète", "parcours de soins", "covid-19", "a", "e", "(s)", "snds", "zzzzzz", "pmsi mco"]
+    for _ in range(n):
+        word = rng.choice(words)
+        start = rng.randrange(len(word) - 2)
+        queries += [word, word[start:start + 3], f"{word} {rng.choice(words)}"]
+    return queries
+
+
+def check_indexes(built, text_index, loaded):
+    assert np.array_equal(built["temporal"].sorted_ns, loaded["temporal"].sorted_ns)
+    assert np.array_equal(built["temporal"].row_ids, loaded["temporal"].row_ids)
+    for name in ["labels", "nodes"]:
+        expected, actual = getattr(built["sources"], name), getattr(loaded["sources"], name)
+        assert expected.keys() == actual.keys(), name
+        assert all(np.array_equal(expected[key], actual[key]) for key in expected), name
+    assert loaded["text"].terms == text_index.terms
+    assert np.array_equal(loaded["text"].doc_freq, text_index.doc_freq)
+    assert all(np.array_equal(loaded["text"].postings(i), text_index.postings(i))
+               for i in range(len(text_index.terms)))
+
+
+def corrupt(path, directory, position):
+    """Copie de `path` dont l'octet `position` est inversé"""
+    corrupted = os.path.join(directory, "corrompu.hdx")
+    shutil.copyfile(path, corrupted)
+    with open(corrupted, "r+b") as f:
+        f.seek(position)
+        byte = f.read(1)
+        f.seek(position)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    return corrupted
+
+
+def read_all(path):
+    """Charge le fichier en vérification différée puis lit chaque liste du texte"""
+    text = hdh_index_file.load_indexes(path)["text"]
+    for i in range(len(text.terms)):
+        text.postings(i)
+
+
+def check_corruption(path, directory):
+    size = os.path.getsize(path)
+    for position in [3, 40, size // 2, size - 1]:
+        corrupted = corrupt(path, directory, position)
+        for label, load in [("full", lambda: hdh_index_file.load_indexes(corrupted, verify="full")),
+                            ("lazy", lambda: read_all(corrupted))]:
+            try:
+                load()
+            except hdh_index_file.IndexFormatError:
+                continue
+            raise AssertionError(f"altération de l'octet {position} non détectée (verify={label!r})")
+
+
+def check_fallback(path, directory, df, options):
+    """Bloc altéré au milieu des listes du texte : détecté à la recherche qui le lit, résultat inchangé"""
+    _, sections = hdh_index_file.read_index_file(path)
+    post = sections["text.post"]
+    with open(path, "rb") as f:
+        section_start = f.read().find(bytes(post.view))
+    del sections
+    corrupted = corrupt(path, directory, section_start + len(post) // 2)
+    loaded = hdh_index_file.load_indexes(corrupted)
+    offsets = loaded["text"]._postings.offsets
+    query = loaded["text"].terms[int(np.searchsorted(offsets, len(post) // 2, side="right")) - 1]
+    engine = hdh_engine.SearchEngine(df, options, indexes=loaded)
+    expected = np.flatnonzero(df["search_text"].str.contains(query, na=False).to_numpy(dtype=bool))
+    assert np.array_equal(np.sort(engine.plan(query_global=query).row_ids()), expected), query
+    assert loaded["text"].corrupted and engine.text_index() is not loaded["text"], "altération non détectée"
+    # Index reconstruit en arrière-plan, utilisé dès qu'il est prêt
+    building = engine._building.get("text")
+    if building is not None:
+        building.join()
+    assert engine.text_index() is not None
+    assert np.array_equal(np.sort(engine.plan(query_global=query).row_ids()), expected), query
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=20, help="Taille du catalogue (× export HDH)")
+    parser.add_argument("--queries", type=int, default=30, help="Nombre de mots tirés pour les requêtes")
+    args = parser.parse_args()
+    # Requêtes comme « (s) » : expressions régulières à groupes, comme dans l'application
+    warnings.filterwarnings("ignore", "This pattern is interpreted as a regular expression")
+
+    # Varint : valeurs limites
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2 ** 21, 2 ** 28, 2 ** 32 - 1], dtype=np.uint64)
+    assert np.array_equal(hdh_index_file.decode_varints(hdh_index_file.encode_varints(values)[0].tobytes()), values)
+
+    engine = hdh_engine.SearchEngine.from_raw(synthetic_catalogue(args.scale), text_index=True)
+    df = engine.df
+    print(f"{len(df)} projets")
+
+    # Reconstruction complète (worker sans fichier d'index)
+    rebuild_time, _ = best_of(lambda: (hdh_engine.SearchEngine.build_indexes(df),
+                                       hdh_indexes.TextIndex.build(df["search_text"])), repeat=3)
+    text_index = engine.text_index()
+
+    directory = tempfile.mkdtemp(prefix="hdh_bench_index_")
+    try:
+        path = os.path.join(directory, "index.hdx")
+        write_time, size = best_of(lambda: hdh_index_file.write_indexes(path, engine), repeat=3)
+
+        loaded = hdh_index_file.load_indexes(path)
+        check_indexes(engine.indexes, text_index, loaded)
+        check_corruption(path, directory)
+        check_fallback(path, directory, df, engine.options)
+        print("index relus identiques aux index construits ; altérations détectées ; repli sur parcours complet")
+
+        # Recherche indexée = parcours complet de search_text
+        indexed = hdh_engine.SearchEngine(df, engine.options, indexes=loaded)
+        queries = sample_queries(text_index.terms, args.queries)
+        scan_times, index_times = [], []
+        for query in queries:
+            start = time.perf_counter()
+            expected = np.flatnonzero(df["search_text"].str.contains(query.lower(), na=False).to_numpy(dtype=bool))
+            scan_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            actual = indexed.plan(query_global=query).row_ids()
+            index_times.append(time.perf_counter() - start)
+            assert np.array_equal(np.sort(actual), expected), f"{query!r} : {len(actual)} au lieu de {len(expected)}"
+        print(f"{len(queries)} requêtes identiques au parcours complet ; "
+              f"temps moyen {np.mean(scan_times) * 1000:.2f} ms (parcours) / {np.mean(index_times) * 1000:.2f} ms (index)")
+
+        # Taille sur disque
+        n_postings = int(text_index.doc_freq.sum())
+        dictionary_bytes = sum(len(term.encode("utf-8")) for term in text_index.terms)
+        _, sections = hdh_index_file.read_index_file(path)
+        print(f"\nfichier : {size / 2 ** 20:.2f} Mo")
+        print(f"  {'section':<16} {'taille':>10}")
+        for name, data in sections.items():
+            print(f"  {name:<16} {len(data) / 1024:>8.1f}Ko")
+        n_blocks = sum(len(data.block_crcs) for data in sections.values())
+        print(f"sommes de contrôle : {n_blocks} blocs de {hdh_index_file.BLOCK_SIZE // 1024} Ko ({n_blocks * 4} octets)")
+        print(f"listes du texte : {len(sections['text.post']) / 2 ** 20:.2f} Mo en varint "
+              f"({n_postings / 2 ** 20 * 4:.2f} Mo en uint32, {len(sections['text.post']) / n_postings:.2f} octet/ligne)")
+        print(f"dictionnaire : {len(sections['text.dict']) / 1024:.0f} Ko avec préfixes communs "
+              f"({dictionary_bytes / 1024:.0f} Ko de mots, {len(text_index.terms)} mots)")
+        del sections
+
+        # Temps de chargement (fichier dans le cache de pages)
+        lazy_time, _ = best_of(lambda: hdh_index_file.load_indexes(path))
+        full_time, _ = best_of(lambda: hdh_index_file.load_indexes(path, verify="full"))
+        unverified_time, _ = best_of(lambda: hdh_index_file.load_indexes(path, verify=None))
+        first_query, _ = best_of(
+            lambda: hdh_engine.SearchEngine(df, engine.options,
+                                            indexes=hdh_index_file.load_indexes(path)).plan(query_global="cancer").row_ids())
+        print(f"\n{'':<44} {'temps':>10}")
+        print(f"{'reconstruction (découpage + listes)':<44} {rebuild_time * 1000:>8.1f}ms")
+        print(f"{'écriture du fichier':<44} {write_time * 1000:>8.1f}ms")
+        print(f"{'chargement, en-tête et tables vérifiés':<44} {lazy_time * 1000:>8.1f}ms")
+        print(f"{'chargement, tous les blocs vérifiés (full)':<44} {full_time * 1000:>8.1f}ms")
+        print(f"{'chargement, sans vérification (None)':<44} {unverified_time * 1000:>8.1f}ms")
+        print(f"{'chargement + première recherche':<44} {first_query * 1000:>8.1f}ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Normalisation des libellés : vérification des règles compilées
+(normalization_rules.json) par rapport aux sorties de référence, puis temps
+par valeur comparé aux anciennes substitutions successives.
+
+    python benchmarks/bench_normalize.py --scale 20
+
+Le script s'arrête en erreur si une sortie diffère de la référence : cas de
+référence ci-dessous, puis toutes les valeurs du catalogue synthétique.
+"""
+import argparse
+import re
+import time
+
+from synthetic import synthetic_catalogue
+
+import hdh_indexes
+import hdh_normalize
+
+# Entrée -> (clean_value, normalize_autres, catégorie) attendus (sorties des fonctions d'origine)
+GOLDEN = {
+    "Autre(s)": ("Autres", "Autres)", "Autres"),
+    "autres": ("Autres", "Autres", "Autres"),
+    "Autre (s)": ("Autres", "Autres (s)", "Autres"),
+    "Autre(s))": ("Autres)", "Autres))", "Autres"),
+    "Autres)": ("Autres", "Autres)", "Autres"),
+    "Autres) maladies": ("Autres maladies", "Autres) maladies", "Autres"),
+    "Oncologie, autre": ("Oncologie, Autres", "Oncologie, Autres", "Autres"),
+    "Enquête(s)": ("Enquêtes)", "Enquête(s)", None),
+    "Enquête)": ("Enquêtes)", "Enquête)", None),
+    "enquetes": ("Enquêtes", "enquetes", None),
+    "Bases des causes médicales de décès (CépiDC)": ("Causes médicales de décès",
+                                                     "Bases des causes médicales de décès (CépiDC)", None),
+    "Echantillon du ENSD": ("ESND", "Echantillon du ENSD", None),
+    "SNDS, Autre(s)": ("SNDS, Autres", "SNDS, Autres)", "SNDS"),
+    "HDH - Autre(s) source(s)": ("HDH - Autres source(s)", "HDH - Autres) source(s)", "HDH"),
+    "Données de registre": ("Données de registre", "Données de registre", None),
+}
+
+
+# ==================== IMPLÉMENTATIONS D'ORIGINE (RÉFÉRENCE) ====================
+def legacy_clean(text_str):
+    text_str = re.sub(r'Bases?\s+des?\s+causes?\s+médicales?\s+de\s+décès\s*\(CépiDC\)',
+                      'Causes médicales de décès', text_str, flags=re.IGNORECASE)
+    text_str = re.sub(r'Echantillon\s+du\s+ENSD', 'ESND', text_str, flags=re.IGNORECASE)
+    text_str = re.sub(r'\benqu[êe]te(?:\s*\(?s\)?|\s*s)?\b', 'Enquêtes', text_str, flags=re.IGNORECASE)
+    text_str = re.sub(r'\bautre(?:\s*\(?s\)?|\s*s)?\b', 'Autres', text_str, flags=re.IGNORECASE)
+    text_str = re.sub(r'\b(Enquête|Autres)\)', r'\1', text_str, flags=re.IGNORECASE)
+    return text_str
+
+
+def legacy_autres(text_str):
+    text_str = re.sub(r'\bAutres\)\b', 'Autres', text_str, flags=re.IGNORECASE)
+    text_str = re.sub(r'\bAutre\(?\s*s\)?\b', 'Autres', text_str, flags=re.IGNORECASE)
+    text_str = re.sub(r'\bautres?\b', 'Autres', text_str, flags=re.IGNORECASE)
+    return text_str
+
+
+def legacy_category(text):
+    if re.search(r'\bSNDS\b', text, re.IGNORECASE):
+        return "SNDS"
+    if re.search(r'\bHDH\b', text, re.IGNORECASE):
+        return "HDH"
+    if re.search(r'\bAutre\(?\s*s\)?\b|\bautres?\b', text, re.IGNORECASE):
+        return "Autres"
+    return None
+
+
+def legacy_is_snds_component(name):
+    keywords = ["dcir", "pmsi", "esnd", "causes médicales de décès", "certificats de décès", "rniam"]
+    return any(keyword in name.lower() for keyword in keywords)
+
+
+def check(values, rules, taxonomy):
+    failures = []
+    for value in values:
+        expected = (legacy_clean(value), legacy_autres(value), legacy_category(value),
+                    legacy_is_snds_component(value))
+        actual = (rules.apply("valeurs", value), rules.apply("autres", value), rules.category(value),
+                  taxonomy.is_component("SNDS", value))
+        if actual != expected:
+            failures.append((value, expected, actual))
+    return failures
+
+
+def timed(function, values, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for value in values:
+            function(value)
+        best = min(best, time.perf_counter() - start)
+    return best / max(len(values), 1) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=20, help="Taille du catalogue (× export HDH)")
+    args = parser.parse_args()
+
+    rules = hdh_normalize.get_rules()
+    taxonomy = hdh_indexes.get_taxonomy()
+
+    # Cas de référence
+    for value, expected in GOLDEN.items():
+        actual = (rules.apply("valeurs", value), rules.apply("autres", value), rules.category(value))
+        assert actual == expected, f"{value!r} : attendu {expected}, obtenu {actual}"
+    print(f"{len(GOLDEN)} cas de référence conformes")
+
+    # Valeurs du catalogue (parties séparées par des virgules, comme dans l'enrichissement)
+    raw_df = synthetic_catalogue(args.scale)
+    columns = ["Source de données utilisées", "Composante(s) de la base principale du SNDS mobilisée(s)",
+               "Base(s) du catalogue du HDH mobilisée(s)", "Autre(s) source(s) de donnée(s) mobilisée(s)",
+               "Domaines médicaux investigués", "Finalité de l'étude", "Objectifs poursuivis"]
+    values = []
+    for col in columns:
+        if col in raw_df.columns:
+            for cell in raw_df[col].dropna().astype(str).tolist():
+                values.append(cell)
+                values.extend(part.strip() for part in cell.split(","))
+    failures = check(values, rules, taxonomy)
+    for value, expected, actual in failures[:10]:
+        print(f"ÉCART {value!r} : attendu {expected}, obtenu {actual}")
+    assert not failures, f"{len(failures)} valeur(s) différente(s)"
+    print(f"{len(values)} valeurs du catalogue conformes")
+
+    # Temps par valeur
+    print(f"{'fonction':<22} {'origine':>10} {'règles':>10}")
+    for label, legacy, compiled in [
+        ("clean_value", legacy_clean, lambda v: rules.apply("valeurs", v)),
+        ("normalize_autres", legacy_autres, lambda v: rules.apply("autres", v)),
+        ("catégorie", legacy_category, rules.category),
+        ("composante SNDS", legacy_is_snds_component, lambda v: taxonomy.is_component("SNDS", v)),
+    ]:
+        print(f"{label:<22} {timed(legacy, values):>8.2f}µs {timed(compiled, values):>8.2f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+"""
+Test de charge de l'application Streamlit (hdh_code_web.py) : N sessions
+simultanées d'un même serveur rejouent en parallèle un parcours utilisateur
+réaliste.
+
+Le script lance un serveur `streamlit run hdh_code_web.py` puis y connecte N
+clients (un thread chacun) par le websocket du navigateur (/_stcore/stream),
+avec les messages protobuf de Streamlit : chaque interaction envoie l'état des
+widgets modifiés et attend la fin de l'exécution du script. Les sessions
+partagent donc le processus du serveur, ses caches (st.cache_resource, moteur de
+recherche, ResultCache) et son CPU, comme des utilisateurs réels. Les sessions
+chargent d'abord l'application, puis rejouent ensemble le parcours : saisie
+d'une requête, sélection d'une source, ouverture d'un article
+(« 👁️ Visualiser »), export Excel, fermeture de l'article ; les sections
+construites à la demande (visualisation, export) sont ouvertes au passage.
+
+Une session en erreur (exception affichée, connexion perdue, délai dépassé) est
+reconstruite sur une nouvelle connexion ; après MAX_RESTARTS reconstructions
+elle s'arrête. Le rapport donne, pour chaque nombre de sessions, les
+percentiles de latence par interaction, le débit, les erreurs (avec un exemple
+de chaque), le CPU du serveur et sa mémoire (PSS) au début, au maximum et à la
+fin du palier : le serveur n'est pas relancé entre les paliers, la croissance
+de sa mémoire sous charge reste visible.
+
+Les données viennent du fichier de secours (HDH_OFFLINE=1, sans scraping) ;
+sans fichier de secours, un catalogue synthétique est publié comme instantané.
+Le client utilise le paquet websockets (installé avec uvicorn[standard]).
+
+    python benchmarks/bench_sessions.py --sessions 1 2 4 8 16 --duration 30
+"""
+import argparse
+import contextlib
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import urllib.request
+from collections import defaultdict
+
+import streamlit as st
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.exceptions import WebSocketException
+from websockets.sync.client import connect
+
+from synthetic import random_catalogue
+
+import hdh_engine
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hdh_code_web.py")
+QUERIES = ["cancer", "diabète", "cohorte", "covid", "parcours de soins", "médicament", "hospitalisation"]
+# Reconstructions d'une session en erreur avant de l'arrêter
+MAX_RESTARTS = 3
+# Avant Streamlit 1.45, selectbox et multiselect transmettent des positions, ensuite les options affichées
+STRING_OPTIONS = tuple(int(part) for part in st.__version__.split(".")[:2]) >= (1, 45)
+
+
+# ==================== DONNÉES ====================
+def prepare_data(synthetic_rows):
+    """Fichier de secours si présent, sinon instantané synthétique (HDH_SNAPSHOT_DIR)"""
+    os.environ["HDH_OFFLINE"] = "1"
+    fallback = os.path.join(os.path.dirname(APP_PATH), hdh_engine.FALLBACK_FILENAME)
+    if os.path.exists(fallback) and not synthetic_rows:
+        return f"fichier de secours {hdh_engine.FALLBACK_FILENAME}"
+
+    import hdh_snapshot
+
+    directory = tempfile.mkdtemp(prefix="hdh_bench_sessions_")
+    engine = hdh_engine.SearchEngine.from_raw(random_catalogue(synthetic_rows or 5000))
+    hdh_snapshot.publish_snapshot(engine, directory)
+    os.environ["HDH_SNAPSHOT_DIR"] = directory
+    return f"catalogue synthétique ({len(engine.df)} projets, instantané {directory})"
+
+
+# ==================== SERVEUR ====================
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, log_path, timeout):
+    """Lance `streamlit run` sur `port` et attend qu'il réponde ; retourne le processus"""
+    log = open(log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless=true", f"--server.port={port}",
+         "--server.address=127.0.0.1", "--browser.gatherUsageStats=false", "--server.fileWatcherType=none"],
+        stdout=log, stderr=subprocess.STDOUT, cwd=os.path.dirname(APP_PATH))
+    log.close()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Le serveur Streamlit s'est arrêté (code {server.returncode}), voir {log_path}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit(f"Le serveur Streamlit ne répond pas après {timeout:.0f} s, voir {log_path}")
+
+
+# ==================== MESURES SYSTÈME ====================
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def process_cpu(pid):
+    """Temps CPU (secondes) d'un processus, d'après /proc (Linux) ; None si indisponible"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_memory(pid):
+    """Mémoire d'un processus : PSS si disponible (pages partagées réparties), sinon RSS ; octets"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class ResourceSampler(threading.Thread):
+    """
+    Échantillonne toutes les `interval` secondes le CPU cumulé (en % d'un cœur)
+    et la mémoire totale des processus `pids`
+    """
+
+    def __init__(self, pids, interval=0.5):
+        super().__init__(daemon=True)
+        self.pids = list(pids)
+        self.interval = interval
+        self.cpu = []
+        self.memory = []
+        self._stop_event = threading.Event()
+
+    def _cpu_total(self):
+        values = [process_cpu(pid) for pid in self.pids]
+        return sum(value for value in values if value is not None)
+
+    def memory_total(self):
+        values = [process_memory(pid) for pid in self.pids]
+        return sum(value for value in values if value is not None)
+
+    def run(self):
+        last_cpu, last_wall = self._cpu_total(), time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            cpu, wall = self._cpu_total(), time.perf_counter()
+            self.cpu.append((cpu - last_cpu) / (wall - last_wall) * 100)
+            self.memory.append(self.memory_total())
+            last_cpu, last_wall = cpu, wall
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# ==================== CLIENT WEBSOCKET ====================
+class ScriptError(Exception):
+    """Exécution du script terminée par une exception affichée dans la page"""
+
+
+class Client:
+    """
+    Une session du serveur, pilotée comme le navigateur : chaque exécution
+    envoie l'état des widgets modifiés (les autres gardent leur valeur côté
+    serveur) et reçoit les éléments de la page jusqu'à la fin du script
+    """
+
+    def __init__(self, url, timeout):
+        self.timeout = timeout
+        self._stack = contextlib.ExitStack()
+        self.websocket = self._stack.enter_context(connect(url, max_size=None, open_timeout=timeout))
+        self.elements = {}   # identifiant -> élément (widgets de la dernière exécution)
+        self.values = {}     # identifiant -> valeur envoyée (interrupteurs)
+
+    def close(self):
+        self._stack.close()
+
+    def run(self, states=()):
+        """Exécute le script avec l'état `states` (WidgetState) ; lève ScriptError si la page affiche une exception"""
+        message = BackMsg()
+        message.rerun_script.widget_states.widgets.extend(states)
+        self.websocket.send(message.SerializeToString())
+        deadline = time.monotonic() + self.timeout
+        errors = []
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(self.websocket.recv(timeout=max(deadline - time.monotonic(), 0.001)))
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                # Début d'une exécution (y compris après st.rerun()) : nouvelle page
+                self.elements, errors = {}, []
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type == "exception":
+                    errors.append(element.exception.message or element.exception.type)
+                elif element_type and getattr(getattr(element, element_type), "id", ""):
+                    self.elements[getattr(element, element_type).id] = element
+            elif kind == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    errors.append("erreur de compilation du script")
+                if errors:
+                    raise ScriptError(errors[0])
+                return
+
+    def widget(self, element_type, key=None, label=None):
+        """(identifiant, proto) du widget de type `element_type` par clé ou libellé ; None si absent"""
+        for element_id, element in self.elements.items():
+            if element.WhichOneof("type") != element_type:
+                continue
+            proto = getattr(element, element_type)
+            if (key is not None and element_id.endswith(f"-{key}")) or (label is not None and proto.label == label):
+                return element_id, proto
+        return None
+
+    def text(self, key, value):
+        found = self.widget("text_input", key=key)
+        return found and WidgetState(id=found[0], string_value=value)
+
+    def toggle(self, key):
+        """Ouvre l'interrupteur `key` s'il est fermé"""
+        found = self.widget("checkbox", key=key)
+        if found is None or self.values.get(found[0], found[1].default):
+            return None
+        self.values[found[0]] = True
+        return WidgetState(id=found[0], bool_value=True)
+
+    def select(self, key, index=None, option=None):
+        found = self.widget("selectbox", key=key)
+        if found is None:
+            return None
+        options = list(found[1].options)
+        index = options.index(option) if option is not None else index
+        if STRING_OPTIONS:
+            return WidgetState(id=found[0], string_value=options[index])
+        return WidgetState(id=found[0], int_value=index)
+
+    def multiselect(self, key, index):
+        found = self.widget("multiselect", key=key)
+        if found is None:
+            return None
+        state = WidgetState(id=found[0])
+        if STRING_OPTIONS:
+            state.string_array_value.data.append(found[1].options[index])
+        else:
+            state.int_array_value.data.append(index)
+        return state
+
+    def click(self, label):
+        found = self.widget("button", label=label)
+        return found and WidgetState(id=found[0], trigger_value=True)
+
+
+# ==================== PARCOURS D'UNE SESSION ====================
+def interactions(client, iteration):
+    """
+    Interactions du parcours : (nom, fonction retournant les états de widgets à
+    envoyer) ; la fonction retourne None si un élément est absent (aucun
+    résultat, article déjà ouvert...)
+    """
+    def states(*values):
+        return list(values) if all(values) else None
+
+    def query():
+        return states(client.text("search_global", QUERIES[iteration % len(QUERIES)]))
+
+    def source():
+        found = client.widget("multiselect", key="sources_filter")
+        options = [i for i, label in enumerate(found[1].options) if label != "TOUT"] if found else []
+        if not options:
+            return None
+        return states(client.multiselect("sources_filter", options[iteration % len(options)]),
+                      client.click("🔍 Rechercher"))
+
+    def article():
+        found = client.widget("selectbox", key="article_selector")
+        if found is None or len(found[1].options) < 2:
+            return None
+        return states(client.select("article_selector", index=1 + iteration % (len(found[1].options) - 1)))
+
+    return [("requête", query), ("source", source),
+            ("ouvrir la fiche", lambda: states(client.toggle("show_article_viewer"))),
+            ("article", article), ("visualiser", lambda: states(client.click("👁️ Visualiser"))),
+            ("ouvrir l'export", lambda: states(client.toggle("show_export"))),
+            ("export Excel", lambda: states(client.select("export_choice", option="Excel (.xlsx)"),
+                                            client.click("Préparer l'export"))),
+            ("fermer", lambda: states(client.click("❌ Fermer")))]
+
+
+def _describe(exception):
+    if isinstance(exception, ScriptError):
+        return str(exception)
+    return traceback.format_exception_only(type(exception), exception)[-1].strip()
+
+
+class Session:
+    """Une session du serveur ; reconstruite (nouvelle connexion) après une erreur"""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.samples = {}
+        self.restarts = 0
+        self.client = None
+
+    def error(self, name, exception):
+        self.errors[name] += 1
+        self.samples.setdefault(name, _describe(exception))
+
+    def close(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            except (OSError, WebSocketException):
+                pass
+            self.client = None
+
+    def load(self):
+        """Nouvelle session (connexion et premier rendu) ; False si le rendu échoue"""
+        self.close()
+        start = time.perf_counter()
+        try:
+            self.client = Client(self.url, self.timeout)
+            self.client.run()
+        except (ScriptError, OSError, TimeoutError, WebSocketException) as e:
+            self.error("chargement", e)
+            return False
+        self.latencies["chargement"].append(time.perf_counter() - start)
+        return True
+
+    def restart(self):
+        """Reconstruit la session ; False quand MAX_RESTARTS est atteint"""
+        while self.restarts < MAX_RESTARTS:
+            self.restarts += 1
+            if self.load():
+                return True
+        return False
+
+    def step(self, name, action):
+        """Une interaction ; None si l'élément est absent, sinon True (succès) ou False (erreur)"""
+        states = action()
+        if states is None:
+            return None
+        start = time.perf_counter()
+        try:
+            self.client.run(states)
+        except (ScriptError, OSError, TimeoutError, WebSocketException) as e:
+            self.error(name, e)
+            return False
+        self.latencies[name].append(time.perf_counter() - start)
+        return True
+
+    def play(self, deadline):
+        iteration = 0
+        while time.time() < deadline:
+            played = False
+            for name, action in interactions(self.client, iteration):
+                if time.time() >= deadline:
+                    break
+                result = self.step(name, action)
+                if result is False:
+                    # État de la session incertain après une erreur : nouvelle session
+                    if not self.restart():
+                        return
+                    break
+                played = played or result
+            else:
+                if not played:
+                    # Aucun élément du parcours disponible : nouvelle session plutôt qu'une boucle à vide
+                    self.error("parcours", ScriptError("aucune interaction possible"))
+                    if not self.restart():
+                        return
+            iteration += 1
+
+
+def run_session(session, ready, start):
+    """Thread d'une session : chargement, attente des autres sessions, parcours jusqu'à l'échéance"""
+    try:
+        loaded = session.load() or session.restart()
+        ready.wait()
+        if loaded:
+            session.play(start[0])
+    except threading.BrokenBarrierError:  # Lancement abandonné par le thread principal
+        pass
+    except Exception as e:  # Erreur du client lui-même : la session s'arrête, les autres continuent
+        session.error("client", e)
+        session.restarts = MAX_RESTARTS
+    finally:
+        session.close()
+
+
+def run_level(url, server, n_sessions, duration, timeout):
+    """
+    Connecte `n_sessions` clients au serveur ; retourne (latences par interaction,
+    erreurs par interaction, exemples d'erreurs, reconstructions, sessions arrêtées,
+    échantillonneur, mémoire du serveur au début et à la fin)
+    """
+    sessions = [Session(url, timeout) for _ in range(n_sessions)]
+    start = [None]
+    # Échéance fixée quand toutes les sessions ont chargé l'application, avant de les libérer
+    ready = threading.Barrier(n_sessions + 1, action=lambda: start.__setitem__(0, time.time() + duration))
+    threads = [threading.Thread(target=run_session, args=(session, ready, start), daemon=True)
+               for session in sessions]
+    for thread in threads:
+        thread.start()
+    try:
+        ready.wait(timeout * (MAX_RESTARTS + 1))  # Toutes les sessions ont chargé l'application
+    except threading.BrokenBarrierError:
+        raise SystemExit(f"Les {n_sessions} sessions n'ont pas chargé l'application à temps")
+
+    sampler = ResourceSampler([server.pid])
+    memory_start = sampler.memory_total()
+    sampler.start()
+    for thread in threads:
+        # Une interaction en cours à l'échéance peut durer jusqu'au délai d'exécution du script
+        thread.join(timeout=max(start[0] - time.time(), 0) + timeout * (MAX_RESTARTS + 1))
+    blocked = sum(thread.is_alive() for thread in threads)
+    if blocked:
+        print(f"  {blocked} session(s) toujours en cours (serveur bloqué ?)")
+    sampler.stop()
+    memory_end = sampler.memory_total()
+
+    latencies, errors, samples = defaultdict(list), defaultdict(int), {}
+    for session in sessions:
+        for name, values in session.latencies.items():
+            latencies[name].extend(values)
+        for name, count in session.errors.items():
+            errors[name] += count
+        for name, message in session.samples.items():
+            samples.setdefault(name, message)
+    restarts = sum(min(session.restarts, MAX_RESTARTS) for session in sessions)
+    stopped = sum(session.restarts >= MAX_RESTARTS for session in sessions)
+    return latencies, errors, samples, restarts, stopped, sampler, (memory_start, memory_end)
+
+
+def percentile(values, q):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=20.0, help="Durée de chaque palier (secondes)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Délai maximal d'une exécution du script")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Utiliser un catalogue synthétique de N projets au lieu du fichier de secours")
+    args = parser.parse_args()
+
+    print(f"Données : {prepare_data(args.synthetic)}")
+    port = free_port()
+    log_path = os.path.join(tempfile.gettempdir(), f"hdh_bench_sessions_{port}.log")
+    server = start_server(port, log_path, args.timeout)
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    print(f"Serveur : port {port} (journal {log_path})")
+
+    try:
+        for n_sessions in args.sessions:
+            latencies, errors, samples, restarts, stopped, sampler, (memory_start, memory_end) = \
+                run_level(url, server, n_sessions, args.duration, args.timeout)
+            n_interactions = sum(len(values) for name, values in latencies.items() if name != "chargement")
+            cpu = statistics.mean(sampler.cpu) if sampler.cpu else 0.0
+            memory = (f"{memory_start / 2 ** 20:.0f} → max {max(sampler.memory + [memory_end]) / 2 ** 20:.0f} "
+                      f"→ {memory_end / 2 ** 20:.0f} Mo") if memory_end else "indisponible"
+            print(f"\nsessions={n_sessions} interactions={n_interactions} erreurs={sum(errors.values())} "
+                  f"reconstructions={restarts} arrêtées={stopped} débit={n_interactions / args.duration:.1f}/s "
+                  f"CPU serveur={cpu:.0f}% mémoire serveur={memory}")
+            print(f"  {'interaction':<16} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'erreurs':>8}")
+            for name in dict.fromkeys(list(latencies) + list(errors)):
+                values = latencies.get(name, [])
+                timings = " ".join(f"{percentile(values, q) * 1000:>7.0f}ms" for q in (50, 95, 99)) if values \
+                    else " ".join(f"{'-':>9}" for _ in range(3))
+                print(f"  {name:<16} {len(values):>6} {timings} {errors.get(name, 0):>8}")
+            for name, message in samples.items():
+                print(f"  erreur ({name}) : {message}")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Profil de démarrage de l'application Streamlit (hdh_code_web.py) : coût des
+imports (`python -X importtime`), temps jusqu'au premier rendu et temps de
+réexécution (rerun) par section du script.
+
+Le premier rendu est exécuté dans un processus neuf (`AppTest`), lancé avec
+`-X importtime` : le rapport donne les imports les plus coûteux et, pour les
+dépendances qui ne servent qu'à certains parcours (scraping, export Excel,
+recherche sémantique, API), si elles ont été importées et par quel module.
+Les réexécutions sont ensuite mesurées sur la page d'accueil puis avec des
+résultats affichés ; la durée par section est lue dans
+`st.session_state.rerun_profile` (voir hdh_code_web.py).
+
+    python benchmarks/profile_startup.py --reruns 20
+
+Comparaison avant / après : profiler une autre version de l'application,
+par exemple une extraction de la révision précédente (un catalogue synthétique
+publié comme instantané évite le scraping quelle que soit la version) :
+
+    git worktree add /tmp/hdh-avant HEAD~1
+    python benchmarks/profile_startup.py --synthetic 5000 --app /tmp/hdh-avant/hdh_code_web.py
+    python benchmarks/profile_startup.py --synthetic 5000
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hdh_code_web.py")
+QUERY = "cancer"
+RESULT_PREFIX = "PROFILE_RESULT "
+
+# Dépendances attendues seulement sur les parcours qui les utilisent
+DEFERRED_DEPENDENCIES = {
+    "requests": "scraping",
+    "bs4": "scraping",
+    "lxml": "scraping",
+    "openpyxl": "export Excel / fichier de secours",
+    "xlsxwriter": "export Excel",
+    "sklearn": "recherche sémantique",
+    "fastapi": "API",
+    "uvicorn": "API",
+    "pyarrow": "instantanés Arrow IPC (HDH_SNAPSHOT_DIR)",
+}
+
+# import time: self [us] | cumulative | imported package
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+# ==================== PROCESSUS MESURÉ ====================
+def _sections(at):
+    try:
+        return dict(at.session_state["rerun_profile"])
+    except KeyError:  # Version de l'application sans profil par section
+        return {}
+
+
+def _rerun(at, reruns):
+    timings, sections = [], []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+        sections.append(_sections(at))
+    return {"timings": timings, "sections": sections, "exceptions": len(at.exception)}
+
+
+def child(app_path, reruns, timeout):
+    """Premier rendu puis réexécutions dans ce processus (lancé avec -X importtime)"""
+    sys.path.insert(0, os.path.dirname(app_path))
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    import_streamlit = time.perf_counter() - start
+
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    result = {
+        "import_streamlit": import_streamlit,
+        "first_render": time.perf_counter() - start,
+        "first_sections": _sections(at),
+        "first_exceptions": len(at.exception),
+        "accueil": _rerun(at, reruns),
+    }
+
+    # Recherche, puis réexécutions avec le tableau des résultats affiché
+    next(element for element in at.text_input if element.key == "search_global").input(QUERY)
+    next(button for button in at.button if button.label == "🔍 Rechercher").click()
+    start = time.perf_counter()
+    at.run()
+    result["search"] = time.perf_counter() - start
+    result["résultats"] = _rerun(at, reruns)
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+# ==================== ANALYSE ====================
+def parse_importtime(stderr):
+    """
+    Lignes de -X importtime -> [(module, self µs, cumulé µs, module de premier niveau
+    dont l'import l'a déclenché)] ; les modules importés sont listés après leurs dépendances
+    """
+    lines = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            lines.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+
+    imports, stack = [], []
+    for name, self_us, cumulative_us, level in reversed(lines):
+        while stack and stack[-1][1] >= level:
+            stack.pop()
+        stack.append((name, level))
+        imports.append((name, self_us, cumulative_us, stack[0][0]))
+    return imports[::-1]
+
+
+def run_child(app_path, reruns, timeout):
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child",
+               "--app", app_path, "--reruns", str(reruns), "--timeout", str(timeout)]
+    process = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(app_path))
+    result = next((json.loads(line[len(RESULT_PREFIX):]) for line in process.stdout.splitlines()
+                   if line.startswith(RESULT_PREFIX)), None)
+    if result is None:
+        errors = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+        sys.exit("Échec du processus mesuré :\n" + "\n".join(errors[-20:]))
+    return result, parse_importtime(process.stderr)
+
+
+def report_imports(imports, top):
+    roots = [entry for entry in imports if entry[0] == entry[3]]
+    print(f"\nImports de premier niveau les plus coûteux (cumulé, {len(imports)} modules au total) :")
+    for name, _, cumulative_us, _ in sorted(roots, key=lambda entry: -entry[2])[:top]:
+        print(f"  {cumulative_us / 1000:>8.1f} ms  {name}")
+
+    loaded = {}
+    for name, _, cumulative_us, root in imports:
+        package = name.split(".")[0]
+        if package in DEFERRED_DEPENDENCIES and package not in loaded:
+            loaded[package] = (root, cumulative_us)
+    print("\nDépendances différées (attendues seulement sur leur parcours) :")
+    for package, usage in DEFERRED_DEPENDENCIES.items():
+        if package in loaded:
+            root, cumulative_us = loaded[package]
+            print(f"  {package:<12} importé via {root} ({cumulative_us / 1000:.1f} ms) — {usage}")
+        else:
+            print(f"  {package:<12} non importé — {usage}")
+
+
+def report_reruns(label, run):
+    from bench_sessions import percentile
+
+    timings = run["timings"]
+    print(f"\nRéexécution ({label}, n={len(timings)}) : p50 {percentile(timings, 50) * 1000:.0f} ms, "
+          f"p95 {percentile(timings, 95) * 1000:.0f} ms, erreurs {run['exceptions']}")
+    totals = defaultdict(list)
+    for sections in run["sections"]:
+        for section, ms in sections.items():
+            totals[section].append(ms)
+    for section, values in totals.items():
+        print(f"  {section:<32} {statistics.mean(values):>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default=APP_PATH, help="Script Streamlit à profiler (autre extraction du dépôt)")
+    parser.add_argument("--reruns", type=int, default=20, help="Nombre de réexécutions mesurées par état")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Délai maximal d'une exécution du script")
+    parser.add_argument("--top", type=int, default=15, help="Nombre d'imports affichés")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Utiliser un catalogue synthétique de N projets au lieu du fichier de secours")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    app_path = os.path.abspath(args.app)
+
+    if args.child:
+        child(app_path, args.reruns, args.timeout)
+        return
+
+    from bench_sessions import prepare_data
+
+    print(f"Application : {app_path}")
+    print(f"Données : {prepare_data(args.synthetic)}")
+    result, imports = run_child(app_path, args.reruns, args.timeout)
+
+    report_imports(imports, args.top)
+    print(f"\nImport de streamlit : {result['import_streamlit'] * 1000:.0f} ms")
+    print(f"Premier rendu (processus neuf, construction du moteur comprise) : "
+          f"{result['first_render'] * 1000:.0f} ms, erreurs {result['first_exceptions']}")
+    for section, ms in result["first_sections"].items():
+        print(f"  {section:<32} {ms:>8.1f} ms")
+    report_reruns("accueil", result["accueil"])
+    print(f"\nRecherche « {QUERY} » : {result['search'] * 1000:.0f} ms")
+    report_reruns("résultats affichés", result["résultats"])
+
+
+if __name__ == "__main__":
+    main()
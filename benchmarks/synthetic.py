@@ -0,0 +1,80 @@
+"""
+Catalogues synthétiques pour les benchmarks.
+
+Si le fichier de secours (repertoire_projets.xlsx) est présent, il est répliqué
+`scale` fois avec des références uniques ; sinon des projets aléatoires sont
+générés avec les mêmes colonnes que l'export HDH.
+"""
+import os
+import random
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import hdh_engine  # noqa: E402
+
+SOURCES = ["SNDS", "HDH", "Autre(s)", "Cohorte CONSTANCES", "Données hospitalières", "Enquête(s)"]
+COMPOSANTES_SNDS = ["DCIR", "PMSI MCO", "PMSI SSR", "Echantillon du ENSD",
+                    "Bases des causes médicales de décès (CépiDC)"]
+BASES_HDH = ["OSCOUR", "EGB", "Cohorte I-Share", "Registre France Greffe de Moelle"]
+AUTRES = ["Données de registre", "DCIR", "Entrepôt de données de santé", "Questionnaire"]
+DOMAINES = ["Oncologie", "Cardiologie", "Neurologie", "Pneumologie", "Diabétologie",
+            "Infectiologie", "Pédiatrie", "Psychiatrie", "Autre(s)", "autres"]
+FINALITES = ["Recherche", "Etude", "Evaluation", "Amélioration de la qualité", "Santé publique"]
+OBJECTIFS = ["Décrire une population", "Evaluer un traitement", "Estimer un risque",
+             "Mesurer l'impact d'une politique", "Développer un algorithme"]
+TYPES = hdh_engine.type_entite_options
+ENTITES = [f"Organisme {i}" for i in range(400)]
+MOTS = ["étude", "cohorte", "patients", "risque", "traitement", "parcours", "soins", "décès",
+        "hospitalisation", "facteurs", "exposition", "médicament", "cancer", "diabète", "covid"]
+
+
+def _pick(rng, values, low=1, high=3):
+    return ", ".join(rng.sample(values, rng.randint(low, min(high, len(values)))))
+
+
+def random_catalogue(n_rows, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        start = pd.Timestamp("2018-01-01") + pd.Timedelta(days=rng.randint(0, 2500))
+        rows.append({
+            "Référence": f"SYN-{i:07d}",
+            "title": " ".join(rng.choice(MOTS) for _ in range(rng.randint(5, 12))).capitalize(),
+            "Source de données utilisées": _pick(rng, SOURCES),
+            "Composante(s) de la base principale du SNDS mobilisée(s)": _pick(rng, COMPOSANTES_SNDS),
+            "Base(s) du catalogue du HDH mobilisée(s)": _pick(rng, BASES_HDH, 0, 2),
+            "Autre(s) source(s) de donnée(s) mobilisée(s)": _pick(rng, AUTRES, 0, 2),
+            "statut calendrier": rng.choice(["En cours", "Terminé", "A venir"]),
+            "Domaines médicaux investigués": _pick(rng, DOMAINES),
+            "Finalité de l'étude": _pick(rng, FINALITES, 1, 2),
+            "Objectifs poursuivis": _pick(rng, OBJECTIFS, 1, 2),
+            "Responsable de traitement 1": rng.choice(ENTITES),
+            "Responsable de traitement 2": rng.choice(ENTITES + [None] * 200),
+            "Responsable de traitement 3": rng.choice(ENTITES + [None] * 800),
+            "Type responsable treatment 1": rng.choice(TYPES),
+            "Type responsable treatment 2": rng.choice(TYPES + [None] * 5),
+            "Type responsable treatment 3": rng.choice(TYPES + [None] * 20),
+            "Description Entité mettant à disposition": " ".join(rng.choice(MOTS) for _ in range(20)),
+            "Date de début": start.strftime("%Y-%m-%d") if rng.random() > 0.05 else None,
+            "Etape  : Complétude": (start + pd.Timedelta(days=rng.randint(30, 600))).strftime("%Y-%m-%d")
+            if rng.random() > 0.4 else None,
+        })
+    return pd.DataFrame(rows)
+
+
+def synthetic_catalogue(scale=100, seed=0, base_rows=3000):
+    """Catalogue `scale` fois plus grand que l'export HDH"""
+    fallback = os.path.join(os.path.dirname(hdh_engine.__file__), hdh_engine.FALLBACK_FILENAME)
+    if not os.path.exists(fallback):
+        return random_catalogue(base_rows * scale, seed)
+
+    base = pd.read_excel(fallback, engine="openpyxl")
+    copies = []
+    for i in range(scale):
+        copy = base.copy()
+        copy["Référence"] = copy["Référence"].astype(str) + f"-{i:03d}"
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
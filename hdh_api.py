@@ -0,0 +1,264 @@
+"""
+API HTTP JSON (ASGI / FastAPI) au-dessus du moteur de recherche des projets HDH.
+
+Lancement local :
+    uvicorn hdh_api:app --host 0.0.0.0 --port 8000 --workers 4
+
+Le moteur (données enrichies + options) est construit une fois par processus
+et partagé par toutes les requêtes. Les réponses volumineuses sont compressées
+(gzip) et uvicorn maintient les connexions HTTP/1.1 ouvertes (keep-alive).
+"""
+import json
+import re
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from typing import List, Literal, Optional
+
+import pandas as pd
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+
+import hdh_changes
+import hdh_dedup
+import hdh_engine
+import hdh_export
+import hdh_indexes
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Construire le moteur avant la première requête
+    await run_in_threadpool(hdh_engine.get_engine)
+    yield
+
+
+app = FastAPI(title="Moteur de recherche des projets HDH", lifespan=lifespan)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
+def get_engine():
+    """Moteur partagé du processus ; 503 si aucune donnée n'a pu être chargée"""
+    engine = hdh_engine.get_engine()
+    if engine.empty:
+        raise HTTPException(status_code=503, detail="Aucune donnée n'a été chargée")
+    return engine
+
+
+def check_pattern(name, value):
+    """
+    Les recherches textuelles sont des expressions régulières (str.contains, comme
+    dans l'application) ; 422 si `value` n'en est pas une valide
+    """
+    try:
+        re.compile(value.lower())
+    except re.error as e:
+        raise HTTPException(status_code=422,
+                            detail=f"Expression invalide pour « {name} » : {value!r} ({e})") from None
+
+
+def filter_params(
+    q: str = "",
+    types: List[str] = Query(default=[]),
+    aires: List[str] = Query(default=[]),
+    sources: List[str] = Query(default=[]),
+    finalites: List[str] = Query(default=[]),
+    objectifs: List[str] = Query(default=[]),
+    entite: str = "",
+    entites: List[str] = Query(default=[]),
+    annees: List[int] = Query(default=[]),
+    statut: str = "TOUT",
+    debut_min: Optional[date] = None,
+    debut_max: Optional[date] = None,
+    derniers_mois: Optional[int] = Query(default=None, ge=1),
+    semantique: str = "",
+    nouveaux_depuis: Optional[datetime] = None,
+):
+    """Paramètres de filtrage, dans l'ordre des arguments de `get_filtered_df`"""
+    if statut not in hdh_engine.STATUS_OPTIONS:
+        raise HTTPException(status_code=422, detail=f"Statut inconnu : {statut}")
+    for name, values in [("q", [q]), ("entite", [entite]), ("types", types), ("aires", aires),
+                         ("finalites", finalites), ("objectifs", objectifs)]:
+        for value in values:
+            check_pattern(name, value)
+
+    # Intervalle de dates de début [début, fin[ (debut_max inclus)
+    date_range = None
+    if derniers_mois:
+        start, end = hdh_indexes.last_months_range(derniers_mois)
+        date_range = (start.isoformat(), end.isoformat())
+    elif debut_min or debut_max:
+        date_range = (debut_min.isoformat() if debut_min else None,
+                      (debut_max + timedelta(days=1)).isoformat() if debut_max else None)
+
+    return {
+        "query_global": q,
+        "selected_types": types,
+        "selected_aires": aires,
+        "selected_sources": sources,
+        "selected_finalites": finalites,
+        "selected_objectifs": objectifs,
+        "entite_responsable": entite,
+        "selected_entite_dropdown": entites,
+        "selected_annees": annees,
+        "selected_status": statut,
+        "date_range": date_range,
+        "semantic_query": semantique,
+        "new_since": nouveaux_depuis.isoformat() if nouveaux_depuis else None,
+    }
+
+
+def json_response(payload, records=None):
+    """
+    Réponse JSON ; `records` (DataFrame) est sérialisé directement par pandas
+    sous la clé "results" pour éviter une conversion ligne à ligne en dict
+    """
+    body = json.dumps(payload, ensure_ascii=False, default=str)
+    if records is not None:
+        records_json = records.to_json(orient="records", date_format="iso", force_ascii=False)
+        body = body[:-1] + (", " if payload else "") + '"results": ' + records_json + "}"
+    return Response(content=body.encode("utf-8"), media_type="application/json")
+
+
+def select_columns(df, all_columns):
+    return df[hdh_export.select_columns(df, all_columns)]
+
+
+@app.get("/health")
+def health():
+    engine = hdh_engine.get_engine()
+    return {"status": "ok" if not engine.empty else "empty",
+            "projets": len(engine.df), "version": engine.version}
+
+
+@app.get("/search")
+def search(
+    filters: dict = Depends(filter_params),
+    limit: int = Query(default=50, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0),
+    all_columns: bool = False,
+    explain: bool = False,
+    regrouper: bool = False,
+):
+    engine = get_engine()
+    plan = engine.plan(**filters)
+    results = plan.execute()
+    if regrouper:
+        # Un projet par groupe de quasi-doublons, avec le nombre de versions
+        results = hdh_dedup.collapse_duplicates(results)
+    page = select_columns(results.iloc[offset:offset + limit], all_columns)
+    payload = {"total": len(results), "offset": offset, "limit": limit}
+    if explain:
+        # Cardinalité et durée de chaque étape du plan de requête
+        payload["plan"] = plan.stats
+    return json_response(payload, page)
+
+
+@app.get("/facets")
+def facets():
+    engine = get_engine()
+    return engine.options
+
+
+@app.get("/tendances")
+def trends(
+    dimension: str = Query(default="source", pattern="^(source|aire|type_entite|statut)$"),
+    statut: Optional[Literal["En cours", "Terminé"]] = None,
+    top: int = Query(default=8, ge=1, le=50),
+):
+    cube = get_engine().analytics_cube()
+    table = cube.trend(dimension, statut=statut, top=top)
+    return {
+        "total": cube.total(),
+        "statuts": {status: cube.total(status) for status in hdh_indexes.STATUS_LABELS},
+        "annees": [int(year) for year in table.index],
+        "series": {str(value): table[value].astype(int).tolist() for value in table.columns},
+    }
+
+
+@app.get("/changements")
+def changes(
+    depuis: Optional[int] = Query(default=None, ge=1),
+    format: str = Query(default="json", pattern="^(json|csv)$"),
+    all_columns: bool = False,
+):
+    """Projets ajoutés, modifiés et supprimés depuis une version (par défaut la précédente)"""
+    engine = get_engine()
+    manifest = engine.manifest()
+    if depuis is None:
+        previous = [v for v, _, _, _ in hdh_changes.get_feed().history()
+                    if manifest.version is None or v < manifest.version]
+        if not previous:
+            raise HTTPException(status_code=404, detail="Aucune version antérieure")
+        depuis = previous[-1]
+    diff = engine.changes_since(depuis)
+    if diff is None:
+        raise HTTPException(status_code=404, detail=f"Version inconnue : {depuis}")
+
+    table = hdh_changes.diff_frame(engine.df, diff, all_columns)
+    if format == "csv":
+        return Response(content=table.to_csv(index=False).encode("utf-8"),
+                        media_type="text/csv; charset=utf-8",
+                        headers={"Content-Disposition": f'attachment; filename="changements_depuis_v{depuis}.csv"'})
+    return json_response({
+        "version": manifest.version,
+        "depuis": depuis,
+        "ajoutes": len(diff["added"]),
+        "modifies": len(diff["modified"]),
+        "supprimes": len(diff["removed"]),
+    }, table)
+
+
+@app.get("/articles/{reference}")
+def article(reference: str):
+    engine = get_engine()
+    row = engine.get_article(reference)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Article introuvable : {reference}")
+    record = row.drop(labels=["search_text"], errors="ignore").to_frame().T
+    body = record.to_json(orient="records", date_format="iso", force_ascii=False)[1:-1]
+    return Response(content=body.encode("utf-8"), media_type="application/json")
+
+
+@app.get("/articles/{reference}/similaires")
+def similar_articles(reference: str, k: int = Query(default=10, ge=1, le=100)):
+    engine = get_engine()
+    similar = engine.similar_projects(reference, k)
+    if similar is None:
+        raise HTTPException(status_code=404, detail=f"Article introuvable : {reference}")
+    columns = ["Similarité"] + [col for col in hdh_engine.columns_display if col in similar.columns]
+    return json_response({"reference": reference}, similar[columns])
+
+
+@app.get("/export")
+def export(
+    filters: dict = Depends(filter_params),
+    format: str = Query(default="xlsx", pattern="^(xlsx|csv|jsonl)$"),
+    all_columns: bool = True,
+    gzip: bool = False,
+):
+    engine = get_engine()
+    if format in hdh_export.EXPORT_FORMATS:
+        # Export en flux : lignes extraites et sérialisées par blocs, sans matérialiser le résultat
+        row_ids = engine.plan(**filters).row_ids()
+        columns = hdh_export.select_columns(engine.df, all_columns)
+        filename = hdh_export.export_filename(format, gzip)
+        return StreamingResponse(hdh_export.iter_export(engine.df, row_ids, columns, format, gzip),
+                                 media_type=hdh_export.media_type(format, gzip),
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+    results = select_columns(engine.search(**filters), all_columns)
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        results.to_excel(writer, index=False, sheet_name='Résultats')
+    return Response(content=output.getvalue(),
+                    media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    headers={"Content-Disposition": 'attachment; filename="resultats_filtres.xlsx"'})
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("hdh_api:app", host="127.0.0.1", port=8000, timeout_keep_alive=30)
@@ -0,0 +1,260 @@
+"""
+Historique des versions du jeu de données et différences entre versions.
+
+Chaque version est résumée par un manifeste : `Référence` et empreinte (hachage
+64 bits du contenu) de chaque projet, et date de première apparition de chaque
+référence. Les manifestes sont petits (quelques octets par projet) et conservés
+sur disque ; la différence entre deux versions est une jointure par hachage sur
+`Référence` suivie d'une comparaison des empreintes, sans comparer les
+DataFrames colonne par colonne.
+
+Organisation du répertoire (instantanés partagés ou .cache/changes) :
+    manifest-00000007-<date>-<empreinte>.npz    manifeste de la version 7
+    .claim-00000007                             numéro de version réservé
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import hdh_dedup
+import hdh_export
+
+DEFAULT_DIR = os.path.join(
+    os.environ.get("HDH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")),
+    "changes"
+)
+KEEP_MANIFESTS = 60
+MANIFEST_CACHE_SIZE = 4
+
+# Colonnes dérivées des autres par l'enrichissement : exclues de l'empreinte
+DERIVED_COLUMNS = ["search_text", "Statut", "Source de données utilisées enrichies", hdh_dedup.CLUSTER_COLUMN]
+
+CHANGE_LABELS = {"added": "Ajouté", "modified": "Modifié", "removed": "Supprimé"}
+
+logger = logging.getLogger(__name__)
+
+
+def _canonical(series):
+    """Valeurs comparables d'une version à l'autre (colonnes objet, Arrow ou dates)"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Series(series.to_numpy(dtype="datetime64[ns]").view(np.int64))
+    return pd.Series([("" if pd.isna(v) else str(v)) for v in series.tolist()], dtype=object)
+
+
+def row_hashes(df):
+    """Empreinte 64 bits du contenu (hors colonnes dérivées) de chaque projet"""
+    columns = sorted(col for col in df.columns if col not in DERIVED_COLUMNS)
+    canonical = pd.DataFrame({col: _canonical(df[col]) for col in columns})
+    return pd.util.hash_pandas_object(canonical, index=False).to_numpy(dtype=np.uint64)
+
+
+def _fingerprint(references, hashes):
+    digest = hashlib.sha1("\0".join(references.tolist()).encode("utf-8"))
+    digest.update(hashes.tobytes())
+    return digest.hexdigest()[:16]
+
+
+class Manifest:
+    """
+    Références, empreintes et dates de première apparition (secondes epoch),
+    alignées sur les lignes du DataFrame de la version
+    """
+
+    def __init__(self, version, created_at, references, hashes, first_seen, fingerprint=None):
+        self.version = version
+        self.created_at = created_at
+        self.references = references
+        self.hashes = hashes
+        self.first_seen = first_seen
+        self.fingerprint = fingerprint or _fingerprint(references, hashes)
+
+    @classmethod
+    def build(cls, df, previous=None, hashes=None, now=None):
+        """Manifeste d'un DataFrame ; les dates de première apparition sont reprises de `previous`"""
+        now = time.time() if now is None else now
+        references = df["Référence"].astype(str).to_numpy(dtype=str)
+        hashes = row_hashes(df) if hashes is None else hashes
+        first_seen = np.full(len(references), now, dtype=np.float64)
+        if previous is not None:
+            positions, previous_ids = previous.lookup(references)
+            known = positions >= 0
+            first_seen[known] = previous.first_seen[previous_ids[positions[known]]]
+        version = previous.version + 1 if previous is not None else 1
+        return cls(version, now, references, hashes, first_seen)
+
+    def unique_ids(self):
+        """Première ligne de chaque référence (les références dupliquées sont ignorées)"""
+        return np.flatnonzero(~pd.Index(self.references).duplicated(keep="first"))
+
+    def lookup(self, references):
+        """
+        Jointure par hachage : pour chaque référence, sa position parmi unique_ids()
+        (-1 si absente) ; retourne (positions, unique_ids)
+        """
+        ids = self.unique_ids()
+        return pd.Index(self.references[ids]).get_indexer(references), ids
+
+    # ==================== PERSISTANCE ====================
+    def filename(self):
+        # Version, date et empreinte dans le nom : l'historique se lit sans ouvrir les fichiers
+        return f"manifest-{self.version:08d}-{int(self.created_at)}-{self.fingerprint}.npz"
+
+    def save(self, directory):
+        """Écrit le manifeste ; False si ce numéro de version est déjà pris par un autre processus"""
+        os.makedirs(directory, exist_ok=True)
+        try:
+            os.close(os.open(os.path.join(directory, f".claim-{self.version:08d}"),
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        path = os.path.join(directory, self.filename())
+        tmp_path = os.path.join(directory, f".tmp{os.getpid()}.npz")
+        np.savez(tmp_path, created_at=np.float64(self.created_at), references=self.references,
+                 hashes=self.hashes, first_seen=self.first_seen, fingerprint=np.array(self.fingerprint))
+        os.replace(tmp_path, path)
+        return True
+
+    @classmethod
+    def load(cls, path, version):
+        with np.load(path) as data:
+            return cls(version, float(data["created_at"]), data["references"], data["hashes"],
+                       data["first_seen"], str(data["fingerprint"]))
+
+
+def diff(old, new):
+    """
+    Projets ajoutés et modifiés (identifiants de lignes de `new`) et références
+    supprimées entre deux manifestes
+    """
+    positions, old_ids = old.lookup(new.references)
+    new_ids = new.unique_ids()
+    in_new = np.zeros(len(new.references), dtype=bool)
+    in_new[new_ids] = True
+
+    known = positions >= 0
+    added = np.flatnonzero(in_new & ~known)
+    matched = np.flatnonzero(in_new & known)
+    modified = matched[old.hashes[old_ids[positions[matched]]] != new.hashes[matched]]
+
+    reverse, _ = new.lookup(old.references[old_ids])
+    removed = old.references[old_ids[reverse < 0]]
+    return {"added": added, "modified": modified, "removed": removed}
+
+
+def diff_frame(df, changes, all_columns=False):
+    """Tableau des changements (colonne "Changement" en tête) pour l'affichage et l'export"""
+    columns = hdh_export.select_columns(df, all_columns)
+    frames = [df.take(changes[kind])[columns].assign(Changement=CHANGE_LABELS[kind])
+              for kind in ("added", "modified")]
+    frames.append(pd.DataFrame({"Référence": changes["removed"], "Changement": CHANGE_LABELS["removed"]}))
+    result = pd.concat(frames, ignore_index=True)
+    return result[["Changement"] + [col for col in result.columns if col != "Changement"]]
+
+
+class ChangeFeed:
+    """
+    Manifestes successifs d'un répertoire. Une nouvelle version n'est enregistrée
+    que si le contenu a changé depuis la précédente. En lecture seule (workers
+    attachés aux instantanés), les manifestes sont écrits par le processus
+    constructeur : les workers les relisent par leur numéro (get), inscrit dans
+    les métadonnées de l'instantané (voir hdh_snapshot.py).
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, read_only=False):
+        self.directory = directory
+        self.read_only = read_only
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def history(self):
+        """[(version, date de création, empreinte, nom de fichier)] du plus ancien au plus récent"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            parts = name[:-len(".npz")].split("-") if name.endswith(".npz") else []
+            if len(parts) == 4 and parts[0] == "manifest":
+                try:
+                    entries.append((int(parts[1]), float(parts[2]), parts[3], name))
+                except ValueError:
+                    continue
+        return sorted(entries)
+
+    def get(self, version):
+        """Manifeste d'une version (quelques versions récemment lues restent en mémoire)"""
+        with self._lock:
+            manifest = self._cache.get(version)
+            if manifest is None:
+                name = next((name for v, _, _, name in self.history() if v == version), None)
+                if name is None:
+                    return None
+                manifest = Manifest.load(os.path.join(self.directory, name), version)
+                while len(self._cache) >= MANIFEST_CACHE_SIZE:
+                    self._cache.pop(next(iter(self._cache)))
+                self._cache[version] = manifest
+            return manifest
+
+    def latest(self):
+        history = self.history()
+        return self.get(history[-1][0]) if history else None
+
+    def record(self, df):
+        """Manifeste de `df` : version existante de même contenu, ou nouvelle version"""
+        references = df["Référence"].astype(str).to_numpy(dtype=str)
+        hashes = row_hashes(df)
+        fingerprint = _fingerprint(references, hashes)
+
+        for _ in range(3):
+            for version, _, existing, _ in reversed(self.history()):
+                if existing == fingerprint:
+                    return self.get(version)
+            manifest = Manifest.build(df, self.latest(), hashes=hashes)
+            if self.read_only:
+                # Contenu inconnu de l'historique : manifeste hors historique (version None)
+                # plutôt qu'un numéro qu'aucun get() ne retrouverait
+                logger.error(f"Manifeste absent de l'historique {self.directory} (empreinte {fingerprint}, "
+                             f"{len(references)} projets) : changements entre versions indisponibles")
+                manifest.version = None
+                return manifest
+            try:
+                if manifest.save(self.directory):
+                    self._remove_old_versions(manifest.version)
+                    return manifest
+            except OSError:
+                return manifest  # Répertoire en lecture seule : manifeste gardé en mémoire
+        return manifest
+
+    def _remove_old_versions(self, current_version):
+        for version, _, _, name in self.history():
+            if version <= current_version - KEEP_MANIFESTS:
+                for path in (os.path.join(self.directory, name),
+                             os.path.join(self.directory, f".claim-{version:08d}")):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def get_feed():
+    """
+    Historique partagé du processus : celui du répertoire d'instantanés
+    (HDH_SNAPSHOT_DIR, en lecture seule) ou celui du cache local
+    """
+    snapshot_dir = os.environ.get("HDH_SNAPSHOT_DIR")
+    directory = snapshot_dir or DEFAULT_DIR
+    with _feeds_lock:
+        feed = _feeds.get(directory)
+        if feed is None:
+            feed = _feeds[directory] = ChangeFeed(directory, read_only=bool(snapshot_dir))
+        return feed
@@ -1,13 +1,29 @@
 import streamlit as st
 import pandas as pd
-import re
 import os
-import sys
-from io import BytesIO
-
-import requests
-from bs4 import BeautifulSoup
 import time
+import uuid
+
+import hdh_changes
+import hdh_cube
+import hdh_dedup
+import hdh_engine
+import hdh_export
+import hdh_indexes
+import hdh_saved
+import hdh_sessions
+
+# ==================== PROFIL D'EXÉCUTION ====================
+# Durée de chaque section du script à chaque exécution (rerun), conservée dans
+# st.session_state.rerun_profile ; affichée dans la barre latérale si HDH_PROFILE=1
+PROFILE = os.environ.get("HDH_PROFILE", "") not in ("", "0")
+_profile_marks = [("début", time.perf_counter())]
+
+
+def profile_mark(section):
+    """Clôt la section `section` du profil de l'exécution en cours"""
+    _profile_marks.append((section, time.perf_counter()))
+
 # ==================== CONFIGURATION DE LA PAGE ====================
 st.set_page_config(
     page_title="Moteur de recherche des projets",
@@ -73,7 +89,7 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-
+profile_mark("page et CSS")
 
 # ==================== TITRE DE L'APPLICATION ====================
 st.markdown('<div class="main-header">Moteur de recherche des projets</div>', unsafe_allow_html=True)
@@ -83,398 +99,70 @@ col_refresh1, col_refresh2, col_refresh3 = st.columns([1, 1, 1])
 with col_refresh2:
     if st.button("🔄 Actualiser les données", use_container_width=True, help="Récupère les dernières données depuis le site HDH"):
         st.cache_data.clear()
+        st.cache_resource.clear()
         st.rerun()
 
-# scrapping
-@st.cache_data(ttl=3600)  # Cache pendant 1 heure
-def load_data():
-    """
-    Charge les données depuis le site HDH en scrapant le lien de téléchargement
-    """
-    try:
-        url = "https://www.health-data-hub.fr/projets"
-        
-        # Headers plus complets pour éviter les blocages
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
-    
-        
-        # Récupérer la page avec session pour maintenir les cookies
-        session = requests.Session()
-        response = session.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # Parser le HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Stratégies multiples pour trouver le lien Excel
-        download_link = None
-        
-        # Stratégie 1: Chercher les liens avec des mots-clés dans le texte
-        
-        # Rechercher tous les liens
-        all_links = soup.find_all('a', href=True)
-        
-        for link in all_links:
-            href = link.get('href', '')
-            text = link.get_text(strip=True).lower()
-            
-            # Vérifier si c'est un fichier Excel
-            if any(ext in href.lower() for ext in ['.xlsx', '.xls']):
-                download_link = href
-                break
-            
-            # Vérifier si le texte contient des mots-clés de téléchargement
-            if any(keyword in text for keyword in ['télécharger', 'download', 'excel', 'xlsx']):
-                # Vérifier si le lien pointe vers un fichier ou une page de téléchargement
-                if href and not href.startswith('#'):
-                    download_link = href
-                    st.info(f"✅ Lien trouvé par mot-clé '{text}': {href}")
-                    break
-        
-        # Stratégie 2: Chercher dans les attributs data-* ou onclick
-        if not download_link:
-            for element in soup.find_all(['a', 'button', 'div']):
-                for attr_name, attr_value in element.attrs.items():
-                    if isinstance(attr_value, str) and any(ext in attr_value.lower() for ext in ['.xlsx', '.xls']):
-                        download_link = attr_value
-                        st.info(f"✅ Lien trouvé dans l'attribut {attr_name}: {attr_value}")
-                        break
-                if download_link:
-                    break
-        
-        # Stratégie 3: Chercher des patterns spécifiques au site HDH
-        if not download_link:
-            # Chercher des liens vers des fichiers ou APIs
-            for link in all_links:
-                href = link.get('href', '')
-                if any(pattern in href.lower() for pattern in ['/api/', '/download/', '/file/', '/export/']):
-                    # Vérifier si ça pourrait être notre fichier
-                    if 'projet' in href.lower() or 'repertoire' in href.lower():
-                        download_link = href
-                        st.info(f"✅ Lien API/Download trouvé: {href}")
-                        break
-        
-        if not download_link:
-            st.error("❌ Impossible de trouver le lien de téléchargement Excel")
-            st.info("🔍 Liens trouvés sur la page:")
-            
-            # Afficher quelques liens pour debug
-            for i, link in enumerate(all_links[:10]):
-                href = link.get('href', '')
-                text = link.get_text(strip=True)
-                st.write(f"- {text[:50]}... → {href[:100]}...")
-            
-            return load_fallback_data()
-        
-        # Construire l'URL complète
-        if download_link.startswith('/'):
-            download_link = "https://www.health-data-hub.fr" + download_link
-        elif not download_link.startswith('http'):
-            download_link = "https://www.health-data-hub.fr/" + download_link.lstrip('/')
-    
-        
-        # Télécharger le fichier Excel
-        excel_response = session.get(download_link, headers=headers, timeout=60)
-        excel_response.raise_for_status()
-        
-        # Vérifier que c'est bien un fichier Excel
-        content_type = excel_response.headers.get('content-type', '').lower()
-        if 'excel' not in content_type and 'spreadsheet' not in content_type:
-            st.warning(f"⚠️ Type de contenu inattendu: {content_type}")
-        
-        # Lire le fichier Excel depuis la mémoire
-        df = pd.read_excel(BytesIO(excel_response.content), engine="openpyxl")
-        
-        st.success(f"✅ Données chargées avec succès ! ({len(df)} projets trouvés)")
-        
-        return df
-        
-    except requests.exceptions.RequestException as e:
-        st.error(f"❌ Erreur de connexion au site HDH : {e}")
-        return load_fallback_data()
-    except Exception as e:
-        st.error(f"❌ Erreur lors du chargement des données : {e}")
-        return load_fallback_data()
-
-def load_fallback_data():
-    """
-    Fonction de secours : charge le fichier local si le scraping échoue
-    """
-    try:
-        base_path = os.path.dirname(__file__)
-        file_path = os.path.join(base_path, "repertoire_projets.xlsx")
-        
-        if os.path.exists(file_path):
-            st.warning("⚠️ Utilisation du fichier local de secours")
-            df = pd.read_excel(file_path, engine="openpyxl")
-            st.info(f"📁 Fichier local chargé ({len(df)} projets)")
-            return df
-        else:
-            st.error("❌ Aucun fichier de secours trouvé")
-            st.info("💡 Vous pouvez télécharger manuellement le fichier Excel depuis https://www.health-data-hub.fr/projets et le placer dans le dossier de l'application")
-            return pd.DataFrame()
-            
-    except Exception as e:
-        st.error(f"❌ Erreur lors du chargement du fichier de secours : {e}")
-        return pd.DataFrame()
-        
-df = load_data()
-
-if df.empty:
-    st.warning("Aucune donnée n'a été chargée. L'application ne peut pas fonctionner correctement.")
-    st.stop()
-
-# Fonction pour normaliser et enrichir les sources de données
-def normalize_and_enrich_sources(row):
-    """
-    Enrichit la colonne 'Source de données utilisées' avec :
-    - Les composantes SNDS si SNDS est mentionné
-    - Les bases HDH si HDH est mentionné
-    - Les autres sources si 'autre' est mentionné
-    - Force ESND et Causes médicales de décès dans SNDS
-    """
-    source_principale = str(row.get("Source de données utilisées", ""))
-
-    if pd.isna(source_principale) or source_principale == "nan":
-        return ""
-
-    sources_enrichies = []
-    sources_snds_trouvees = set()
-    has_explicit_snds = False
-
-    parts = re.split(r",", source_principale)
-
-    for part in parts:
-        part_clean = clean_value(part)
-
-        if not part_clean:
-            continue
-
-        # Cas 1 : SNDS explicitement mentionné
-        if re.search(r'\bSNDS\b', part_clean, re.IGNORECASE):
-            has_explicit_snds = True
-
-            # Ajouter les composantes du SNDS
-            composantes_snds = clean_value(row.get("Composante(s) de la base principale du SNDS mobilisée(s)", ""))
-            if composantes_snds:
-                sous_composantes = re.split(r",", composantes_snds)
-                for sc in sous_composantes:
-                    sc_clean = clean_value(sc)
-                    if sc_clean:
-                        sources_snds_trouvees.add(sc_clean)
-
-        # Cas 2 : HDH mentionné
-        elif re.search(r'\bHDH\b', part_clean, re.IGNORECASE):
-            sources_enrichies.append("HDH")
-
-            # Ajouter les bases du HDH
-            bases_hdh = clean_value(row.get("Base(s) du catalogue du HDH mobilisée(s)", ""))
-            if bases_hdh:
-                sous_bases = re.split(r",", bases_hdh)
-                for sb in sous_bases:
-                    sb_clean = clean_value(sb)
-                    if sb_clean:
-                        sources_enrichies.append(f"HDH - {sb_clean}")
-
-        # Cas 3 : Autre/Autres mentionné
-        elif re.search(r'\bAutre\(?\s*s\)?\b|\bautres?\b', part_clean, re.IGNORECASE):
-            autres_sources = clean_value(row.get("Autre(s) source(s) de donnée(s) mobilisée(s)", ""))
-
-            if autres_sources:
-                sous_autres = re.split(r",", autres_sources)
-                for sa in sous_autres:
-                    sa_clean = clean_value(sa)
-                    if sa_clean:
-                        # Vérifier si cette "autre source" fait partie du SNDS
-                        if is_snds_component(sa_clean):
-                            sources_snds_trouvees.add(sa_clean)
-                            has_explicit_snds = True
-                        else:
-                            sources_enrichies.append(sa_clean)
-            else:
-                sources_enrichies.append("Autres")
-
-        # Cas 4 : Composante SNDS directe (ESND, Causes médicales de décès, etc.)
-        elif is_snds_component(part_clean):
-            sources_snds_trouvees.add(part_clean)
-            has_explicit_snds = True
-
-        # Cas 5 : Autre source non catégorisée
-        else:
-            if part_clean:
-                sources_enrichies.append(part_clean)
-
-    # Si on a trouvé des composantes SNDS ou SNDS explicite, ajouter SNDS + composantes
-    if has_explicit_snds or sources_snds_trouvees:
-        # Ajouter SNDS en premier
-        final_sources = ["SNDS"]
-
-        # Ajouter toutes les composantes trouvées
-        for composante in sorted(sources_snds_trouvees):
-            final_sources.append(f"SNDS - {composante}")
-
-        # Ajouter les autres sources
-        final_sources.extend(sources_enrichies)
-
-        return ", ".join(final_sources)
 
-    # Sinon, retourner les sources normales
-    return ", ".join(sources_enrichies) if sources_enrichies else ""
+def streamlit_notify(level, message):
+    """Affiche les messages du moteur dans l'interface Streamlit"""
+    getattr(st, level)(message)
 
-# Fonction pour normaliser les termes "Autre/Autres" génériques
-def normalize_autres(text):
-    """Normalise 'Autre' et 'Autres' vers 'Autres' (pour les autres colonnes)"""
-    if pd.isna(text):
-        return text
-    text_str = str(text)
 
-    # Normaliser Autres) → Autres
-    text_str = re.sub(r'\bAutres\)\b', 'Autres', text_str, flags=re.IGNORECASE)
-
-    # Normaliser Autre(s) → Autres
-    text_str = re.sub(r'\bAutre\(?\s*s\)?\b', 'Autres', text_str, flags=re.IGNORECASE)
-    text_str = re.sub(r'\bautres?\b', 'Autres', text_str, flags=re.IGNORECASE)
-
-    return text_str
-
-# Fonction pour déterminer le statut basé sur la colonne "Etape : Complétude"
-def determine_status(value):
+@st.cache_resource(ttl=3600)  # Cache pendant 1 heure, partagé entre toutes les sessions
+def get_engine():
     """
-    Détermine le statut du projet :
-    - "Terminé" si la cellule contient une date (non vide)
-    - "En cours" si la cellule est vide
+    Charge les données depuis le site HDH et construit le moteur de recherche
     """
-    if pd.isna(value) or str(value).strip() == "" or str(value).lower() == "nan":
-        return "En cours"
-    else:
-        return "Terminé"
-
-# ==================== FONCTIONS DE NETTOYAGE DES DONNÉES ====================
-
-def clean_value(text):
-    """Nettoie les valeurs indésirables et applique les normalisations de base"""
-    if pd.isna(text) or str(text).lower() == "nan":
-        return ""
-
-    text_str = str(text).strip()
-
-    # Enlever les underscores seuls
-    if text_str == "_" or text_str == "":
-        return ""
-
-    # Normaliser "Bases des causes médicales de décès (CépiDC)" → "Causes médicales de décès"
-    text_str = re.sub(r'Bases?\s+des?\s+causes?\s+médicales?\s+de\s+décès\s*\(CépiDC\)', 
-                      'Causes médicales de décès', text_str, flags=re.IGNORECASE)
+    return hdh_engine.SearchEngine.from_source(notify=streamlit_notify)
 
-    # Normaliser "Echantillon du ENSD" → "ESND"
-    text_str = re.sub(r'Echantillon\s+du\s+ENSD', 'ESND', text_str, flags=re.IGNORECASE)
-
-    #  Normaliser toutes les variantes de Enquête(s), enquêtes, etc. → Enquête
-    text_str = re.sub(r'\benqu[êe]te(?:\s*\(?s\)?|\s*s)?\b', 'Enquêtes', text_str, flags=re.IGNORECASE)
-
-    #  Normaliser toutes les variantes de Autre(s), autres, etc. → Autres
-    text_str = re.sub(r'\bautre(?:\s*\(?s\)?|\s*s)?\b', 'Autres', text_str, flags=re.IGNORECASE)
-
-    #  Supprimer parenthèses fermantes orphelines après Enquête ou Autres
-    text_str = re.sub(r'\b(Enquête|Autres)\)', r'\1', text_str, flags=re.IGNORECASE)
-
-    return text_str
-
-def is_snds_component(source_name):
-    """Vérifie si une source fait partie du SNDS"""
-    snds_components = [
-        'causes médicales de décès',
-        'esnd',
-        'dcir',
-        'pmsi',
-        'certificats de décès',
-        'rniam'
-    ]
+if os.environ.get("HDH_SNAPSHOT_DIR"):
+    # Mode multi-processus : instantané publié par hdh_snapshot.py, vérifié à chaque rerun
+    engine = hdh_engine.get_engine()
+else:
+    engine = get_engine()
+df = engine.df
 
-    for component in snds_components:
-        if component in source_name.lower():
-            return True
-    return False
+if df.empty:
+    st.warning("Aucune donnée n'a été chargée. L'application ne peut pas fonctionner correctement.")
+    st.stop()
 
-# ==================== APPLICATION DES TRANSFORMATIONS ====================
-df["Source de données utilisées enrichies"] = df.apply(normalize_and_enrich_sources, axis=1)
-df["Domaines médicaux investigués"] = df["Domaines médicaux investigués"].apply(normalize_autres)
-df["Statut"] = df["Etape  : Complétude"].apply(determine_status)
-df["search_text"] = df.astype(str).apply(lambda x: " ".join(x).lower(), axis=1)
+profile_mark("chargement du moteur")
 
 # ==================== COLONNES ET OPTIONS ====================
-columns_display = ["Référence", "title", "Source de données utilisées enrichies",
-                   "statut calendrier", "Domaines médicaux investigués",
-                   "Finalité de l'étude", "Objectifs poursuivis",
-                   "Responsable de traitement 1", "Responsable de traitement 2",
-                   "Responsable de traitement 3", "Description Entité mettant à disposition"]
-
-type_entite_options = ["Université", "Entreprise", "Etablissement public de santé", "Etablissement privé de santé",
-                       "Association", "Bureau d'étude", "Industriel", "Start-up", "INSERM", "Fédération", "Agence"]
-
-# ==================== EXTRACTION DES OPTIONS UNIQUES ====================
-# Aires thérapeutiques
-aires_set = set()
-for val in df["Domaines médicaux investigués"].dropna():
-    parts = re.split(r",", str(val))
-    for p in parts:
-        p_clean = clean_value(p)
-        if p_clean:
-            aires_set.add(p_clean)
-aires_options = ["TOUT"] + sorted(aires_set)
-
-# **NOUVEAU : Extraction des dates de début**
-# Convertir la colonne "Date de début" en datetime
-df["Date de début"] = pd.to_datetime(df["Date de début"], errors='coerce')
-
-# Extraire les années uniques (en ignorant les valeurs NaT)
-annees_debut = df["Date de début"].dropna().dt.year.unique()
-annees_debut_options = ["TOUT"] + sorted([int(annee) for annee in annees_debut], reverse=True)
-
-# Sources de données
-sources_set = set()
-for val in df["Source de données utilisées enrichies"].dropna():
-    parts = re.split(r",", str(val))
-    for p in parts:
-        p_clean = clean_value(p)
-        if p_clean:
-            sources_set.add(p_clean)
-source_donnees_options = ["TOUT"] + sorted(sources_set)
-
-# Finalités
-finalites_set = set()
-for val in df["Finalité de l'étude"].dropna():
-    parts = re.split(r",", str(val))
-    for p in parts:
-        p_clean = clean_value(p)
-        if p_clean:
-            finalites_set.add(p_clean)
-finalites_options = ["TOUT"] + sorted(finalites_set)
-
-# Objectifs
-objectifs_set = set()
-for val in df["Objectifs poursuivis"].dropna():
-    parts = re.split(r",", str(val))
-    for p in parts:
-        p_clean = clean_value(p)
-        if p_clean:
-            objectifs_set.add(p_clean)
-objectifs_options = ["TOUT"] + sorted(objectifs_set)
-
-# Entités responsables
-entites_responsables = pd.concat([
-    df["Responsable de traitement 1"], 
-    df["Responsable de traitement 2"], 
-    df["Responsable de traitement 3"]
-]).dropna().unique()
-entites_options = sorted(entites_responsables)
+columns_display = hdh_engine.columns_display
+type_entite_options = hdh_engine.type_entite_options
+
+aires_options = engine.options["aires"]
+annees_debut_options = engine.options["annees"]
+source_donnees_options = engine.options["sources"]
+finalites_options = engine.options["finalites"]
+objectifs_options = engine.options["objectifs"]
+entites_options = engine.options["entites"]
+
+# Nombre de projets par valeur (calculé une fois avec le jeu de données)
+facet_counts = engine.options.get("counts", {})
+
+def format_with_count(facet):
+    """Affiche le nombre de projets à côté de chaque option d'une facette"""
+    counts = facet_counts.get(facet, {})
+    return lambda value: value if value == "TOUT" else f"{value} ({counts.get(value, 0)})"
+
+# Nœuds de la taxonomie des sources : l'option couvre toute la famille
+source_nodes = set(engine.options.get("source_nodes", []))
+
+def format_source(value):
+    label = format_with_count("sources")(value)
+    return f"{label} (famille)" if value in source_nodes else label
+
+# Périodes de début proposées (nombre de mois glissants)
+PERIODES_DEBUT = {
+    "TOUT": None,
+    "Dernier mois": 1,
+    "3 derniers mois": 3,
+    "6 derniers mois": 6,
+    "12 derniers mois": 12,
+    "Intervalle personnalisé": "custom",
+}
 
 # ==================== INITIALISATION DES ÉTATS ====================
 if 'selected_types' not in st.session_state:
@@ -493,202 +181,59 @@ if 'entite_search' not in st.session_state:
     st.session_state.entite_search = ""
 if 'selected_entite_dropdown' not in st.session_state:
     st.session_state.selected_entite_dropdown = []
-if 'current_results' not in st.session_state:
-    st.session_state.current_results = None
+if 'session_key' not in st.session_state:
+    st.session_state.session_key = uuid.uuid4().hex
+if 'search_spec' not in st.session_state:
+    st.session_state.search_spec = None
+if 'export_file' not in st.session_state:
+    st.session_state.export_file = None
+if 'saved_search_new' not in st.session_state:
+    st.session_state.saved_search_new = None
 if 'show_article' not in st.session_state:
     st.session_state.show_article = False
 if 'selected_article_index' not in st.session_state:
     st.session_state.selected_article_index = None
+if 'trigger_search' not in st.session_state:
+    st.session_state.trigger_search = False
 
-# ==================== APPLICATION DES TRANSFORMATIONS ====================
-df["Source de données utilisées enrichies"] = df.apply(normalize_and_enrich_sources, axis=1)
-df["Domaines médicaux investigués"] = df["Domaines médicaux investigués"].apply(normalize_autres)
-df["Statut"] = df["Etape  : Complétude"].apply(determine_status)
-df["search_text"] = df.astype(str).apply(lambda x: " ".join(x).lower(), axis=1)
 
-# ==================== COLONNES ET OPTIONS ====================
-columns_display = ["Référence", "title", "Source de données utilisées enrichies",
-                   "statut calendrier", "Domaines médicaux investigués",
-                   "Finalité de l'étude", "Objectifs poursuivis",
-                   "Responsable de traitement 1", "Responsable de traitement 2",
-                   "Responsable de traitement 3", "Description Entité mettant à disposition"]
-
-type_entite_options = ["Université", "Entreprise", "Etablissement public de santé", "Etablissement privé de santé",
-                       "Association", "Bureau d'étude", "Industriel", "Start-up", "INSERM", "Fédération", "Agence"]
-
-# ==================== EXTRACTION DES OPTIONS UNIQUES ====================
-# Aires thérapeutiques
-aires_set = set()
-for val in df["Domaines médicaux investigués"].dropna():
-    parts = re.split(r",", str(val))
-    for p in parts:
-        p_clean = clean_value(p)
-        if p_clean:
-            aires_set.add(p_clean)
-aires_options = ["TOUT"] + sorted(aires_set)
-
-# **NOUVEAU : Extraction des dates de début**
-# Convertir la colonne "Date de début" en datetime
-df["Date de début"] = pd.to_datetime(df["Date de début"], errors='coerce')
-
-# Extraire les années uniques (en ignorant les valeurs NaT)
-annees_debut = df["Date de début"].dropna().dt.year.unique()
-annees_debut_options = ["TOUT"] + sorted([int(annee) for annee in annees_debut], reverse=True)
-
-# Sources de données
-sources_set = set()
-for val in df["Source de données utilisées enrichies"].dropna():
-    parts = re.split(r",", str(val))
-    for p in parts:
-        p_clean = clean_value(p)
-        if p_clean:
-            sources_set.add(p_clean)
-source_donnees_options = ["TOUT"] + sorted(sources_set)
-
-# Finalités
-finalites_set = set()
-for val in df["Finalité de l'étude"].dropna():
-    parts = re.split(r",", str(val))
-    for p in parts:
-        p_clean = clean_value(p)
-        if p_clean:
-            finalites_set.add(p_clean)
-finalites_options = ["TOUT"] + sorted(finalites_set)
-
-# Objectifs
-objectifs_set = set()
-for val in df["Objectifs poursuivis"].dropna():
-    parts = re.split(r",", str(val))
-    for p in parts:
-        p_clean = clean_value(p)
-        if p_clean:
-            objectifs_set.add(p_clean)
-objectifs_options = ["TOUT"] + sorted(objectifs_set)
-
-# Entités responsables
-entites_responsables = pd.concat([
-    df["Responsable de traitement 1"], 
-    df["Responsable de traitement 2"], 
-    df["Responsable de traitement 3"]
-]).dropna().unique()
-entites_options = sorted(entites_responsables)
+@st.cache_resource
+def get_results_cache():
+    """Cache des résultats (identifiants de lignes) partagé par toutes les sessions du processus"""
+    return hdh_sessions.ResultCache()
 
-# ==================== INITIALISATION DES ÉTATS ====================
-if 'selected_types' not in st.session_state:
-    st.session_state.selected_types = ["TOUT"]
-if 'selected_aires' not in st.session_state:
-    st.session_state.selected_aires = ["TOUT"]
-if 'selected_sources' not in st.session_state:
-    st.session_state.selected_sources = ["TOUT"]
-if 'selected_finalites' not in st.session_state:
-    st.session_state.selected_finalites = ["TOUT"]
-if 'selected_objectifs' not in st.session_state:
-    st.session_state.selected_objectifs = ["TOUT"]
-if 'selected_annees' not in st.session_state:
-    st.session_state.selected_annees = ["TOUT"]
-if 'entite_search' not in st.session_state:
-    st.session_state.entite_search = ""
-if 'selected_entite_dropdown' not in st.session_state:
-    st.session_state.selected_entite_dropdown = []
-if 'current_results' not in st.session_state:
-    st.session_state.current_results = None
-if 'show_article' not in st.session_state:
-    st.session_state.show_article = False
-if 'selected_article_index' not in st.session_state:
-    st.session_state.selected_article_index = None
-if 'trigger_search' not in st.session_state:
-    st.session_state.trigger_search = False
+results_cache = get_results_cache()
 
 # ==================== FONCTION DE FILTRAGE ====================
 def get_filtered_df(query_global, selected_types, selected_aires, selected_sources, 
                     selected_finalites, selected_objectifs, entite_responsable, 
-                    selected_entite_dropdown, selected_annees, selected_status):
+                    selected_entite_dropdown, selected_annees, selected_status,
+                    date_range=None, semantic_query="", new_since=None):
     """
     Filtre le DataFrame selon tous les critères sélectionnés
     """
-    filtered_df = df.copy()
-
-    # Filtre recherche globale
-    if query_global:
-        filtered_df = filtered_df[filtered_df["search_text"].str.contains(query_global.lower(), na=False)]
-
-    # Filtre type d'entité
-    if selected_types and "TOUT" not in selected_types:
-        mask_type = False
-        for col in ["Type responsable treatment 1", "Type responsable treatment 2", "Type responsable treatment 3"]:
-            for t in selected_types:
-                mask_type = mask_type | filtered_df[col].astype(str).str.lower().str.contains(t.lower(), na=False)
-        filtered_df = filtered_df[mask_type]
-
-    # Filtre aire thérapeutique
-    if selected_aires and "TOUT" not in selected_aires:
-        mask_aire = False
-        for aire in selected_aires:
-            mask_aire = mask_aire | filtered_df["Domaines médicaux investigués"].astype(str).str.lower().str.contains(aire.lower(), na=False)
-        filtered_df = filtered_df[mask_aire]
-
-    # Filtre finalité
-    if selected_finalites and "TOUT" not in selected_finalites:
-        mask_finalite = False
-        for finalite in selected_finalites:
-            mask_finalite = mask_finalite | filtered_df["Finalité de l'étude"].astype(str).str.lower().str.contains(finalite.lower(), na=False)
-        filtered_df = filtered_df[mask_finalite]
-
-    # Filtre objectifs
-    if selected_objectifs and "TOUT" not in selected_objectifs:
-        mask_objectif = False
-        for objectif in selected_objectifs:
-            mask_objectif = mask_objectif | filtered_df["Objectifs poursuivis"].astype(str).str.lower().str.contains(objectif.lower(), na=False)
-        filtered_df = filtered_df[mask_objectif]
-
-    # Filtre entité responsable (combinaison recherche textuelle + dropdown)
-    if (entite_responsable and entite_responsable.strip() != "") or (selected_entite_dropdown and len(selected_entite_dropdown) > 0):
-        mask_entite = False
-
-        # Recherche textuelle
-        if entite_responsable and entite_responsable.strip() != "":
-            for col in ["Responsable de traitement 1", "Responsable de traitement 2", "Responsable de traitement 3"]:
-                mask_entite = mask_entite | filtered_df[col].astype(str).str.lower().str.contains(entite_responsable.lower(), na=False)
-
-        # Sélection dropdown
-        if selected_entite_dropdown and len(selected_entite_dropdown) > 0:
-            for entite in selected_entite_dropdown:
-                for col in ["Responsable de traitement 1", "Responsable de traitement 2", "Responsable de traitement 3"]:
-                    mask_entite = mask_entite | (filtered_df[col].astype(str) == entite)
-
-        filtered_df = filtered_df[mask_entite]
-
-    # Filtre date de début (année)
-    if selected_annees and "TOUT" not in selected_annees:
-        mask_annee = False
-        for annee in selected_annees:
-            mask_annee = mask_annee | (filtered_df["Date de début"].dt.year == annee)
-        filtered_df = filtered_df[mask_annee]
-
-    # Filtre source de données (avec gestion SNDS et HDH hiérarchique)
-    if selected_sources and "TOUT" not in selected_sources:
-        mask_source = False
-
-        # Vérifier si SNDS est sélectionné (sans sous-composante)
-        if "SNDS" in selected_sources:
-            mask_source = mask_source | filtered_df["Source de données utilisées enrichies"].astype(str).str.contains("SNDS", na=False)
-
-        # Vérifier si HDH est sélectionné (sans sous-base)
-        if "HDH" in selected_sources:
-            mask_source = mask_source | filtered_df["Source de données utilisées enrichies"].astype(str).str.contains("HDH", na=False)
-
-        # Pour les autres sources spécifiques
-        for s in selected_sources:
-            if s != "SNDS" and s != "HDH":
-                mask_source = mask_source | filtered_df["Source de données utilisées enrichies"].astype(str).str.lower().str.contains(re.escape(s.lower()), na=False)
-
-        filtered_df = filtered_df[mask_source]
-
-    # Filtre statut
-    if selected_status != "TOUT":
-        filtered_df = filtered_df[filtered_df["Statut"] == selected_status]
-
-    return filtered_df
+    return engine.search(
+        query_global=query_global, selected_types=selected_types, selected_aires=selected_aires,
+        selected_sources=selected_sources, selected_finalites=selected_finalites,
+        selected_objectifs=selected_objectifs, entite_responsable=entite_responsable,
+        selected_entite_dropdown=selected_entite_dropdown, selected_annees=selected_annees,
+        selected_status=selected_status, date_range=date_range, semantic_query=semantic_query,
+        new_since=new_since
+    )
+
+# ==================== HISTORIQUE DES VERSIONS ====================
+current_manifest = engine.manifest()
+# Versions antérieures à la version affichée, de la plus récente à la plus ancienne
+previous_versions = [(version, created_at) for version, created_at, _, _ in hdh_changes.get_feed().history()
+                     if current_manifest.version is None or version < current_manifest.version][::-1]
+
+
+def format_version(version, created_at):
+    when = pd.Timestamp(created_at, unit="s", tz="UTC").tz_convert("Europe/Paris")
+    return f"Version {version} du {when.strftime('%d/%m/%Y %H:%M')}"
+
+
+profile_mark("options, états et historique")
 
 # ==================== INTERFACE UTILISATEUR ====================
 
@@ -701,6 +246,15 @@ query_global = st.text_input(
     value=st.session_state.get("search_global", ""),
     on_change=lambda: st.session_state.update({"trigger_search": True})
 )
+semantic_query = st.text_input(
+    "Recherche sémantique (projets au contenu proche, même formulé autrement)",
+    placeholder="Décrivez le sujet recherché...",
+    key="search_semantic",
+    on_change=lambda: st.session_state.update({"trigger_search": True})
+)
+if semantic_query and engine.semantic_index() is None:
+    st.caption("Index sémantique indisponible pour ce jeu de données (trop peu de projets) : "
+               "recherche des projets contenant l'un des mots de la requête.")
 
 st.markdown("---")
 
@@ -761,6 +315,7 @@ with col2:
     selected_aires = st.multiselect(
         "Aire thérapeutique",
         options=aires_options,
+        format_func=format_with_count("aires"),
         default=st.session_state.selected_aires,
         key="aires_filter",
         label_visibility="collapsed"
@@ -779,6 +334,7 @@ with col2:
     selected_finalites = st.multiselect(
         "Finalité de l'étude",
         options=finalites_options,
+        format_func=format_with_count("finalites"),
         default=st.session_state.selected_finalites,
         key="finalites_filter",
         label_visibility="collapsed"
@@ -808,11 +364,36 @@ with col2:
         selected_annees = ["TOUT"]
     st.session_state.selected_annees = selected_annees
 
+    # **Filtre période de début** (résolu par l'index temporel)
+    st.markdown('<p class="filter-title">Période de début</p>', unsafe_allow_html=True)
+    selected_periode = st.selectbox(
+        "Période de début",
+        options=list(PERIODES_DEBUT),
+        key="periode_filter",
+        label_visibility="collapsed"
+    )
+    date_range = None
+    if PERIODES_DEBUT[selected_periode] == "custom":
+        periode_dates = st.date_input(
+            "Intervalle de dates",
+            value=(),
+            key="periode_dates",
+            format="DD/MM/YYYY",
+            label_visibility="collapsed"
+        )
+        if len(periode_dates) == 2:
+            date_range = (periode_dates[0].isoformat(),
+                          (pd.Timestamp(periode_dates[1]) + pd.Timedelta(days=1)).date().isoformat())
+    elif PERIODES_DEBUT[selected_periode] is not None:
+        start, end = hdh_indexes.last_months_range(PERIODES_DEBUT[selected_periode])
+        date_range = (start.date().isoformat(), end.date().isoformat())
+
 with col3:
     st.markdown('<p class="filter-title">Objectifs poursuivis</p>', unsafe_allow_html=True)
     selected_objectifs = st.multiselect(
         "Objectifs poursuivis",
         options=objectifs_options,
+        format_func=format_with_count("objectifs"),
         default=st.session_state.selected_objectifs,
         key="objectifs_filter",
         label_visibility="collapsed"
@@ -831,8 +412,11 @@ with col3:
     selected_sources = st.multiselect(
         "Source de données",
         options=source_donnees_options,
+        format_func=format_source,
         default=st.session_state.selected_sources,
         key="sources_filter",
+        help="Une option « (famille) » couvre toutes ses sources : SNDS et ses composantes, "
+             "HDH et ses bases, « Hors SNDS et HDH » pour toute source rattachée à aucun des deux.",
         label_visibility="collapsed"
     )
     # Logique TOUT pour sources
@@ -854,9 +438,51 @@ with col3:
         label_visibility="collapsed"
     )
 
+    # **Filtre nouveautés** (projets apparus depuis une version précédente du jeu de données)
+    st.markdown('<p class="filter-title">Nouveaux projets depuis…</p>', unsafe_allow_html=True)
+    selected_since = st.selectbox(
+        "Nouveaux projets depuis",
+        options=[None] + previous_versions,
+        format_func=lambda entry: "TOUT" if entry is None else format_version(*entry),
+        key="new_since_filter",
+        label_visibility="collapsed"
+    )
+    new_since = None
+    if selected_since is not None:
+        new_since = pd.Timestamp(selected_since[1], unit="s", tz="UTC").isoformat()
+
 st.markdown("---")
 
-# ==================== BOUTONS D'ACTION ====================
+profile_mark("filtres")
+
+# ==================== RECHERCHES ENREGISTRÉES ====================
+# Résultats matérialisés et maintenus à chaque nouvelle version des données :
+# l'ouverture ne réévalue que les projets ajoutés ou modifiés depuis
+saved_store = hdh_saved.get_store()
+open_saved = None
+with st.sidebar:
+    st.markdown("### ⭐ Recherches enregistrées")
+    saved_new_counts = saved_store.new_counts(engine)
+    if saved_new_counts:
+        saved_name = st.selectbox(
+            "Recherche enregistrée",
+            options=list(saved_new_counts),
+            format_func=lambda name: f"{name} (🆕 {saved_new_counts[name]})" if saved_new_counts[name] else name,
+            key="saved_search_name"
+        )
+        col_open, col_delete = st.columns(2)
+        with col_open:
+            if st.button("📂 Ouvrir", use_container_width=True):
+                open_saved = saved_name
+        with col_delete:
+            if st.button("🗑️ Supprimer", use_container_width=True):
+                saved_store.delete(saved_name)
+                st.rerun()
+    else:
+        st.caption("Aucune recherche enregistrée")
+
+profile_mark("recherches enregistrées")
+
 # ==================== BOUTONS D'ACTION ====================
 col_btn1, col_btn2 = st.columns(2)
 
@@ -873,39 +499,174 @@ if st.session_state.get("trigger_search", False):
     st.session_state.trigger_search = False
 
 # Exécuter la recherche si nécessaire
+# La session ne garde que la spécification des filtres ; les résultats sont
+# conservés dans le cache partagé sous forme d'identifiants de lignes
+current_results = None
 if should_search:
-    filtered_df = get_filtered_df(
-        query_global, selected_types, selected_aires, selected_sources,
-        selected_finalites, selected_objectifs, entite_responsable, 
-        selected_entite_dropdown, selected_annees, selected_status
-    )
-    st.session_state.current_results = filtered_df
+    search_spec = {
+        "query_global": query_global,
+        "selected_types": list(selected_types),
+        "selected_aires": list(selected_aires),
+        "selected_sources": list(selected_sources),
+        "selected_finalites": list(selected_finalites),
+        "selected_objectifs": list(selected_objectifs),
+        "entite_responsable": entite_responsable,
+        "selected_entite_dropdown": list(selected_entite_dropdown),
+        "selected_annees": list(selected_annees),
+        "selected_status": selected_status,
+        "date_range": date_range,
+        "semantic_query": semantic_query,
+        "new_since": new_since,
+    }
+    current_results = get_filtered_df(**search_spec)
+    results_cache.store(st.session_state.session_key, search_spec, engine.version, current_results.index)
+    st.session_state.search_spec = search_spec
+    st.session_state.saved_search_new = None
+    st.session_state.show_article = False
+elif open_saved is not None:
+    # Recherche enregistrée : ensemble de résultats déjà à jour, nouveaux résultats signalés
+    saved_search = saved_store.refresh(open_saved, engine)
+    row_ids = hdh_saved.row_ids(saved_search, engine)
+    st.session_state.saved_search_new = set(saved_search.new_references().tolist())
+    saved_store.mark_viewed(open_saved)
+    current_results = df.take(row_ids)
+    results_cache.store(st.session_state.session_key, saved_search.spec, engine.version, row_ids)
+    st.session_state.search_spec = saved_search.spec
     st.session_state.show_article = False
+elif st.session_state.search_spec is not None:
+    # Reconstruit à partir de la spécification si l'entrée a été évincée
+    search_spec = st.session_state.search_spec
+    row_ids = results_cache.get(
+        st.session_state.session_key, search_spec, engine.version,
+        lambda: engine.search(**search_spec).index
+    )
+    current_results = df.take(row_ids)
+
+# Enregistrement de la recherche courante
+if st.session_state.search_spec is not None:
+    with st.sidebar:
+        saved_as = saved_store.find(st.session_state.search_spec)
+        if saved_as is not None:
+            st.caption(f"Recherche courante enregistrée sous « {saved_as} »")
+        else:
+            saved_search_name = st.text_input(
+                "Nom de la recherche",
+                placeholder="Nommer la recherche courante...",
+                key="saved_search_new_name"
+            )
+            if st.button("⭐ Enregistrer la recherche", disabled=not saved_search_name.strip(),
+                         use_container_width=True):
+                saved_store.save(saved_search_name.strip(), st.session_state.search_spec, engine)
+                st.rerun()
+
+profile_mark("recherche")
+
+# Formats proposés : libellé -> (format, compression gzip) ; None pour Excel
+EXPORT_CHOICES = {
+    "Excel (.xlsx)": None,
+    "CSV (.csv)": ("csv", False),
+    "CSV compressé (.csv.gz)": ("csv", True),
+    "JSON Lines (.jsonl)": ("jsonl", False),
+    "JSON Lines compressé (.jsonl.gz)": ("jsonl", True),
+}
+
+
+# Données du bouton de téléchargement lues au clic (Streamlit >= 1.52) plutôt
+# qu'à chaque réexécution tant que le panneau est ouvert
+DEFERRED_DOWNLOAD = tuple(int(part) for part in st.__version__.split(".")[:2]) >= (1, 52)
+
+
+def prepare_export(row_ids, choice, all_columns):
+    """
+    Prépare le fichier d'export dans un fichier temporaire de hdh_export.EXPORT_DIR :
+    CSV / JSON Lines écrits par blocs (mémoire constante), Excel construit en
+    mémoire puis écrit ; la session ne garde que le chemin
+    """
+    hdh_export.purge_exports()
+    os.makedirs(hdh_export.EXPORT_DIR, exist_ok=True)
+    columns = hdh_export.select_columns(df, all_columns)
+    export_format = EXPORT_CHOICES[choice]
+    if export_format is None:
+        return {"path": hdh_export.write_excel(df, row_ids, columns, directory=hdh_export.EXPORT_DIR),
+                "file_name": "resultats_filtrés.xlsx", "mime": hdh_export.EXCEL_MEDIA_TYPE}
+    fmt, compress = export_format
+    return {"path": hdh_export.write_export(df, row_ids, columns, fmt, compress, directory=hdh_export.EXPORT_DIR),
+            "file_name": hdh_export.export_filename(fmt, compress, stem="resultats_filtrés"),
+            "mime": hdh_export.media_type(fmt, compress)}
+
+
+def discard_export():
+    export_file = st.session_state.export_file
+    if export_file:
+        try:
+            os.unlink(export_file["path"])
+        except OSError:
+            pass
+    st.session_state.export_file = None
+
+
+def read_export(path):
+    with open(path, "rb") as f:
+        return f.read()
+
 
 with col_btn2:
-    if st.session_state.current_results is not None and not st.session_state.current_results.empty:
-        # Fonction pour créer le fichier Excel en mémoire
-        def create_excel_download():
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                st.session_state.current_results.to_excel(writer, index=False, sheet_name='Résultats')
-            output.seek(0)
-            return output.getvalue()
-
-        excel_data = create_excel_download()
-        st.download_button(
-            label="📥 Exporter Excel",
-            data=excel_data,
-            file_name="resultats_filtrés.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
+    # Options d'export construites seulement quand le panneau est affiché
+    if st.toggle("📥 Exporter", key="show_export"):
+        has_results = current_results is not None and not current_results.empty
+        export_scope = st.radio(
+            "Périmètre",
+            options=["Résultats de la recherche", "Catalogue complet"],
+            index=0 if has_results else 1,
+            disabled=not has_results,
+            key="export_scope"
         )
-    else:
-        # Bouton désactivé si aucun résultat
-        st.button("📥 Aucun résultat", disabled=True, use_container_width=True)
+        export_choice = st.selectbox("Format", options=list(EXPORT_CHOICES), key="export_choice")
+        export_all_columns = st.radio(
+            "Colonnes",
+            options=[False, True],
+            format_func=lambda all_columns: "Tous les champs" if all_columns else "Colonnes du tableau",
+            key="export_all_columns"
+        )
+        if EXPORT_CHOICES[export_choice] is None and export_scope == "Catalogue complet":
+            st.caption("Pour de gros volumes, préférez CSV ou JSON Lines (écrits par blocs).")
+
+        export_spec = st.session_state.search_spec if has_results and export_scope == "Résultats de la recherche" else None
+        if hdh_export.EXPORT_URL:
+            # API déployée : export en flux par GET /export, sans fichier côté Streamlit
+            fmt, compress = EXPORT_CHOICES[export_choice] or ("xlsx", False)
+            st.link_button("📥 Télécharger", hdh_export.export_url(hdh_export.EXPORT_URL, export_spec, fmt, compress,
+                                                                  export_all_columns),
+                           use_container_width=True)
+        else:
+            export_rows = current_results.index.to_numpy() if export_spec is not None else None
+            export_key = (engine.version, repr(export_spec), export_choice, export_all_columns)
+            export_file = st.session_state.export_file
+            if export_file and (export_file["key"] != export_key or not os.path.exists(export_file["path"])):
+                # Critères modifiés, ou fichier purgé (EXPORT_TTL) : à préparer de nouveau
+                discard_export()
+
+            if st.session_state.export_file is None:
+                if st.button("Préparer l'export", use_container_width=True):
+                    with st.spinner("Préparation de l'export..."):
+                        export_file = prepare_export(export_rows, export_choice, export_all_columns)
+                    st.session_state.export_file = dict(export_file, key=export_key)
+
+            export_file = st.session_state.export_file
+            if export_file is not None:
+                path = export_file["path"]
+                st.download_button(label=f"📥 Télécharger {export_file['file_name']}",
+                                   data=(lambda: read_export(path)) if DEFERRED_DOWNLOAD else read_export(path),
+                                   file_name=export_file["file_name"], mime=export_file["mime"],
+                                   use_container_width=True)
+    elif st.session_state.export_file is not None:
+        # Panneau fermé : fichier temporaire supprimé
+        discard_export()
 
 st.markdown("---")
 
+profile_mark("export")
+
 # ==================== AFFICHAGE DES CRITÈRES ACTIFS ====================
 # Afficher les critères de filtrage actuellement actifs
 criteria_active = []
@@ -913,6 +674,9 @@ criteria_active = []
 if query_global:
     criteria_active.append(f"**Recherche textuelle:** {query_global}")
 
+if semantic_query:
+    criteria_active.append(f"**Recherche sémantique:** {semantic_query}")
+
 if selected_types != ["TOUT"]:
     criteria_active.append(f"**Type d'entité:** {', '.join(selected_types)}")
 
@@ -937,9 +701,15 @@ if selected_objectifs != ["TOUT"]:
 if selected_annees != ["TOUT"]:
     criteria_active.append(f"**Années de début:** {', '.join([str(a) for a in selected_annees])}")
 
+if date_range:
+    criteria_active.append(f"**Période de début:** {selected_periode} ({date_range[0]} → {date_range[1]} exclu)")
+
 if selected_status != "TOUT":
     criteria_active.append(f"**Statut:** {selected_status}")
 
+if selected_since is not None:
+    criteria_active.append(f"**Nouveaux projets depuis:** {format_version(*selected_since)}")
+
 if criteria_active:
     with st.expander("🎯 Critères de filtrage actifs", expanded=False):
         for criteria in criteria_active:
@@ -947,11 +717,14 @@ if criteria_active:
 else:
     st.info("ℹ️ Aucun filtre actif - Tous les projets seront affichés lors de la recherche")
 
+profile_mark("critères actifs")
+
 # ==================== AFFICHAGE DES RÉSULTATS ====================
-if st.session_state.current_results is not None:
-    num_results = len(st.session_state.current_results)
+if current_results is not None:
+    num_results = len(current_results)
 
     # Métriques des résultats avec couleurs améliorées
+    status_totals = hdh_cube.status_counts(current_results)
     col_metric1, col_metric2, col_metric3 = st.columns(3)
 
     with col_metric1:
@@ -959,19 +732,35 @@ if st.session_state.current_results is not None:
 
     with col_metric2:
         if num_results > 0:
-            en_cours = len(st.session_state.current_results[st.session_state.current_results["Statut"] == "En cours"])
-            st.metric("🔄 Projets en cours", en_cours)
+            st.metric("🔄 Projets en cours", status_totals["En cours"])
 
     with col_metric3:
         if num_results > 0:
-            termines = len(st.session_state.current_results[st.session_state.current_results["Statut"] == "Terminé"])
-            st.metric("✅ Projets terminés", termines)
+            st.metric("✅ Projets terminés", status_totals["Terminé"])
 
     if num_results > 0:
         st.markdown("### 📋 Tableau des résultats")
 
+        # Regroupement des resoumissions / avenants d'une même étude
+        regroup_duplicates = st.checkbox(
+            "🧬 Regrouper les quasi-doublons",
+            key="regroup_duplicates",
+            help="N'affiche qu'un projet par groupe de projets quasi identiques (titre et objectifs)"
+        )
+        shown_results = current_results
+        shown_columns = columns_display
+        if regroup_duplicates:
+            shown_results = hdh_dedup.collapse_duplicates(current_results)
+            shown_columns = ["Versions"] + columns_display
+            st.caption(f"{len(shown_results)} groupe(s) pour {num_results} projet(s)")
+
         # Afficher le DataFrame avec les colonnes sélectionnées
-        display_df = st.session_state.current_results[columns_display].copy()
+        display_df = shown_results[shown_columns].copy()
+        if st.session_state.saved_search_new:
+            # Nouveaux résultats de la recherche enregistrée depuis sa dernière ouverture
+            is_new = shown_results["Référence"].astype(str).isin(st.session_state.saved_search_new)
+            display_df.insert(0, "Nouveau", is_new.map({True: "🆕", False: ""}))
+            st.caption(f"🆕 {int(is_new.sum())} nouveau(x) résultat(s) depuis la dernière ouverture")
 
         # Configurer l'affichage du dataframe avec hauteur fixe
         st.dataframe(
@@ -988,78 +777,97 @@ if st.session_state.current_results is not None:
             }
         )
 
+        profile_mark("tableau des résultats")
+
         # ==================== VISUALISATION D'UN ARTICLE ====================
         st.markdown("---")
-        st.markdown("### 👁️ Visualiser un article en détail")
-
-        # Sélection de l'article à visualiser
-        references = st.session_state.current_results["Référence"].tolist()
-
-        col_select, col_action = st.columns([3, 1])
-
-        with col_select:
-            selected_reference = st.selectbox(
-                "Sélectionnez un article par sa référence",
-                options=["Sélectionner un article..."] + references,
-                key="article_selector"
-            )
-
-        with col_action:
-            if selected_reference and selected_reference != "Sélectionner un article...":
-                if st.button("👁️ Visualiser", type="primary", use_container_width=True):
-                    st.session_state.show_article = True
-                    st.session_state.selected_article_index = selected_reference
-                    st.rerun()
-
-        # Affichage de l'article sélectionné
-        if st.session_state.show_article and st.session_state.selected_article_index:
-            try:
-                article_row = st.session_state.current_results[
-                    st.session_state.current_results["Référence"] == st.session_state.selected_article_index
-                ].iloc[0]
-
-                st.markdown("---")
-
-                # En-tête de l'article avec bouton fermer
-                col_title, col_close = st.columns([4, 1])
-
-                with col_title:
-                    st.markdown(f"## 📄 Détails de l'article - {st.session_state.selected_article_index}")
-
-                with col_close:
-                    if st.button("❌ Fermer", use_container_width=True):
-                        st.session_state.show_article = False
-                        st.session_state.selected_article_index = None
+        # Sélecteur et fiche construits seulement quand la visualisation est affichée
+        if st.toggle("👁️ Visualiser un article en détail", key="show_article_viewer"):
+            # Sélection de l'article à visualiser
+            references = shown_results["Référence"].tolist()
+
+            col_select, col_action = st.columns([3, 1])
+
+            with col_select:
+                selected_reference = st.selectbox(
+                    "Sélectionnez un article par sa référence",
+                    options=["Sélectionner un article..."] + references,
+                    key="article_selector"
+                )
+
+            with col_action:
+                if selected_reference and selected_reference != "Sélectionner un article...":
+                    if st.button("👁️ Visualiser", type="primary", use_container_width=True):
+                        st.session_state.show_article = True
+                        st.session_state.selected_article_index = selected_reference
                         st.rerun()
 
-                # Conteneur avec barre de défilement
-                with st.container():
-                    # Afficher toutes les colonnes du DataFrame
-                    all_columns = list(df.columns)
-
-                    for col in all_columns:
-                        if col in article_row.index:
-                            # Titre du champ (en rouge)
-                            st.markdown(f'<div class="article-field-label">{col}</div>', unsafe_allow_html=True)
-
-                            # Valeur du champ
-                            value = article_row[col]
-
-                            # Vérifier si la valeur est vide ou NaN
-                            if pd.isna(value) or str(value).strip() == "" or str(value).lower() == "nan":
-                                st.markdown('<div class="article-field-empty">Donnée non renseignée</div>', unsafe_allow_html=True)
-                            else:
-                                display_value = str(value)
-                                # Utiliser un fond légèrement coloré pour améliorer la lisibilité
-                                st.markdown(f'<div class="article-field-value">{display_value}</div>', unsafe_allow_html=True)
-
-                            # Ligne de séparation
-                            st.markdown("---")
-
-            except IndexError:
-                st.error("❌ Article non trouvé dans les résultats.")
-            except Exception as e:
-                st.error(f"❌ Erreur lors de l'affichage de l'article : {e}")
+            # Affichage de l'article sélectionné
+            if st.session_state.show_article and st.session_state.selected_article_index:
+                try:
+                    article_row = current_results[
+                        current_results["Référence"] == st.session_state.selected_article_index
+                    ].iloc[0]
+
+                    st.markdown("---")
+
+                    # En-tête de l'article avec bouton fermer
+                    col_title, col_close = st.columns([4, 1])
+
+                    with col_title:
+                        st.markdown(f"## 📄 Détails de l'article - {st.session_state.selected_article_index}")
+
+                    with col_close:
+                        if st.button("❌ Fermer", use_container_width=True):
+                            st.session_state.show_article = False
+                            st.session_state.selected_article_index = None
+                            st.rerun()
+
+                    # Conteneur avec barre de défilement
+                    with st.container():
+                        # Afficher toutes les colonnes du DataFrame
+                        all_columns = list(df.columns)
+
+                        for col in all_columns:
+                            if col in article_row.index:
+                                # Titre du champ (en rouge)
+                                st.markdown(f'<div class="article-field-label">{col}</div>', unsafe_allow_html=True)
+
+                                # Valeur du champ
+                                value = article_row[col]
+
+                                # Vérifier si la valeur est vide ou NaN
+                                if pd.isna(value) or str(value).strip() == "" or str(value).lower() == "nan":
+                                    st.markdown('<div class="article-field-empty">Donnée non renseignée</div>', unsafe_allow_html=True)
+                                else:
+                                    display_value = str(value)
+                                    # Utiliser un fond légèrement coloré pour améliorer la lisibilité
+                                    st.markdown(f'<div class="article-field-value">{display_value}</div>', unsafe_allow_html=True)
+
+                                # Ligne de séparation
+                                st.markdown("---")
+
+                    # Projets au contenu proche (index sémantique local)
+                    if st.button("🔗 Projets similaires", use_container_width=True):
+                        with st.spinner("Recherche des projets similaires..."):
+                            similar_df = engine.similar_projects(st.session_state.selected_article_index, k=10)
+                        if similar_df is None or similar_df.empty:
+                            st.info("ℹ️ Aucun projet similaire trouvé.")
+                        else:
+                            st.dataframe(
+                                similar_df[["Similarité", "Référence", "title", "Domaines médicaux investigués"]],
+                                use_container_width=True,
+                                hide_index=True,
+                                column_config={
+                                    "Similarité": st.column_config.ProgressColumn("Similarité", min_value=0.0, max_value=1.0, format="%.2f"),
+                                    "title": st.column_config.TextColumn("Titre", width="large"),
+                                }
+                            )
+
+                except IndexError:
+                    st.error("❌ Article non trouvé dans les résultats.")
+                except Exception as e:
+                    st.error(f"❌ Erreur lors de l'affichage de l'article : {e}")
 
     else:
         st.info("ℹ️ Aucun résultat trouvé avec les critères sélectionnés.")
@@ -1075,19 +883,84 @@ else:
     # Message d'accueil quand aucune recherche n'a été effectuée
     st.info("👆 Utilisez les filtres ci-dessus et cliquez sur 'Rechercher' pour afficher les résultats.")
 
-    # Statistiques générales de la base de données
+    # Statistiques générales de la base de données (lues dans le cube précalculé)
+    cube = engine.analytics_cube()
     col_stat1, col_stat2, col_stat3 = st.columns(3)
 
     with col_stat1:
-        st.metric("📊 Total des projets", len(df))
+        st.metric("📊 Total des projets", cube.total())
 
     with col_stat2:
-        en_cours_total = len(df[df["Statut"] == "En cours"])
-        st.metric("🔄 Projets en cours", en_cours_total)
+        st.metric("🔄 Projets en cours", cube.total("En cours"))
 
     with col_stat3:
-        termines_total = len(df[df["Statut"] == "Terminé"])
-        st.metric("✅ Projets terminés", termines_total)
+        st.metric("✅ Projets terminés", cube.total("Terminé"))
+
+    # Tendances par année de début
+    st.markdown("### 📈 Tendances")
+    col_trend1, col_trend2 = st.columns(2)
+    with col_trend1:
+        trend_dimension = st.selectbox(
+            "Répartition par",
+            options=list(hdh_cube.DIMENSION_LABELS),
+            format_func=lambda dimension: hdh_cube.DIMENSION_LABELS[dimension],
+            key="trend_dimension"
+        )
+    with col_trend2:
+        trend_status = st.selectbox(
+            "Statut",
+            options=["Tous"] + hdh_indexes.STATUS_LABELS,
+            key="trend_status"
+        )
+
+    trend = cube.trend(trend_dimension, statut=None if trend_status == "Tous" else trend_status)
+    if trend.empty:
+        st.info("Aucune date de début renseignée pour tracer les tendances.")
+    else:
+        trend.index = trend.index.astype(str)
+        st.bar_chart(trend)
+        st.caption("Nombre de projets par année de début (un projet mobilisant plusieurs valeurs compte pour chacune)")
+
+    # Changements entre la version affichée et une version précédente (diff calculé à la demande)
+    st.markdown("### 🆕 Changements")
+    if st.toggle("Comparer avec une version précédente", key="show_changes"):
+        if not previous_versions:
+            st.info("Aucune version précédente : les changements apparaîtront après la prochaine actualisation des données.")
+        else:
+            changes_since = st.selectbox(
+                "Comparer avec",
+                options=previous_versions,
+                format_func=lambda entry: format_version(*entry),
+                key="changes_since"
+            )
+            changes = engine.changes_since(changes_since[0])
+            col_change1, col_change2, col_change3 = st.columns(3)
+            with col_change1:
+                st.metric("➕ Projets ajoutés", len(changes["added"]))
+            with col_change2:
+                st.metric("✏️ Projets modifiés", len(changes["modified"]))
+            with col_change3:
+                st.metric("➖ Projets supprimés", len(changes["removed"]))
+
+            changes_table = hdh_changes.diff_frame(df, changes)
+            if not changes_table.empty:
+                st.dataframe(changes_table, use_container_width=True, hide_index=True)
+                st.download_button(
+                    label="📥 Exporter les changements (CSV)",
+                    data=changes_table.to_csv(index=False).encode("utf-8"),
+                    file_name=f"changements_depuis_v{changes_since[0]}.csv",
+                    mime="text/csv"
+                )
+
+profile_mark("visualisation d'un article" if current_results is not None else "accueil")
+
+# ==================== MÉMOIRE DES SESSIONS ====================
+session_stats = results_cache.stats()
+st.sidebar.metric(
+    "🧠 Mémoire des sessions",
+    f"{session_stats['memory_bytes'] / 1024:.1f} Ko",
+    help=f"{session_stats['sessions']} session(s) avec des résultats en cache"
+)
 
 # ==================== FOOTER ====================
 st.markdown("---")
@@ -1098,7 +971,16 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-
-
-
-
+# ==================== PROFIL DE L'EXÉCUTION ====================
+profile_mark("mémoire des sessions et footer")
+st.session_state.rerun_profile = {
+    section: (end - start) * 1000
+    for (_, start), (section, end) in zip(_profile_marks, _profile_marks[1:])
+}
+if PROFILE:
+    with st.sidebar.expander("⏱️ Profil de l'exécution", expanded=False):
+        st.caption(f"Total : {sum(st.session_state.rerun_profile.values()):.0f} ms")
+        st.dataframe(
+            pd.Series(st.session_state.rerun_profile, name="ms").round(1),
+            use_container_width=True
+        )
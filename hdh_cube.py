@@ -0,0 +1,188 @@
+"""
+Cube d'agrégats précalculé pour les statistiques de la page d'accueil et les
+courbes de tendance.
+
+Construit une fois par version du jeu de données : nombre de projets par
+cellule non vide des cinq dimensions (année, statut, source, aire
+thérapeutique, type d'entité), dans une petite table creuse. Pour une
+dimension multi-valeurs, la coordonnée d'un projet est la combinaison de ses
+valeurs (SNDS + HDH) : chaque projet compte dans une seule cellule, la table a
+au plus autant de lignes que de projets (en pratique bien moins), et les
+tranches (ex. sources des projets en oncologie terminés) comme les marges
+(projets par année et source) s'en déduisent exactement, en projets distincts,
+sans parcourir la table des projets. Un projet mobilisant SNDS et HDH compte
+pour chacune des deux sources dans les marges.
+"""
+import numpy as np
+import pandas as pd
+
+import hdh_engine
+import hdh_indexes
+
+DIMENSION_LABELS = {
+    "source": "Source de données",
+    "aire": "Aire thérapeutique",
+    "type_entite": "Type d'entité",
+    "statut": "Statut",
+}
+UNKNOWN = "Non renseigné"
+
+
+def _pairs(row_ids, values, dimension):
+    return pd.DataFrame({"row_id": np.asarray(row_ids, dtype=np.int64), dimension: values})
+
+
+def _with_unknown(pairs, n_rows, dimension):
+    """Ajoute la valeur "Non renseigné" aux projets sans valeur pour la dimension"""
+    missing = np.setdiff1d(np.arange(n_rows), pairs["row_id"].to_numpy())
+    return pd.concat([pairs, _pairs(missing, UNKNOWN, dimension)], ignore_index=True)
+
+
+def _source_pairs(engine):
+    """Racines de la taxonomie (SNDS, HDH, Hors SNDS et HDH) mobilisées par chaque projet"""
+    source_index = engine.indexes.get("sources")
+    frames = []
+    if source_index is not None:
+        roots = [root for root in hdh_indexes.get_taxonomy().roots if root in source_index.nodes]
+        for root in roots:
+            frames.append(_pairs(source_index.nodes[root], root, "source"))
+    pairs = pd.concat(frames, ignore_index=True) if frames else _pairs([], [], "source")
+    return _with_unknown(pairs, len(engine.df), "source")
+
+
+def _aire_pairs(df):
+    row_ids, values = [], []
+    memo = {}
+    for row_id, val in enumerate(df[hdh_engine.FACET_COLUMNS["aires"]].tolist()):
+        if val is None or pd.isna(val):
+            continue
+        parts = memo.get(val)
+        if parts is None:
+            parts = memo[val] = {p for p in (hdh_engine.clean_value(x) for x in str(val).split(",")) if p}
+        for part in parts:
+            row_ids.append(row_id)
+            values.append(part)
+    return _with_unknown(_pairs(row_ids, values, "aire"), len(df), "aire")
+
+
+def _type_pairs(df):
+    """Types d'entité reconnus dans les colonnes "Type responsable" (même règle que le filtre)"""
+    frames = []
+    for t in hdh_engine.type_entite_options:
+        mask = np.zeros(len(df), dtype=bool)
+        for col in hdh_engine.TYPE_RESPONSABLE_COLUMNS:
+            mask |= hdh_engine._contains_any(df[col], [t])
+        frames.append(_pairs(np.flatnonzero(mask), t, "type_entite"))
+    return _with_unknown(pd.concat(frames, ignore_index=True), len(df), "type_entite")
+
+
+def _combinations(pairs, n_rows, dimension):
+    """
+    Combinaison des valeurs de chaque projet pour une dimension multi-valeurs :
+    (code de combinaison par projet, table (code, valeur) des combinaisons)
+    """
+    value_codes, values = pd.factorize(pairs[dimension], sort=True)
+    row_ids = pairs["row_id"].to_numpy()
+    order = np.lexsort((value_codes, row_ids))
+    row_ids, value_codes = row_ids[order], value_codes[order]
+    keep = np.ones(len(row_ids), dtype=bool)
+    keep[1:] = (row_ids[1:] != row_ids[:-1]) | (value_codes[1:] != value_codes[:-1])
+    row_ids, value_codes = row_ids[keep], value_codes[keep]
+
+    # Valeurs (triées) de chaque projet → code de combinaison, dans l'ordre d'apparition
+    first = np.ones(len(row_ids), dtype=bool)
+    first[1:] = row_ids[1:] != row_ids[:-1]
+    starts = np.flatnonzero(first)
+    bounds = starts.tolist() + [len(row_ids)]
+    value_list = value_codes.tolist()
+    combinations = {}
+    codes = [combinations.setdefault(tuple(value_list[lo:hi]), len(combinations))
+             for lo, hi in zip(bounds, bounds[1:])]
+    row_codes = np.zeros(n_rows, dtype=np.int64)
+    row_codes[row_ids[starts]] = codes
+    members = pd.DataFrame({
+        "code": np.repeat(np.arange(len(combinations)), [len(c) for c in combinations]),
+        "valeur": np.asarray(values, dtype=object)[[v for combination in combinations for v in combination]],
+    })
+    return row_codes, members
+
+
+class AnalyticsCube:
+    """
+    Table creuse des projets par cellule (année, statut, combinaison de sources,
+    d'aires et de types d'entité) ; tranches et marges calculées à la demande
+    """
+
+    def __init__(self, engine):
+        df = engine.df
+        n_rows = len(df)
+        years = df["Date de début"].dt.year
+        coordinates = {
+            "annee": years.fillna(0).astype(int).to_numpy(),
+            "statut": df["Statut"].astype(str).to_numpy(),
+        }
+
+        # Combinaisons de valeurs des dimensions multi-valeurs
+        self.members = {}
+        pairs = {"source": _source_pairs(engine), "aire": _aire_pairs(df), "type_entite": _type_pairs(df)}
+        for dimension, dimension_pairs in pairs.items():
+            coordinates[dimension], self.members[dimension] = _combinations(dimension_pairs, n_rows, dimension)
+
+        # Cellules non vides (une ligne par cellule)
+        self.cells = (pd.DataFrame(coordinates).groupby(list(coordinates)).size()
+                      .rename("projets").reset_index())
+        self.n_projects = n_rows
+
+    def select(self, **where):
+        """
+        Tranche : cellules des projets ayant chaque valeur donnée (annee=2021,
+        statut="Terminé", source="SNDS", aire=..., type_entite=... ; None : toutes)
+        """
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dimension, value in where.items():
+            if value is None:
+                continue
+            if dimension in self.members:
+                members = self.members[dimension]
+                codes = members.loc[members["valeur"] == value, "code"].to_numpy()
+                mask &= np.isin(self.cells[dimension].to_numpy(), codes)
+            else:
+                mask &= (self.cells[dimension] == value).to_numpy()
+        return self.cells[mask]
+
+    def marginal(self, dimension, **where):
+        """
+        Projets distincts par (année, statut, valeur de `dimension`) dans la
+        tranche `where` (Series à MultiIndex)
+        """
+        cells = self.select(**where)
+        if dimension not in self.members:
+            return cells.groupby(["annee", "statut"])["projets"].sum()
+        exploded = cells.merge(self.members[dimension], left_on=dimension, right_on="code")
+        return (exploded.groupby(["annee", "statut", "valeur"])["projets"].sum()
+                .rename_axis(["annee", "statut", dimension]))
+
+    def total(self, statut=None, **where):
+        """Nombre de projets distincts (tous, pour un statut ou dans une tranche)"""
+        if statut is None and not any(value is not None for value in where.values()):
+            return self.n_projects
+        return int(self.select(statut=statut, **where)["projets"].sum())
+
+    def trend(self, dimension, statut=None, top=8, **where):
+        """
+        Projets par année de début (lignes) et valeur de `dimension` (colonnes),
+        limité aux `top` valeurs les plus fréquentes ; années inconnues exclues.
+        `statut` et `where` restreignent à une tranche du cube.
+        """
+        counts = self.marginal(dimension, statut=statut, **where)
+        table = counts.groupby(level=["annee", dimension]).sum().unstack(dimension, fill_value=0)
+        table = table.drop(index=0, errors="ignore")
+        table = table.drop(columns=UNKNOWN, errors="ignore")
+        top_values = table.sum().sort_values(ascending=False).index[:top]
+        return table[top_values].sort_index()
+
+
+def status_counts(results):
+    """Projets en cours / terminés d'un résultat, en une passe sur la colonne Statut"""
+    counts = results["Statut"].value_counts()
+    return {status: int(counts.get(status, 0)) for status in ["En cours", "Terminé"]}
@@ -0,0 +1,112 @@
+"""
+Détection des quasi-doublons (resoumissions, avenants d'une même étude sous des
+`Référence` différentes) par MinHash et LSH.
+
+Chaque projet reçoit une signature MinHash calculée sur les 5-grammes de
+caractères de son titre et de ses objectifs normalisés. Les signatures sont
+découpées en bandes : deux projets partageant une bande tombent dans le même
+seau et deviennent candidats. Seuls les candidats sont comparés (au
+représentant de leur seau), ce qui évite la comparaison de toutes les paires.
+"""
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+DEDUP_COLUMNS = ["title", "Objectifs poursuivis"]
+CLUSTER_COLUMN = "cluster_id"
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 8                    # 8 bandes de 8 lignes : seuil LSH ≈ (1/8)^(1/8) ≈ 0.77
+ROWS_PER_BAND = NUM_PERM // BANDS
+DUPLICATE_THRESHOLD = 0.8    # Similarité de Jaccard estimée minimale
+
+# Famille de hachage multiplicatif (a·x + b mod 2^64) >> 32, a impair, graine fixe
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, 2 ** 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+_EMPTY = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+
+def normalize_text(text):
+    """Minuscules, sans accents ni ponctuation, espaces réduits"""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Empreintes (crc32, stables d'un processus à l'autre) des n-grammes de caractères"""
+    if len(text) < size:
+        return np.array([zlib.crc32(text.encode("utf-8"))], dtype=np.uint64) if text else np.empty(0, dtype=np.uint64)
+    grams = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(hashes):
+    """Signature MinHash (NUM_PERM valeurs uint32) d'un ensemble d'empreintes"""
+    if len(hashes) == 0:
+        return _EMPTY
+    with np.errstate(over="ignore"):
+        permuted = (hashes[:, None] * _A[None, :] + _B[None, :]) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def compute_signatures(df):
+    """Signatures MinHash des projets (tableau n × NUM_PERM) ; calculable par blocs de lignes"""
+    columns = [col for col in DEDUP_COLUMNS if col in df.columns]
+    texts = df[columns].astype(str).replace({"nan": "", "<NA>": "", "None": ""})
+    texts = texts.apply(lambda x: " ".join(x), axis=1)
+    signatures = np.empty((len(df), NUM_PERM), dtype=np.uint32)
+    for i, text in enumerate(texts.tolist()):
+        signatures[i] = minhash(shingles(normalize_text(text)))
+    return signatures
+
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def cluster_signatures(signatures, threshold=DUPLICATE_THRESHOLD):
+    """
+    Identifiant de groupe par projet : plus petit identifiant de ligne du groupe
+    de quasi-doublons (le projet lui-même s'il n'a pas de doublon)
+    """
+    n = len(signatures)
+    parents = np.arange(n)
+    valid = ~(signatures == _EMPTY).all(axis=1)
+
+    for band in range(BANDS):
+        band_values = signatures[:, band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        representatives = {}
+        for i in np.flatnonzero(valid):
+            key = band_values[i].tobytes()
+            first = representatives.setdefault(key, i)
+            if first == i:
+                continue
+            root_i, root_first = _find(parents, i), _find(parents, first)
+            if root_i == root_first:
+                continue
+            # Vérification sur la signature complète (similarité de Jaccard estimée)
+            if np.mean(signatures[i] == signatures[first]) >= threshold:
+                parents[max(root_i, root_first)] = min(root_i, root_first)
+
+    return np.array([_find(parents, i) for i in range(n)], dtype=np.int64)
+
+
+def collapse_duplicates(df):
+    """
+    Ne garde que le premier projet de chaque groupe de quasi-doublons présent dans
+    `df` ; la colonne "Versions" indique le nombre de projets regroupés
+    """
+    if CLUSTER_COLUMN not in df.columns or df.empty:
+        return df
+    sizes = df[CLUSTER_COLUMN].map(df[CLUSTER_COLUMN].value_counts())
+    collapsed = df.assign(Versions=sizes.astype(int))
+    return collapsed[~collapsed[CLUSTER_COLUMN].duplicated(keep="first")]
+
@@ -0,0 +1,469 @@
+"""
+Pages détaillées des projets sur health-data-hub.fr (étape optionnelle, à côté
+de load_data).
+
+L'export Excel HDH ne contient que les champs de synthèse ; la page de chaque
+projet porte un texte plus complet. Le robot d'exploration (asyncio) récupère
+ces pages avec une concurrence bornée (nombre de tâches), un pool de connexions
+HTTP réutilisées (requests.Session exécutée dans un pool de threads) et une
+limite de débit par hôte. Les erreurs temporaires (429, 5xx, réseau) sont
+réessayées avec attente exponentielle (ou Retry-After).
+
+Chaque page récupérée est ajoutée au cache disque (JSON Lines, écrit par lots)
+avant d'alimenter les index de texte des moteurs abonnés : une exploration
+interrompue reprend là où elle s'était arrêtée, et les résultats de recherche
+s'enrichissent au fil de l'exploration.
+
+Propriétaire du cache : en mode processus unique, l'application qui a chargé
+les données explore en arrière-plan (crawl_in_background) ; en mode instantané,
+le processus constructeur (hdh_snapshot.py) explore au premier plan avant
+chaque publication, dans le répertoire des instantanés, et les workers ne font
+que lire ce cache (relu à chaque nouvelle version).
+
+Organisation du répertoire (.cache/details, ou details/ dans le répertoire des instantanés) :
+    pages.jsonl         une ligne par page : référence, url, statut HTTP, date, texte
+
+    python hdh_details.py --concurrency 8 --rate 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DIR = os.path.join(
+    os.environ.get("HDH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")),
+    "details"
+)
+PAGES_FILENAME = "pages.jsonl"
+# Sous-répertoire du cache dans le répertoire des instantanés (écrit par le constructeur)
+SNAPSHOT_SUBDIR = "details"
+
+# Adresse de la page d'un projet ({reference} : Référence encodée pour l'URL)
+DETAIL_URL = os.environ.get("HDH_DETAIL_URL", "https://www.health-data-hub.fr/projets/{reference}")
+
+CONCURRENCY = 8           # Requêtes simultanées au plus
+RATE_PER_HOST = 4.0       # Requêtes par seconde et par hôte
+TIMEOUT = 30              # Secondes par requête
+RETRIES = 3               # Nouvelles tentatives sur erreur temporaire
+BACKOFF = 1.0             # Attente initiale avant une nouvelle tentative (doublée à chaque essai)
+BATCH_SIZE = 20           # Pages écrites sur disque (et transmises aux index) à la fois
+MAX_AGE = 7 * 24 * 3600   # Au-delà, une page en cache est récupérée à nouveau
+MAX_TEXT_CHARS = 20000
+
+# Page absente : mémorisée pour ne pas la redemander à chaque exploration
+ABSENT_STATUSES = {404, 410}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8',
+}
+
+
+# ==================== EXTRACTION DU TEXTE ====================
+def extract_text(html):
+    """Texte du contenu principal d'une page projet (sans menus, scripts ni pied de page)"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(["script", "style", "noscript", "nav", "header", "footer", "form"]):
+        element.decompose()
+    content = soup.find("main") or soup.find("article") or soup.body or soup
+    return " ".join(content.get_text(" ", strip=True).split())[:MAX_TEXT_CHARS]
+
+
+def detail_url(reference, template=DETAIL_URL):
+    return template.format(reference=quote(str(reference), safe=""))
+
+
+# ==================== CACHE DISQUE ====================
+class PageCache:
+    """
+    Pages récupérées (dernier enregistrement par référence), en mémoire et dans
+    un fichier JSON Lines où les lots sont ajoutés au fil de l'exploration.
+    Un lecteur reprend les lignes ajoutées par un autre processus depuis sa
+    dernière lecture (refresh).
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, compact=True):
+        self.path = os.path.join(directory, PAGES_FILENAME)
+        self.records = {}
+        self._lock = threading.Lock()
+        self._listeners = weakref.WeakSet()
+        self._position = (None, 0)  # (inode, octets lus) du fichier
+        n_lines = len(self._read_new())
+        # Pages récupérées plusieurs fois : réécriture du fichier sans les anciennes versions
+        if compact and n_lines > 2 * len(self.records):
+            self._rewrite()
+
+    def _read_new(self):
+        """Lit les lignes complètes ajoutées depuis la dernière lecture (tout le fichier s'il a été remplacé)"""
+        inode, offset = self._position
+        try:
+            with open(self.path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != inode or stat.st_size < offset:
+                    self.records, offset = {}, 0
+                f.seek(offset)
+                records = []
+                for line in f:
+                    if not line.endswith(b"\n"):  # Dernière ligne en cours d'écriture : relue la fois suivante
+                        break
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:  # Ligne tronquée (exploration interrompue)
+                        continue
+                    self.records[record["reference"]] = record
+                    records.append(record)
+                self._position = (stat.st_ino, offset)
+                return records
+        except FileNotFoundError:
+            return []
+
+    def _rewrite(self):
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self.records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self._position = (os.stat(self.path).st_ino, os.path.getsize(self.path))
+
+    def refresh(self):
+        """Reprend les pages ajoutées au fichier par un autre processus et les transmet aux index abonnés"""
+        with self._lock:
+            records = self._read_new()
+            listeners = list(self._listeners)
+        if records:
+            for listener in listeners:
+                listener.update(records)
+        return len(records)
+
+    def missing(self, references, max_age=MAX_AGE):
+        """Références sans page en cache (ou dont la page date de plus de `max_age` secondes)"""
+        now = time.time()
+        with self._lock:
+            return [reference for reference in dict.fromkeys(str(r) for r in references)
+                    if reference not in self.records
+                    or now - self.records[reference]["fetched_at"] > max_age]
+
+    def add(self, records):
+        """
+        Ajoute un lot de pages au fichier puis le transmet aux index abonnés ;
+        OSError si le lot n'a pas pu être écrit (il n'est alors pas retenu)
+        """
+        if not records:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._read_new()
+            with open(self.path, "ab") as f:
+                f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8"))
+                self._position = (os.fstat(f.fileno()).st_ino, f.tell())
+            for record in records:
+                self.records[record["reference"]] = record
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener.update(records)
+
+    def subscribe(self, listener):
+        """Abonne `listener` (méthode update(records)) et lui transmet les pages en cache, relues du fichier"""
+        with self._lock:
+            self._read_new()
+            self._listeners.add(listener)
+            records = list(self.records.values())
+        listener.update(records)
+
+    def text(self, reference):
+        record = self.records.get(str(reference))
+        return record.get("text", "") if record else ""
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Cache des pages partagé du processus : celui du répertoire d'instantanés
+    (HDH_SNAPSHOT_DIR, écrit par le constructeur) ou celui du cache local
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            snapshot_dir = os.environ.get("HDH_SNAPSHOT_DIR")
+            if snapshot_dir:
+                # Lecteur : le fichier n'est réécrit (compacté) que par le constructeur
+                _cache = PageCache(os.path.join(snapshot_dir, SNAPSHOT_SUBDIR), compact=False)
+            else:
+                _cache = PageCache()
+        return _cache
+
+
+# ==================== INDEX DE TEXTE ====================
+class DetailIndex:
+    """
+    Texte (en minuscules) de la page détaillée de chaque ligne d'un jeu de
+    données, complété au fil de l'exploration ; interrogé par l'étape « texte »
+    du plan de requête en plus de search_text.
+
+    La date de récupération de la page qui a modifié le texte de chaque ligne
+    est conservée : `generation` (la plus récente) et `changed_since` permettent
+    de réévaluer les seules lignes dont le texte a changé (voir hdh_saved.py).
+    Ces dates viennent du cache de pages, elles sont identiques d'un processus à l'autre.
+    """
+
+    def __init__(self, references, cache=None):
+        self.positions = {}
+        for row_id, reference in enumerate(references.astype(str)):
+            self.positions.setdefault(reference, []).append(row_id)
+        self.texts = np.full(len(references), "", dtype=object)
+        self.fetched_at = np.zeros(len(references), dtype=np.float64)
+        self.n_pages = 0
+        self._lock = threading.Lock()
+        if cache is not None:
+            cache.subscribe(self)
+
+    def update(self, records):
+        with self._lock:
+            for record in records:
+                row_ids = self.positions.get(record["reference"])
+                if row_ids is None:
+                    continue
+                text = record.get("text", "").lower()
+                if self.texts[row_ids[0]] == text:
+                    continue
+                if not self.texts[row_ids[0]]:
+                    self.n_pages += 1
+                self.texts[row_ids] = text
+                self.fetched_at[row_ids] = record.get("fetched_at", 0.0)
+
+    @property
+    def generation(self):
+        """Date de récupération de la dernière page ayant modifié le texte d'une ligne (0 si aucune)"""
+        return float(self.fetched_at.max()) if len(self.fetched_at) else 0.0
+
+    def changed_since(self, generation):
+        """Lignes dont le texte a changé après `generation`"""
+        return np.flatnonzero(self.fetched_at > generation)
+
+    def contains(self, query, row_ids):
+        """Masque des lignes `row_ids` dont la page détaillée contient `query` (mêmes règles que search_text)"""
+        if not self.n_pages:
+            return np.zeros(len(row_ids), dtype=bool)
+        return pd.Series(self.texts[row_ids]).str.contains(query, na=False).to_numpy(dtype=bool)
+
+
+# ==================== EXPLORATION ====================
+class HostRateLimiter:
+    """Espace les requêtes vers un même hôte d'au moins 1 / `rate` secondes"""
+
+    def __init__(self, rate=RATE_PER_HOST):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = {}
+
+    async def wait(self, host):
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next.get(host, now))
+        self._next[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, host, delay):
+        """Aucune requête vers `host` avant `delay` secondes (429, Retry-After)"""
+        resume = asyncio.get_running_loop().time() + delay
+        self._next[host] = max(self._next.get(host, resume), resume)
+
+
+def _retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class DetailCrawler:
+    """Récupère les pages détaillées de références et les ajoute au cache par lots"""
+
+    def __init__(self, cache, url_template=DETAIL_URL, concurrency=CONCURRENCY, rate=RATE_PER_HOST,
+                 timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF, batch_size=BATCH_SIZE, notify=None):
+        self.cache = cache
+        self.url_template = url_template
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.notify = notify
+
+    def _session(self):
+        """Session HTTP dont les connexions sont réutilisées par toutes les tâches"""
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(HEADERS)
+        return session
+
+    def _fetch(self, session, url):
+        """
+        Requête bloquante (exécutée dans le pool de threads) -> (statut, Retry-After, texte) ;
+        statut None sur erreur réseau
+        """
+        import requests
+
+        try:
+            response = session.get(url, timeout=self.timeout)
+        except requests.RequestException:
+            return None, None, ""
+        text = extract_text(response.content) if response.status_code == 200 else ""
+        return response.status_code, _retry_after(response.headers.get("Retry-After")), text
+
+    async def _fetch_page(self, reference, session, executor, limiter, stats):
+        loop = asyncio.get_running_loop()
+        url = detail_url(reference, self.url_template)
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            await limiter.wait(host)
+            try:
+                status, retry_after, text = await loop.run_in_executor(executor, self._fetch, session, url)
+            except Exception:
+                # Page illisible (extraction du texte...) : échec de cette page seulement, sans nouvelle tentative
+                logger.warning("Page détaillée %s non traitée", url, exc_info=True)
+                stats["échecs"] += 1
+                return None
+            if status == 200 or status in ABSENT_STATUSES:
+                stats["absentes" if status in ABSENT_STATUSES else "récupérées"] += 1
+                return {"reference": reference, "url": url, "status": status,
+                        "fetched_at": time.time(), "text": text if status == 200 else ""}
+            if status is not None and status not in RETRY_STATUSES:
+                break
+            stats["nouvelles tentatives"] += 1
+            delay = retry_after if retry_after is not None else self.backoff * 2 ** attempt
+            if status == 429 or retry_after is not None:
+                limiter.pause(host, delay)
+            else:
+                await asyncio.sleep(delay)
+        stats["échecs"] += 1
+        return None
+
+    async def run(self, references):
+        """Explore `references` ; les pages récupérées sont enregistrées même en cas d'interruption"""
+        stats = dict.fromkeys(["récupérées", "absentes", "nouvelles tentatives", "échecs", "non enregistrées"], 0)
+        queue = asyncio.Queue()
+        for reference in references:
+            queue.put_nowait(reference)
+        batch = []
+        session = self._session()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="hdh-details")
+        limiter = HostRateLimiter(self.rate)
+
+        async def worker():
+            while True:
+                try:
+                    reference = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                record = await self._fetch_page(reference, session, executor, limiter, stats)
+                if record is not None:
+                    batch.append(record)
+                    if len(batch) >= self.batch_size:
+                        records = batch[:]
+                        batch.clear()
+                        self._save(records, stats)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(references)))))
+        finally:
+            self._save(batch, stats)
+            executor.shutdown(wait=False, cancel_futures=True)
+            session.close()
+        return stats
+
+    def _save(self, records, stats):
+        """Enregistre un lot ; un échec d'écriture est journalisé et compté, l'exploration continue"""
+        try:
+            self.cache.add(records)
+        except OSError:
+            # Pages non retenues : toujours absentes du cache, elles seront redemandées
+            logger.warning("Lot de %d pages détaillées non enregistré dans %s", len(records), self.cache.path,
+                           exc_info=True)
+            stats["non enregistrées"] += len(records)
+
+    def crawl(self, references, max_age=MAX_AGE):
+        """Explore les références absentes du cache (ou trop anciennes) ; retourne les compteurs"""
+        todo = self.cache.missing(references, max_age)
+        start = time.time()
+        stats = asyncio.run(self.run(todo)) if todo else {}
+        if self.notify is not None:
+            self.notify("info", f"📄 Pages détaillées : {len(todo)} à récupérer, {stats} "
+                                f"en {time.time() - start:.0f} s")
+        return stats
+
+
+_crawl_lock = threading.Lock()
+
+
+def crawl_in_background(references, notify=None, **options):
+    """
+    Lance l'exploration dans un thread (une seule à la fois par processus) ; les
+    index abonnés au cache partagé reçoivent les pages au fil de l'eau.
+    Retourne le thread, ou None si une exploration est déjà en cours.
+    """
+    if not _crawl_lock.acquire(blocking=False):
+        return None
+
+    def run():
+        try:
+            DetailCrawler(get_cache(), notify=notify, **options).crawl(references)
+        except Exception as e:
+            if notify is not None:
+                notify("error", f"❌ Erreur lors de l'exploration des pages détaillées : {e}")
+        finally:
+            _crawl_lock.release()
+
+    thread = threading.Thread(target=run, name="hdh-details-crawl", daemon=True)
+    thread.start()
+    return thread
+
+
+# ==================== POINT D'ENTRÉE ====================
+def main():
+    import hdh_engine
+
+    parser = argparse.ArgumentParser(description="Récupère les pages détaillées des projets HDH dans le cache")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=RATE_PER_HOST, help="Requêtes par seconde et par hôte")
+    parser.add_argument("--max-age", type=float, default=MAX_AGE / 86400, help="Âge maximal d'une page (jours)")
+    parser.add_argument("--url", default=DETAIL_URL, help="Modèle d'adresse d'une page ({reference})")
+    parser.add_argument("--dir", help="Répertoire des instantanés dont remplir le cache (défaut : cache local)")
+    args = parser.parse_args()
+
+    raw_df = hdh_engine.load_data()
+    if raw_df.empty:
+        raise SystemExit("Aucune donnée chargée")
+    cache = PageCache(os.path.join(args.dir, SNAPSHOT_SUBDIR)) if args.dir else PageCache()
+    crawler = DetailCrawler(cache, url_template=args.url, concurrency=args.concurrency, rate=args.rate,
+                            notify=hdh_engine.log_notify)
+    stats = crawler.crawl(raw_df["Référence"].dropna(), max_age=args.max_age * 86400)
+    print(f"{len(cache.records)} pages en cache ({cache.path}) ; {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1058 @@
+"""
+Moteur de recherche des projets HDH, indépendant de l'interface.
+
+Regroupe le chargement des données (scraping HDH + fichier de secours),
+l'enrichissement des colonnes, l'extraction des options de filtres et le
+filtrage. Ce module est importé à la fois par l'application Streamlit
+(hdh_code_web.py) et par l'API HTTP (hdh_api.py).
+"""
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import hdh_dedup
+import hdh_index_file
+import hdh_indexes
+import hdh_normalize
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONSTANTES ====================
+HDH_URL = "https://www.health-data-hub.fr/projets"
+
+FALLBACK_FILENAME = "repertoire_projets.xlsx"
+
+columns_display = ["Référence", "title", "Source de données utilisées enrichies",
+                   "statut calendrier", "Domaines médicaux investigués",
+                   "Finalité de l'étude", "Objectifs poursuivis",
+                   "Responsable de traitement 1", "Responsable de traitement 2",
+                   "Responsable de traitement 3", "Description Entité mettant à disposition"]
+
+type_entite_options = ["Université", "Entreprise", "Etablissement public de santé", "Etablissement privé de santé",
+                       "Association", "Bureau d'étude", "Industriel", "Start-up", "INSERM", "Fédération", "Agence"]
+
+TYPE_RESPONSABLE_COLUMNS = ["Type responsable treatment 1", "Type responsable treatment 2", "Type responsable treatment 3"]
+RESPONSABLE_COLUMNS = ["Responsable de traitement 1", "Responsable de traitement 2", "Responsable de traitement 3"]
+
+STATUS_OPTIONS = ["TOUT", "En cours", "Terminé"]
+
+
+# ==================== NOTIFICATIONS ====================
+def log_notify(level, message):
+    """Notification par défaut : envoie les messages au logger du module"""
+    log_level = {"success": logging.INFO, "info": logging.INFO,
+                 "warning": logging.WARNING, "error": logging.ERROR}.get(level, logging.INFO)
+    logger.log(log_level, message)
+
+
+# ==================== CHARGEMENT DES DONNÉES ====================
+def load_data(notify=log_notify):
+    """
+    Charge les données depuis le site HDH en scrapant le lien de téléchargement
+
+    `notify(level, message)` reçoit les messages d'avancement
+    (level parmi "info", "success", "warning", "error").
+    Si la variable d'environnement HDH_OFFLINE est définie, seul le fichier de
+    secours est utilisé (tests de charge, environnements sans accès réseau).
+    """
+    if os.environ.get("HDH_OFFLINE"):
+        return load_fallback_data(notify)
+
+    import requests
+    from bs4 import BeautifulSoup
+
+    try:
+        url = HDH_URL
+
+        # Headers plus complets pour éviter les blocages
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+        }
+
+        # Récupérer la page avec session pour maintenir les cookies
+        session = requests.Session()
+        response = session.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+
+        # Parser le HTML
+        soup = BeautifulSoup(response.content, 'html.parser')
+
+        # Stratégies multiples pour trouver le lien Excel
+        download_link = None
+
+        # Stratégie 1: Chercher les liens avec des mots-clés dans le texte
+
+        # Rechercher tous les liens
+        all_links = soup.find_all('a', href=True)
+
+        for link in all_links:
+            href = link.get('href', '')
+            text = link.get_text(strip=True).lower()
+
+            # Vérifier si c'est un fichier Excel
+            if any(ext in href.lower() for ext in ['.xlsx', '.xls']):
+                download_link = href
+                break
+
+            # Vérifier si le texte contient des mots-clés de téléchargement
+            if any(keyword in text for keyword in ['télécharger', 'download', 'excel', 'xlsx']):
+                # Vérifier si le lien pointe vers un fichier ou une page de téléchargement
+                if href and not href.startswith('#'):
+                    download_link = href
+                    notify("info", f"✅ Lien trouvé par mot-clé '{text}': {href}")
+                    break
+
+        # Stratégie 2: Chercher dans les attributs data-* ou onclick
+        if not download_link:
+            for element in soup.find_all(['a', 'button', 'div']):
+                for attr_name, attr_value in element.attrs.items():
+                    if isinstance(attr_value, str) and any(ext in attr_value.lower() for ext in ['.xlsx', '.xls']):
+                        download_link = attr_value
+                        notify("info", f"✅ Lien trouvé dans l'attribut {attr_name}: {attr_value}")
+                        break
+                if download_link:
+                    break
+
+        # Stratégie 3: Chercher des patterns spécifiques au site HDH
+        if not download_link:
+            # Chercher des liens vers des fichiers ou APIs
+            for link in all_links:
+                href = link.get('href', '')
+                if any(pattern in href.lower() for pattern in ['/api/', '/download/', '/file/', '/export/']):
+                    # Vérifier si ça pourrait être notre fichier
+                    if 'projet' in href.lower() or 'repertoire' in href.lower():
+                        download_link = href
+                        notify("info", f"✅ Lien API/Download trouvé: {href}")
+                        break
+
+        if not download_link:
+            notify("error", "❌ Impossible de trouver le lien de téléchargement Excel")
+            notify("info", "🔍 Liens trouvés sur la page:")
+
+            # Afficher quelques liens pour debug
+            for i, link in enumerate(all_links[:10]):
+                href = link.get('href', '')
+                text = link.get_text(strip=True)
+                notify("info", f"- {text[:50]}... → {href[:100]}...")
+
+            return load_fallback_data(notify)
+
+        # Construire l'URL complète
+        if download_link.startswith('/'):
+            download_link = "https://www.health-data-hub.fr" + download_link
+        elif not download_link.startswith('http'):
+            download_link = "https://www.health-data-hub.fr/" + download_link.lstrip('/')
+
+        # Télécharger le fichier Excel
+        excel_response = session.get(download_link, headers=headers, timeout=60)
+        excel_response.raise_for_status()
+
+        # Vérifier que c'est bien un fichier Excel
+        content_type = excel_response.headers.get('content-type', '').lower()
+        if 'excel' not in content_type and 'spreadsheet' not in content_type:
+            notify("warning", f"⚠️ Type de contenu inattendu: {content_type}")
+
+        # Lire le fichier Excel depuis la mémoire
+        df = pd.read_excel(BytesIO(excel_response.content), engine="openpyxl")
+
+        notify("success", f"✅ Données chargées avec succès ! ({len(df)} projets trouvés)")
+
+        return df
+
+    except requests.exceptions.RequestException as e:
+        notify("error", f"❌ Erreur de connexion au site HDH : {e}")
+        return load_fallback_data(notify)
+    except Exception as e:
+        notify("error", f"❌ Erreur lors du chargement des données : {e}")
+        return load_fallback_data(notify)
+
+
+def load_fallback_data(notify=log_notify):
+    """
+    Fonction de secours : charge le fichier local si le scraping échoue
+    """
+    try:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        file_path = os.path.join(base_path, FALLBACK_FILENAME)
+
+        if os.path.exists(file_path):
+            notify("warning", "⚠️ Utilisation du fichier local de secours")
+            df = pd.read_excel(file_path, engine="openpyxl")
+            notify("info", f"📁 Fichier local chargé ({len(df)} projets)")
+            return df
+        else:
+            notify("error", "❌ Aucun fichier de secours trouvé")
+            notify("info", "💡 Vous pouvez télécharger manuellement le fichier Excel depuis https://www.health-data-hub.fr/projets et le placer dans le dossier de l'application")
+            return pd.DataFrame()
+
+    except Exception as e:
+        notify("error", f"❌ Erreur lors du chargement du fichier de secours : {e}")
+        return pd.DataFrame()
+
+
+def details_enabled():
+    """Étape optionnelle d'exploration des pages détaillées des projets (HDH_DETAILS)"""
+    return bool(os.environ.get("HDH_DETAILS"))
+
+
+# ==================== FONCTIONS DE NETTOYAGE DES DONNÉES ====================
+def clean_value(text):
+    """Nettoie les valeurs indésirables et applique les normalisations de base"""
+    if pd.isna(text) or str(text).lower() == "nan":
+        return ""
+
+    text_str = str(text).strip()
+
+    # Enlever les underscores seuls
+    if text_str == "_" or text_str == "":
+        return ""
+
+    # CépiDC → "Causes médicales de décès", "Echantillon du ENSD" → "ESND",
+    # variantes de Enquête(s) et Autre(s) (règles "valeurs" de normalization_rules.json)
+    return hdh_normalize.get_rules().apply("valeurs", text_str)
+
+
+def is_snds_component(source_name):
+    """Vérifie si une source fait partie du SNDS (composantes déclarées dans sources_taxonomy.json)"""
+    return hdh_indexes.get_taxonomy().is_component("SNDS", source_name)
+
+
+# Fonction pour normaliser et enrichir les sources de données
+def normalize_and_enrich_sources(row):
+    """
+    Enrichit la colonne 'Source de données utilisées' avec :
+    - Les composantes SNDS si SNDS est mentionné
+    - Les bases HDH si HDH est mentionné
+    - Les autres sources si 'autre' est mentionné
+    - Force ESND et Causes médicales de décès dans SNDS
+    """
+    source_principale = str(row.get("Source de données utilisées", ""))
+
+    if pd.isna(source_principale) or source_principale == "nan":
+        return ""
+
+    sources_enrichies = []
+    sources_snds_trouvees = set()
+    has_explicit_snds = False
+
+    rules = hdh_normalize.get_rules()
+    parts = source_principale.split(",")
+
+    for part in parts:
+        part_clean = clean_value(part)
+
+        if not part_clean:
+            continue
+
+        # Catégorie la plus prioritaire mentionnée (SNDS, puis HDH, puis Autres), en une recherche
+        category = rules.category(part_clean)
+
+        # Cas 1 : SNDS explicitement mentionné
+        if category == "SNDS":
+            has_explicit_snds = True
+
+            # Ajouter les composantes du SNDS
+            composantes_snds = clean_value(row.get("Composante(s) de la base principale du SNDS mobilisée(s)", ""))
+            if composantes_snds:
+                sous_composantes = composantes_snds.split(",")
+                for sc in sous_composantes:
+                    sc_clean = clean_value(sc)
+                    if sc_clean:
+                        sources_snds_trouvees.add(sc_clean)
+
+        # Cas 2 : HDH mentionné
+        elif category == "HDH":
+            sources_enrichies.append("HDH")
+
+            # Ajouter les bases du HDH
+            bases_hdh = clean_value(row.get("Base(s) du catalogue du HDH mobilisée(s)", ""))
+            if bases_hdh:
+                sous_bases = bases_hdh.split(",")
+                for sb in sous_bases:
+                    sb_clean = clean_value(sb)
+                    if sb_clean:
+                        sources_enrichies.append(f"HDH - {sb_clean}")
+
+        # Cas 3 : Autre/Autres mentionné
+        elif category == "Autres":
+            autres_sources = clean_value(row.get("Autre(s) source(s) de donnée(s) mobilisée(s)", ""))
+
+            if autres_sources:
+                sous_autres = autres_sources.split(",")
+                for sa in sous_autres:
+                    sa_clean = clean_value(sa)
+                    if sa_clean:
+                        # Vérifier si cette "autre source" fait partie du SNDS
+                        if is_snds_component(sa_clean):
+                            sources_snds_trouvees.add(sa_clean)
+                            has_explicit_snds = True
+                        else:
+                            sources_enrichies.append(sa_clean)
+            else:
+                sources_enrichies.append("Autres")
+
+        # Cas 4 : Composante SNDS directe (ESND, Causes médicales de décès, etc.)
+        elif is_snds_component(part_clean):
+            sources_snds_trouvees.add(part_clean)
+            has_explicit_snds = True
+
+        # Cas 5 : Autre source non catégorisée
+        else:
+            if part_clean:
+                sources_enrichies.append(part_clean)
+
+    # Si on a trouvé des composantes SNDS ou SNDS explicite, ajouter SNDS + composantes
+    if has_explicit_snds or sources_snds_trouvees:
+        # Ajouter SNDS en premier
+        final_sources = ["SNDS"]
+
+        # Ajouter toutes les composantes trouvées
+        for composante in sorted(sources_snds_trouvees):
+            final_sources.append(f"SNDS - {composante}")
+
+        # Ajouter les autres sources
+        final_sources.extend(sources_enrichies)
+
+        return ", ".join(final_sources)
+
+    # Sinon, retourner les sources normales
+    return ", ".join(sources_enrichies) if sources_enrichies else ""
+
+
+# Fonction pour normaliser les termes "Autre/Autres" génériques
+def normalize_autres(text):
+    """Normalise 'Autre' et 'Autres' vers 'Autres' (pour les autres colonnes)"""
+    if pd.isna(text):
+        return text
+    # Autres) / Autre(s) / autre(s) → Autres (règles "autres" de normalization_rules.json)
+    return hdh_normalize.get_rules().apply("autres", str(text))
+
+
+# ==================== APPLICATION DES TRANSFORMATIONS ====================
+# Colonnes multi-valeurs (séparées par des virgules) dont on extrait les options des filtres
+FACET_COLUMNS = {
+    "aires": "Domaines médicaux investigués",
+    "sources": "Source de données utilisées enrichies",
+    "finalites": "Finalité de l'étude",
+    "objectifs": "Objectifs poursuivis",
+}
+
+# En dessous de ce nombre de lignes, le coût de démarrage du pool dépasse le gain
+PARALLEL_MIN_ROWS = 20000
+
+
+def _enrich_rows(df):
+    """Transformations ligne à ligne d'un bloc de lignes (date de début déjà convertie)"""
+    df = df.copy()
+    df["Source de données utilisées enrichies"] = df.apply(normalize_and_enrich_sources, axis=1)
+    for column in hdh_normalize.get_rules().columns("autres"):
+        df[column] = df[column].apply(normalize_autres)
+    df["Statut"] = hdh_indexes.compute_status(df["Etape  : Complétude"])
+    df["search_text"] = df.astype(str).apply(lambda x: " ".join(x).lower(), axis=1)
+    return df
+
+
+def _build_chunk(df, text_index=False):
+    """
+    Tâche du pool : enrichit un bloc et retourne ses comptages locaux par facette,
+    les signatures MinHash de ses projets et ses index (identifiants de lignes
+    locaux au bloc, fusionnés ensuite par build_dataset)
+    """
+    df = _enrich_rows(df)
+    indexes = SearchEngine.build_indexes(df)
+    if text_index:
+        indexes["text"] = hdh_indexes.TextIndex.build(df["search_text"])
+    return df, build_facet_counts(df), hdh_dedup.compute_signatures(df), indexes
+
+
+def _default_workers():
+    return int(os.environ.get("HDH_BUILD_WORKERS", os.cpu_count() or 1))
+
+
+def build_dataset(raw_df, workers=None, text_index=False):
+    """
+    Enrichit le DataFrame brut, construit le vocabulaire des facettes et les
+    index (temporel, sources et, si `text_index`, index du texte).
+
+    Au-delà de PARALLEL_MIN_ROWS lignes (ou si `workers` est donné explicitement),
+    les lignes sont partitionnées en blocs traités dans un pool de processus ;
+    les blocs sont réassemblés dans leur ordre d'origine, les comptages
+    additionnés et les index des blocs fusionnés (identifiants décalés de la
+    première ligne de chaque bloc), si bien que le résultat est identique au
+    traitement séquentiel.
+
+    Chaque projet reçoit aussi l'identifiant de son groupe de quasi-doublons
+    (colonne cluster_id, voir hdh_dedup.py).
+
+    Retourne (df enrichi, {facette: {valeur: nombre de projets}}, {nom: index}).
+    """
+    df = raw_df.copy()
+
+    # Convertir la colonne "Date de début" en datetime (sur tout le tableau, pour
+    # que l'inférence du format ne dépende pas du découpage en blocs)
+    df["Date de début"] = pd.to_datetime(df["Date de début"], errors='coerce')
+
+    if workers is None:
+        workers = _default_workers() if len(df) >= PARALLEL_MIN_ROWS else 1
+    workers = max(1, min(workers, len(df)))
+
+    if workers == 1:
+        chunk_results = [_build_chunk(df, text_index)]
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Plusieurs blocs par processus pour équilibrer la charge
+        positions = np.array_split(np.arange(len(df)), workers * 4)
+        chunks = [df.iloc[pos] for pos in positions if len(pos)]
+        # "spawn" : le processus parent (Streamlit, uvicorn) est multi-threadé
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            chunk_results = list(executor.map(functools.partial(_build_chunk, text_index=text_index), chunks))
+
+    enriched = pd.concat([chunk_df for chunk_df, _, _, _ in chunk_results]).reset_index(drop=True)
+    facet_counts = {facet: Counter() for facet in FACET_COLUMNS}
+    for _, chunk_counts, _, _ in chunk_results:
+        for facet, counts in chunk_counts.items():
+            facet_counts[facet].update(counts)
+
+    # Index : fusion des index des blocs, dans l'ordre des blocs
+    chunk_indexes = [indexes for _, _, _, indexes in chunk_results]
+    indexes = {
+        "temporal": hdh_indexes.TemporalIndex.merge([indexes["temporal"] for indexes in chunk_indexes]),
+        "sources": hdh_indexes.SourceIndex.merge([indexes["sources"] for indexes in chunk_indexes]),
+    }
+    if text_index:
+        indexes["text"] = hdh_indexes.TextIndex.merge([indexes["text"] for indexes in chunk_indexes])
+
+    # Groupes de quasi-doublons (LSH sur les signatures de tous les blocs)
+    signatures = np.concatenate([chunk_signatures for _, _, chunk_signatures, _ in chunk_results])
+    enriched[hdh_dedup.CLUSTER_COLUMN] = hdh_dedup.cluster_signatures(signatures)
+    return enriched, facet_counts, indexes
+
+
+# ==================== EXTRACTION DES OPTIONS UNIQUES ====================
+def build_facet_counts(df):
+    """
+    Vocabulaire des facettes multi-valeurs en une seule passe sur les lignes :
+    {facette: Counter({valeur: nombre de projets la mentionnant})}.
+
+    Les valeurs brutes se répètent beaucoup d'un projet à l'autre, le découpage
+    et le nettoyage de chaque valeur distincte sont donc mémorisés. Les sources
+    enrichies sont déjà nettoyées par normalize_and_enrich_sources : seules les
+    espaces autour des virgules sont retirées.
+    """
+    facets = list(FACET_COLUMNS)
+    counters = [Counter() for _ in facets]
+    memos = [{} for _ in facets]
+    cleaners = [str.strip if facet == "sources" else clean_value for facet in facets]
+    columns = [df[col].tolist() for col in FACET_COLUMNS.values()]
+
+    for row_values in zip(*columns):
+        for val, counter, memo, clean in zip(row_values, counters, memos, cleaners):
+            if val is None or pd.isna(val):
+                continue
+            parts = memo.get(val)
+            if parts is None:
+                parts = set()
+                for p in str(val).split(","):
+                    p_clean = clean(p)
+                    if p_clean:
+                        parts.add(p_clean)
+                memo[val] = parts
+            # Fréquence documentaire : chaque valeur compte une fois par projet
+            counter.update(parts)
+
+    return dict(zip(facets, counters))
+
+
+def extract_options(df, facet_counts=None, source_index=None):
+    """
+    Extrait les options des filtres à partir du DataFrame enrichi
+    (`facet_counts` : comptages des facettes déjà calculés par build_dataset,
+    `source_index` : index des sources, dont les nœuds de la taxonomie deviennent
+    aussi des options)
+    """
+    if facet_counts is None:
+        facet_counts = build_facet_counts(df)
+    if source_index is not None:
+        facet_counts = dict(facet_counts)
+        # Un nœud compte toutes les lignes de ses descendants
+        facet_counts["sources"] = Counter(facet_counts["sources"])
+        for node, count in source_index.node_counts().items():
+            facet_counts["sources"][node] = count
+
+    # Aires thérapeutiques
+    aires_options = ["TOUT"] + sorted(facet_counts["aires"])
+
+    # Extraire les années uniques (en ignorant les valeurs NaT)
+    annees_debut = df["Date de début"].dropna().dt.year.unique()
+    annees_debut_options = ["TOUT"] + sorted([int(annee) for annee in annees_debut], reverse=True)
+
+    # Sources de données
+    source_donnees_options = ["TOUT"] + sorted(facet_counts["sources"])
+
+    # Finalités
+    finalites_options = ["TOUT"] + sorted(facet_counts["finalites"])
+
+    # Objectifs
+    objectifs_options = ["TOUT"] + sorted(facet_counts["objectifs"])
+
+    # Entités responsables
+    entites_values = pd.concat([df[col] for col in RESPONSABLE_COLUMNS]).dropna()
+    entites_options = sorted(entites_values.unique())
+
+    # Comptages supplémentaires servant à estimer la sélectivité des filtres
+    # (clés en texte pour survivre à la sérialisation JSON des instantanés)
+    counts = {facet: dict(values) for facet, values in facet_counts.items()}
+    # Types d'entité : même correspondance que le filtre (match_types de compile_query)
+    counts["types"] = {}
+    for t in type_entite_options:
+        mask_type = False
+        for col in TYPE_RESPONSABLE_COLUMNS:
+            mask_type = mask_type | _contains_any(df[col], [t])
+        counts["types"][t] = int(mask_type.sum())
+    counts["annees"] = {str(int(year)): int(n) for year, n in df["Date de début"].dt.year.value_counts().items()}
+    counts["statuts"] = {str(status): int(n) for status, n in df["Statut"].value_counts().items()}
+    counts["entites"] = {str(entite): int(n) for entite, n in entites_values.value_counts().items()}
+
+    return {
+        "types": ["TOUT"] + type_entite_options,
+        "aires": aires_options,
+        "annees": annees_debut_options,
+        "sources": source_donnees_options,
+        # Options qui sont des nœuds de la taxonomie (famille de sources)
+        "source_nodes": sorted(source_index.nodes) if source_index is not None else [],
+        "finalites": finalites_options,
+        "objectifs": objectifs_options,
+        "entites": entites_options,
+        "statuts": STATUS_OPTIONS,
+        # Nombre de projets par valeur (affiché à côté des options, et utilisé
+        # par le plan de requête pour ordonner les filtres)
+        "counts": counts,
+    }
+
+
+# ==================== PLAN DE REQUÊTE ====================
+# Sélectivité supposée des filtres sans comptage préalable (texte libre)
+DEFAULT_SELECTIVITY = 0.25
+
+# Recherche sémantique : nombre maximal de projets retenus et similarité minimale
+SEMANTIC_TOP_K = 200
+SEMANTIC_MIN_SCORE = 0.1
+
+
+def _as_mask(values):
+    """Série booléenne (éventuellement nullable ou Arrow) → tableau numpy bool"""
+    if isinstance(values, bool):
+        return values
+    return values.to_numpy(dtype=bool, na_value=False)
+
+
+def _contains_any(series, terms, lower=True, escape=False):
+    """Vrai si la valeur contient au moins un des termes (str.contains, comme le filtrage d'origine)"""
+    values = series.astype(str)
+    if lower:
+        values = values.str.lower()
+    mask = False
+    for term in terms:
+        pattern = term.lower() if lower else term
+        if escape:
+            pattern = re.escape(pattern)
+        mask = mask | values.str.contains(pattern, na=False)
+    return _as_mask(mask)
+
+
+class PlanStep:
+    """Un prédicat du plan : nom, sélectivité estimée et évaluation sur des identifiants de lignes"""
+
+    def __init__(self, name, selectivity, predicate):
+        self.name = name
+        self.selectivity = min(1.0, selectivity)
+        self.predicate = predicate
+
+    def evaluate(self, df, row_ids):
+        return self.predicate(df, row_ids)
+
+
+class QueryPlan:
+    """
+    Filtres compilés en étapes ordonnées de la plus sélective à la moins
+    sélective. Chaque étape n'évalue que les lignes retenues par les précédentes
+    (tableau d'identifiants de lignes) ; le DataFrame résultat n'est matérialisé
+    qu'une fois, à la fin.
+    """
+
+    def __init__(self, df, steps):
+        self.df = df
+        # Tri stable : à sélectivité égale, l'ordre historique des filtres est conservé
+        self.steps = sorted(steps, key=lambda step: step.selectivity)
+        self.stats = []
+
+    def row_ids(self, candidates=None):
+        """Identifiants des lignes retenues, parmi `candidates` (toutes les lignes par défaut)"""
+        row_ids = np.arange(len(self.df)) if candidates is None else np.asarray(candidates, dtype=np.int64)
+        self.stats = []
+        for step in self.steps:
+            start = time.perf_counter()
+            rows_in = len(row_ids)
+            if rows_in:
+                row_ids = row_ids[step.evaluate(self.df, row_ids)]
+            self.stats.append({
+                "step": step.name,
+                "estimated_rows": int(round(step.selectivity * len(self.df))),
+                "rows_in": rows_in,
+                "rows_out": len(row_ids),
+                "time_ms": (time.perf_counter() - start) * 1000,
+            })
+        return row_ids
+
+    def execute(self):
+        return self.df.take(self.row_ids())
+
+    def explain(self):
+        """Cardinalité et durée de chaque étape (après execute() ou row_ids())"""
+        if not self.stats:
+            lines = [f"{step.name:<12} estimé={step.selectivity * len(self.df):>8.0f}" for step in self.steps]
+            return "\n".join(["Plan (non exécuté)"] + lines)
+        lines = [f"{'étape':<12} {'estimé':>8} {'entrée':>8} {'sortie':>8} {'temps':>10}"]
+        for stat in self.stats:
+            lines.append(f"{stat['step']:<12} {stat['estimated_rows']:>8} {stat['rows_in']:>8} "
+                         f"{stat['rows_out']:>8} {stat['time_ms']:>8.2f}ms")
+        return "\n".join(lines)
+
+
+def _estimate(counts, facet, values, n_rows):
+    """Sélectivité d'une union de valeurs d'après les comptages précalculés"""
+    facet_counts = (counts or {}).get(facet)
+    if not facet_counts or not n_rows:
+        return DEFAULT_SELECTIVITY
+    return sum(facet_counts.get(str(v), 0) for v in values) / n_rows
+
+
+def compile_query(df, query_global, selected_types, selected_aires, selected_sources,
+                  selected_finalites, selected_objectifs, entite_responsable,
+                  selected_entite_dropdown, selected_annees, selected_status,
+                  date_range=None, counts=None, indexes=None, semantic_query="", new_since=None):
+    """
+    Compile les critères de filtrage (mêmes arguments que get_filtered_df) en QueryPlan ;
+    `new_since` : ne garder que les projets apparus dans le jeu de données après cette date,
+    `counts` : comptages précalculés (options["counts"]) pour estimer la sélectivité,
+    `indexes` : index du jeu de données (SearchEngine.indexes) utilisés à la place
+    d'un parcours des colonnes quand ils sont disponibles
+    """
+    n_rows = len(df)
+    steps = []
+    indexes = indexes or {}
+    temporal = indexes.get("temporal")
+    source_index = indexes.get("sources")
+
+    # Filtre recherche globale (et texte des pages détaillées si elles sont explorées)
+    if query_global:
+        query = query_global.lower()
+        details = indexes.get("details")
+        text_index = indexes.get("text")
+        try:
+            candidates = text_index.candidates(query) if text_index is not None else None
+        except hdh_index_file.IndexFormatError as e:
+            # Bloc altéré du fichier d'index : parcours complet, index reconstruit à la recherche suivante
+            logger.warning(f"Index du texte inutilisable, reconstruit : {e}")
+            text_index.corrupted = True
+            candidates = None
+        mask_candidates = None
+        if candidates is not None:
+            # Index du texte : str.contains seulement sur les lignes candidates
+            mask_candidates = np.zeros(n_rows, dtype=bool)
+            mask_candidates[candidates] = True
+
+        def match_text(d, ids):
+            if mask_candidates is None:
+                mask = _as_mask(d["search_text"].take(ids).str.contains(query, na=False))
+            else:
+                mask = mask_candidates[ids]
+                mask[mask] = _as_mask(d["search_text"].take(ids[mask]).str.contains(query, na=False))
+            if details is not None:
+                mask = mask | details.contains(query, ids)
+            return mask
+        selectivity = DEFAULT_SELECTIVITY
+        if candidates is not None and details is None:
+            selectivity = len(candidates) / max(n_rows, 1)
+        steps.append(PlanStep("texte", selectivity, match_text))
+
+    # Recherche sémantique : les SEMANTIC_TOP_K projets les plus proches de la requête
+    semantic = indexes.get("semantic")
+    if semantic_query and semantic is not None:
+        semantic_ids, _ = semantic.query(semantic_query, k=SEMANTIC_TOP_K, min_score=SEMANTIC_MIN_SCORE)
+        mask_semantic = np.zeros(n_rows, dtype=bool)
+        mask_semantic[semantic_ids] = True
+        steps.append(PlanStep("sémantique", len(semantic_ids) / max(n_rows, 1),
+                              lambda d, ids: mask_semantic[ids]))
+    elif semantic_query and "semantic" in indexes:
+        # Index sémantique indisponible (corpus trop petit) : projets contenant l'un des mots de la requête
+        import hdh_semantic
+        terms = hdh_semantic.lexical_terms(semantic_query)
+
+        def match_lexical(d, ids):
+            values = d["search_text"].take(ids)
+            mask = False
+            for term in terms:
+                mask = mask | values.str.contains(term, na=False, regex=False)
+            return _as_mask(mask) if terms else np.zeros(len(ids), dtype=bool)
+        steps.append(PlanStep("sémantique (lexicale)", DEFAULT_SELECTIVITY, match_lexical))
+
+    # Filtre type d'entité
+    if selected_types and "TOUT" not in selected_types:
+        def match_types(d, ids):
+            mask = False
+            for col in TYPE_RESPONSABLE_COLUMNS:
+                mask = mask | _contains_any(d[col].take(ids), selected_types)
+            return mask
+        steps.append(PlanStep("type", _estimate(counts, "types", selected_types, n_rows), match_types))
+
+    # Filtres aire thérapeutique, finalité, objectifs
+    for name, facet, selected in [("aire", "aires", selected_aires),
+                                  ("finalité", "finalites", selected_finalites),
+                                  ("objectif", "objectifs", selected_objectifs)]:
+        if selected and "TOUT" not in selected:
+            col = FACET_COLUMNS[facet]
+            steps.append(PlanStep(name, _estimate(counts, facet, selected, n_rows),
+                                  lambda d, ids, col=col, selected=selected: _contains_any(d[col].take(ids), selected)))
+
+    # Filtre entité responsable (combinaison recherche textuelle + dropdown)
+    has_text = bool(entite_responsable and entite_responsable.strip() != "")
+    has_dropdown = bool(selected_entite_dropdown and len(selected_entite_dropdown) > 0)
+    if has_text or has_dropdown:
+        def match_entite(d, ids):
+            mask = False
+            for col in RESPONSABLE_COLUMNS:
+                values = d[col].take(ids)
+                # Recherche textuelle
+                if has_text:
+                    mask = mask | _contains_any(values, [entite_responsable])
+                # Sélection dropdown
+                if has_dropdown:
+                    mask = mask | _as_mask(values.astype(str).isin([str(e) for e in selected_entite_dropdown]))
+            return mask
+        selectivity = DEFAULT_SELECTIVITY if has_text else _estimate(counts, "entites", selected_entite_dropdown, n_rows)
+        steps.append(PlanStep("entité", selectivity, match_entite))
+
+    # Filtre date de début (année)
+    if selected_annees and "TOUT" not in selected_annees:
+        if temporal is not None:
+            # Union des intervalles annuels résolue dans l'index temporel (sélectivité exacte)
+            mask_annee = temporal.mask(temporal.years(selected_annees))
+            steps.append(PlanStep("année", mask_annee.sum() / max(n_rows, 1),
+                                  lambda d, ids: mask_annee[ids]))
+        else:
+            steps.append(PlanStep("année", _estimate(counts, "annees", selected_annees, n_rows), lambda d, ids: _as_mask(
+                d["Date de début"].take(ids).dt.year.isin([int(a) for a in selected_annees]))))
+
+    # Filtre intervalle de dates de début [début, fin[
+    if date_range and any(date_range):
+        start, end = (pd.Timestamp(bound) if bound else None for bound in date_range)
+        if temporal is not None:
+            mask_periode = temporal.mask(temporal.range(start, end))
+            steps.append(PlanStep("période", mask_periode.sum() / max(n_rows, 1),
+                                  lambda d, ids: mask_periode[ids]))
+        else:
+            def match_periode(d, ids):
+                dates = d["Date de début"].take(ids)
+                mask = dates.notna()
+                if start is not None:
+                    mask = mask & (dates >= start)
+                if end is not None:
+                    mask = mask & (dates < end)
+                return _as_mask(mask)
+            steps.append(PlanStep("période", DEFAULT_SELECTIVITY, match_periode))
+
+    # Filtre source de données (avec gestion SNDS et HDH hiérarchique)
+    if selected_sources and "TOUT" not in selected_sources and source_index is not None:
+        # Un parent de la taxonomie vaut l'union précalculée de ses enfants
+        mask_source = source_index.mask(selected_sources)
+        steps.append(PlanStep("source", mask_source.sum() / max(n_rows, 1),
+                              lambda d, ids: mask_source[ids]))
+    elif selected_sources and "TOUT" not in selected_sources:
+        def match_sources(d, ids):
+            values = d["Source de données utilisées enrichies"].take(ids)
+            mask = False
+            # SNDS ou HDH sélectionné (sans sous-composante)
+            parents = [s for s in selected_sources if s in ("SNDS", "HDH")]
+            if parents:
+                mask = mask | _contains_any(values, parents, lower=False)
+            # Pour les autres sources spécifiques
+            others = [s for s in selected_sources if s not in ("SNDS", "HDH")]
+            if others:
+                mask = mask | _contains_any(values, others, escape=True)
+            return mask
+        steps.append(PlanStep("source", _estimate(counts, "sources", selected_sources, n_rows), match_sources))
+
+    # Filtre nouveautés : date de première apparition de chaque projet (historique des versions)
+    first_seen = indexes.get("first_seen")
+    if new_since and first_seen is not None:
+        mask_nouveau = first_seen > pd.Timestamp(new_since).timestamp()
+        steps.append(PlanStep("nouveauté", mask_nouveau.sum() / max(n_rows, 1),
+                              lambda d, ids: mask_nouveau[ids]))
+
+    # Filtre statut
+    if selected_status and selected_status != "TOUT":
+        steps.append(PlanStep("statut", _estimate(counts, "statuts", [selected_status], n_rows), lambda d, ids: _as_mask(
+            d["Statut"].take(ids) == selected_status)))
+
+    return QueryPlan(df, steps)
+
+
+# ==================== FONCTION DE FILTRAGE ====================
+def get_filtered_df(df, query_global, selected_types, selected_aires, selected_sources,
+                    selected_finalites, selected_objectifs, entite_responsable,
+                    selected_entite_dropdown, selected_annees, selected_status,
+                    date_range=None, counts=None, indexes=None):
+    """
+    Filtre le DataFrame selon tous les critères sélectionnés
+    """
+    return compile_query(
+        df, query_global, selected_types, selected_aires, selected_sources,
+        selected_finalites, selected_objectifs, entite_responsable,
+        selected_entite_dropdown, selected_annees, selected_status,
+        date_range, counts, indexes
+    ).execute()
+
+
+# ==================== MOTEUR ====================
+class SearchEngine:
+    """
+    Jeu de données enrichi et options de filtres, construits une seule fois
+    puis partagés (en lecture seule) par toutes les sessions et requêtes
+    """
+
+    def __init__(self, df, options, version=None, indexes=None, manifest=None):
+        self.df = df
+        self.options = options
+        self.loaded_at = time.time()
+        self.version = version if version is not None else self.loaded_at
+        if indexes is None:
+            indexes = self.build_indexes(df) if not df.empty else {}
+        self.indexes = indexes
+        # Structures dérivées construites à la première utilisation (index sémantique, cube)
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+        self._building = {}  # Structures dérivées en cours de construction en arrière-plan (threads)
+        if manifest is not None:
+            self._derived["manifest"] = manifest  # Manifeste déjà enregistré (instantané publié)
+
+    @staticmethod
+    def build_indexes(df):
+        """Index dérivés du DataFrame enrichi (reconstruits à chaque version)"""
+        return {
+            "temporal": hdh_indexes.TemporalIndex(df["Date de début"]),
+            "sources": hdh_indexes.SourceIndex(df["Source de données utilisées enrichies"]),
+        }
+
+    @classmethod
+    def from_raw(cls, raw_df, text_index=False):
+        """
+        Enrichit un DataFrame brut (export Excel HDH) et construit le moteur
+        (`text_index` : construire aussi l'index du texte, par blocs)
+        """
+        if raw_df.empty:
+            return cls(raw_df, {})
+        df, facet_counts, indexes = build_dataset(raw_df, text_index=text_index)
+        return cls(df, extract_options(df, facet_counts, indexes["sources"]), indexes=indexes)
+
+    @classmethod
+    def from_source(cls, notify=log_notify, crawl=True, text_index=False):
+        """
+        Charge les données HDH (ou le fichier de secours) et construit le moteur ;
+        si HDH_DETAILS est défini et `crawl` vrai, les pages détaillées manquantes
+        sont explorées en arrière-plan (voir hdh_details.py)
+        """
+        engine = cls.from_raw(load_data(notify), text_index=text_index)
+        if crawl and details_enabled() and not engine.empty:
+            import hdh_details
+            engine.detail_index()
+            # Notifications du thread d'exploration : journal (hors exécution du script Streamlit)
+            hdh_details.crawl_in_background(engine.df["Référence"].dropna(), notify=log_notify)
+        return engine
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    def plan(self, query_global="", selected_types=None, selected_aires=None, selected_sources=None,
+             selected_finalites=None, selected_objectifs=None, entite_responsable="",
+             selected_entite_dropdown=None, selected_annees=None, selected_status="TOUT",
+             date_range=None, semantic_query="", new_since=None):
+        """
+        Compile les filtres en QueryPlan (les listes vides ou absentes valent "TOUT") ;
+        `date_range` : (début, fin exclue) des dates de début, bornes optionnelles,
+        `semantic_query` : texte libre rapproché des descriptions de projets,
+        `new_since` : date ISO, projets apparus dans le jeu de données depuis
+        """
+        indexes = self.indexes
+        if semantic_query:
+            indexes = dict(indexes, semantic=self.semantic_index())
+        if new_since:
+            indexes = dict(indexes, first_seen=self.manifest().first_seen)
+        if query_global:
+            indexes = dict(indexes, text=self.text_index())
+            if details_enabled():
+                indexes = dict(indexes, details=self.detail_index())
+        return compile_query(
+            self.df, query_global, selected_types or ["TOUT"], selected_aires or ["TOUT"],
+            selected_sources or ["TOUT"], selected_finalites or ["TOUT"], selected_objectifs or ["TOUT"],
+            entite_responsable, selected_entite_dropdown or [], selected_annees or ["TOUT"],
+            selected_status or "TOUT", date_range, counts=self.options.get("counts"), indexes=indexes,
+            semantic_query=semantic_query, new_since=new_since
+        )
+
+    def search(self, **filters):
+        """Filtre le jeu de données (mêmes arguments que plan())"""
+        return self.plan(**filters).execute()
+
+    def get_article(self, reference):
+        """Retourne la ligne correspondant à une `Référence`, ou None si absente"""
+        matches = self.df[self.df["Référence"].astype(str) == str(reference)]
+        if matches.empty:
+            return None
+        return matches.iloc[0]
+
+    def _lazy(self, name, build):
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = build()
+            return self._derived[name]
+
+    def _in_background(self, name, build):
+        """
+        Structure dérivée construite dans un thread lancé à la première demande ;
+        None tant qu'elle n'est pas prête (ou si sa construction a échoué)
+        """
+        with self._derived_lock:
+            if name in self._derived:
+                return self._derived[name]
+            if name not in self._building:
+                thread = threading.Thread(target=self._build_derived, args=(name, build),
+                                          name=f"hdh-build-{name}", daemon=True)
+                self._building[name] = thread
+                thread.start()
+            return None
+
+    def _build_derived(self, name, build):
+        try:
+            value = build()
+        except Exception:
+            logger.exception("Échec de la construction en arrière-plan de %s", name)
+            value = None
+        with self._derived_lock:
+            self._derived[name] = value
+            del self._building[name]
+
+    def semantic_index(self):
+        """
+        Index sémantique (LSA), construit ou rechargé du disque à la première
+        utilisation ; None si le corpus est trop petit (repli lexical)
+        """
+        import hdh_semantic
+        return self._lazy("semantic", lambda: hdh_semantic.SemanticIndex.load_or_build(self.df))
+
+    def text_index(self):
+        """
+        Index des mots de search_text : construit et persisté par le constructeur
+        d'instantanés (relu du fichier d'index). Sans instantané, ou si le fichier
+        s'est révélé altéré, il est construit en arrière-plan à la première
+        recherche ; None d'ici là (recherche sans préfiltre, par parcours complet)
+        """
+        text = self.indexes.get("text")
+        if text is not None and not text.corrupted:
+            return text
+        return self._in_background("text", lambda: hdh_indexes.TextIndex.build(self.df["search_text"]))
+
+    def detail_index(self):
+        """Texte des pages détaillées par ligne, complété au fil de l'exploration (cache partagé)"""
+        import hdh_details
+        return self._lazy("details", lambda: hdh_details.DetailIndex(self.df["Référence"], hdh_details.get_cache()))
+
+    def analytics_cube(self):
+        """Agrégats par (année, statut, valeur) de chaque dimension de cette version (hdh_cube.py)"""
+        import hdh_cube
+        return self._lazy("cube", lambda: hdh_cube.AnalyticsCube(self))
+
+    def manifest(self):
+        """
+        Manifeste de cette version (empreintes, premières apparitions) dans
+        l'historique des versions ; version None s'il n'a pas pu y être enregistré
+        """
+        import hdh_changes
+        return self._lazy("manifest", lambda: hdh_changes.get_feed().record(self.df))
+
+    def changes_since(self, version):
+        """
+        Projets ajoutés, modifiés et supprimés depuis une version de l'historique (None si inconnue) ;
+        calculé une fois par version comparée (réexécutions et sessions partagent le résultat)
+        """
+        import hdh_changes
+        manifest = self.manifest()
+
+        def build():
+            previous = hdh_changes.get_feed().get(version)
+            if previous is None:
+                return None
+            return hdh_changes.diff(previous, manifest)
+        return self._lazy(f"changes-{version}", build)
+
+    def similar_projects(self, reference, k=10):
+        """Les k projets dont la description est la plus proche de celle de `reference`"""
+        article = self.get_article(reference)
+        if article is None:
+            return None
+        semantic = self.semantic_index()
+        if semantic is None:
+            return self.df.iloc[:0].assign(Similarité=[])
+        row_ids, scores = semantic.similar(article.name, k)
+        similar = self.df.take(row_ids)
+        return similar.assign(Similarité=np.round(scores, 3))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(ttl=3600, notify=log_notify):
+    """
+    Retourne le moteur partagé du processus, reconstruit au-delà de `ttl` secondes
+    (même durée de cache que l'application Streamlit)
+
+    Si la variable d'environnement HDH_SNAPSHOT_DIR est définie, le moteur est
+    attaché à la dernière version publiée par le processus constructeur
+    (voir hdh_snapshot.py) au lieu d'être reconstruit dans ce processus.
+    """
+    global _engine
+    snapshot_dir = os.environ.get("HDH_SNAPSHOT_DIR")
+    if snapshot_dir:
+        import hdh_snapshot
+        return hdh_snapshot.attach(snapshot_dir).current()
+
+    with _engine_lock:
+        if _engine is None or time.time() - _engine.loaded_at > ttl:
+            _engine = SearchEngine.from_source(notify)
+        return _engine
+
+
+def refresh_engine(notify=log_notify):
+    """Force le rechargement du moteur partagé"""
+    global _engine
+    with _engine_lock:
+        _engine = SearchEngine.from_source(notify)
+        return _engine
@@ -0,0 +1,170 @@
+"""
+Export en flux des résultats (CSV, JSON Lines, éventuellement compressés gzip).
+
+Les lignes sont extraites et sérialisées par blocs de CHUNK_ROWS à partir des
+identifiants de lignes du plan de requête : le résultat complet n'est jamais
+matérialisé, la mémoire reste constante quelle que soit la taille de l'export
+(catalogue entier compris). Les blocs d'octets alimentent indifféremment un
+fichier temporaire (application Streamlit) ou une réponse HTTP par morceaux (API).
+
+Les fichiers temporaires de l'application sont rangés dans EXPORT_DIR et
+supprimés par purge_exports au-delà de EXPORT_TTL secondes (sessions
+abandonnées). Si l'API est déployée (HDH_EXPORT_URL), l'application renvoie
+plutôt vers GET /export (export_url) : le fichier ne transite pas par Streamlit.
+"""
+import os
+import tempfile
+import time
+import zlib
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+import numpy as np
+
+import hdh_dedup
+import hdh_engine
+
+CHUNK_ROWS = 5000
+
+# format -> (extension, type MIME)
+EXPORT_FORMATS = {
+    "csv": (".csv", "text/csv; charset=utf-8"),
+    "jsonl": (".jsonl", "application/x-ndjson"),
+}
+GZIP_MEDIA_TYPE = "application/gzip"
+EXCEL_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+EXPORT_DIR = os.environ.get("HDH_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "hdh_exports"))
+EXPORT_TTL = int(os.environ.get("HDH_EXPORT_TTL", "3600"))
+# Adresse de l'API (hdh_api.py) qui sert les exports en flux ; vide si non déployée
+EXPORT_URL = os.environ.get("HDH_EXPORT_URL", "").rstrip("/")
+
+
+def select_columns(df, all_columns):
+    """Colonnes exportées : toutes (hors colonne technique de recherche) ou celles du tableau"""
+    if all_columns:
+        return [col for col in df.columns if col != "search_text"]
+    columns = ["Versions", hdh_dedup.CLUSTER_COLUMN] if "Versions" in df.columns else []
+    return columns + [col for col in hdh_engine.columns_display if col in df.columns]
+
+
+def export_filename(fmt, compress=False, stem="resultats_filtres"):
+    return stem + EXPORT_FORMATS[fmt][0] + (".gz" if compress else "")
+
+
+def media_type(fmt, compress=False):
+    return GZIP_MEDIA_TYPE if compress else EXPORT_FORMATS[fmt][1]
+
+
+def _serialize(chunk, fmt, header):
+    if fmt == "csv":
+        return chunk.to_csv(index=False, header=header).encode("utf-8")
+    if chunk.empty:
+        return b""
+    return chunk.to_json(orient="records", lines=True, date_format="iso", force_ascii=False).rstrip("\n").encode("utf-8") + b"\n"
+
+
+def iter_export(df, row_ids=None, columns=None, fmt="csv", compress=False, chunk_rows=CHUNK_ROWS):
+    """
+    Blocs d'octets de l'export des lignes `row_ids` de `df` (toutes si None),
+    restreint à `columns` ; compressés au fil de l'eau si `compress`
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+    row_ids = np.arange(len(df)) if row_ids is None else np.asarray(row_ids)
+    columns = list(df.columns) if columns is None else list(columns)
+    positions = [df.columns.get_loc(col) for col in columns]
+    # wbits=31 : en-tête et somme de contrôle gzip (fichier .gz lisible par gunzip)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    for start in range(0, max(len(row_ids), 1), chunk_rows):
+        chunk = df.iloc[row_ids[start:start + chunk_rows], positions]
+        data = _serialize(chunk, fmt, header=start == 0)
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def write_export(df, row_ids=None, columns=None, fmt="csv", compress=False, directory=None):
+    """Écrit l'export dans un fichier temporaire et retourne son chemin (à supprimer par l'appelant)"""
+    suffix = export_filename(fmt, compress, stem="")
+    handle, path = tempfile.mkstemp(prefix="hdh_export_", suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as f:
+            for data in iter_export(df, row_ids, columns, fmt, compress):
+                f.write(data)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def write_excel(df, row_ids=None, columns=None, directory=None):
+    """
+    Écrit l'export Excel dans un fichier temporaire et retourne son chemin ;
+    le classeur est construit en mémoire par openpyxl (pas d'écriture par blocs)
+    """
+    import pandas as pd
+
+    handle, path = tempfile.mkstemp(prefix="hdh_export_", suffix=".xlsx", dir=directory)
+    os.close(handle)
+    rows = df if row_ids is None else df.iloc[np.asarray(row_ids)]
+    try:
+        with pd.ExcelWriter(path, engine="openpyxl") as writer:
+            rows[list(df.columns) if columns is None else list(columns)].to_excel(
+                writer, index=False, sheet_name="Résultats")
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def purge_exports(directory=EXPORT_DIR, ttl=EXPORT_TTL):
+    """Supprime les exports de `directory` plus vieux que `ttl` secondes ; retourne leur nombre"""
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    limit = time.time() - ttl
+    removed = 0
+    for entry in entries:
+        try:
+            if entry.name.startswith("hdh_export_") and entry.stat().st_mtime < limit:
+                os.unlink(entry.path)
+                removed += 1
+        except OSError:
+            pass  # Supprimé entre-temps par une autre session
+    return removed
+
+
+def export_url(base_url, spec, fmt, compress=False, all_columns=False):
+    """
+    Adresse de GET /export (hdh_api.py) pour une spécification de recherche de
+    l'application (arguments de SearchEngine.plan ; None : catalogue complet)
+    """
+    params = {"format": fmt, "all_columns": str(bool(all_columns)).lower()}
+    if compress:
+        params["gzip"] = "true"
+    spec = spec or {}
+    for key, name in [("query_global", "q"), ("entite_responsable", "entite"), ("semantic_query", "semantique"),
+                      ("new_since", "nouveaux_depuis")]:
+        if spec.get(key):
+            params[name] = spec[key]
+    if spec.get("selected_status") not in (None, "TOUT"):
+        params["statut"] = spec["selected_status"]
+    for key, name in [("selected_types", "types"), ("selected_aires", "aires"), ("selected_sources", "sources"),
+                      ("selected_finalites", "finalites"), ("selected_objectifs", "objectifs"),
+                      ("selected_entite_dropdown", "entites"), ("selected_annees", "annees")]:
+        values = [value for value in spec.get(key) or [] if value != "TOUT"]
+        if values:
+            params[name] = values
+    start, end = spec.get("date_range") or (None, None)
+    if start:
+        params["debut_min"] = start[:10]
+    if end:
+        # Fin exclue dans la spécification, incluse pour l'API
+        params["debut_max"] = (date.fromisoformat(end[:10]) - timedelta(days=1)).isoformat()
+    return f"{base_url}/export?{urlencode(params, doseq=True)}"
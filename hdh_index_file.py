@@ -0,0 +1,335 @@
+"""
+Fichier d'index binaire versionné, écrit à côté de chaque instantané du jeu de
+données (voir hdh_snapshot.py) : les workers relisent les index au lieu de
+redécouper le texte et de reconstruire les listes de lignes à chaque version.
+
+Contenu : index du texte (hdh_indexes.TextIndex), index des sources
+(SourceIndex, par libellé et par nœud de la taxonomie) et index temporel.
+
+Format (entiers little-endian) :
+    en-tête     "HDHINDEX", version du format (uint32), nombre de sections (uint32),
+                nombre de lignes (uint64), CRC32 de l'en-tête et des deux tables,
+                nombre de blocs (uint32)
+    table       par section : nom (16 octets), position, longueur (uint64),
+                numéro de son premier bloc (uint32)
+    blocs       CRC32 de chaque bloc de BLOCK_SIZE octets des sections (uint32)
+    sections    alignées sur 8 octets
+
+Une liste de mots (dictionnaire + listes de lignes) occupe trois sections :
+    <nom>.dict  mots triés, codage par préfixe commun (front coding) : pour chaque
+                mot, longueur du préfixe partagé avec le précédent et longueur du
+                suffixe (varint) puis octets UTF-8 du suffixe
+    <nom>.offs  position de la liste de chaque mot dans <nom>.post (uint64, n + 1)
+    <nom>.post  identifiants de lignes triés, codés par écarts successifs en
+                varint (7 bits par octet, bit de poids fort = octet suivant)
+
+Le fichier est projeté en mémoire (mmap) : les tableaux fixes sont lus sans
+copie et chaque liste n'est décodée qu'à sa première utilisation, si bien que
+seules les pages utilisées sont chargées. Au chargement, seuls l'en-tête et les
+tables sont vérifiés ; chaque bloc d'une section est comparé à sa somme de
+contrôle à sa première lecture (verify="full" pour tout vérifier au chargement,
+verify=None pour s'en dispenser). Une altération peut donc être signalée
+(IndexFormatError) à la première recherche qui lit le bloc concerné.
+"""
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+import hdh_indexes
+
+MAGIC = b"HDHINDEX"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<8sIIQII")
+_SECTION = struct.Struct("<16sQQI4x")
+_ALIGNMENT = 8
+# Unité de vérification : une recherche ne relit que les blocs des listes qu'elle décode
+BLOCK_SIZE = 1 << 14
+
+
+class IndexFormatError(ValueError):
+    """Fichier d'index illisible : format inconnu, tronqué ou somme de contrôle invalide"""
+
+
+# ==================== VARINT ====================
+def encode_varints(values):
+    """Entiers positifs (< 2**35) -> octets varint, et nombre d'octets de chaque valeur"""
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 5):
+        n_bytes += values >= np.uint64(1 << (7 * k))
+    starts = np.cumsum(n_bytes) - n_bytes
+    out = np.empty(int(n_bytes.sum()), dtype=np.uint8)
+    for k in range(5):
+        selected = n_bytes > k
+        low = (values[selected] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (n_bytes[selected] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[selected] + k] = (low | more).astype(np.uint8)
+    return out, n_bytes
+
+
+def decode_varints(data):
+    """Octets varint -> entiers (uint64)"""
+    data = np.frombuffer(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    shifts = (np.arange(len(data)) - np.repeat(starts, ends - starts + 1)) * 7
+    return np.add.reduceat((data & 0x7F).astype(np.uint64) << shifts.astype(np.uint64), starts)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+# ==================== DICTIONNAIRE (FRONT CODING) ====================
+def encode_terms(terms):
+    out = bytearray()
+    previous = b""
+    for term in terms:
+        encoded = term.encode("utf-8")
+        shared = 0
+        limit = min(len(previous), len(encoded))
+        while shared < limit and previous[shared] == encoded[shared]:
+            shared += 1
+        out += _varint(shared) + _varint(len(encoded) - shared) + encoded[shared:]
+        previous = encoded
+    return bytes(out)
+
+
+def decode_terms(data):
+    data = bytes(data)
+    terms = []
+    previous = b""
+    pos = 0
+    while pos < len(data):
+        shared, pos = _read_varint(data, pos)
+        length, pos = _read_varint(data, pos)
+        previous = previous[:shared] + data[pos:pos + length]
+        pos += length
+        terms.append(previous.decode("utf-8"))
+    return terms
+
+
+# ==================== LISTES DE LIGNES ====================
+def encode_postings(lists):
+    """Listes d'identifiants triés -> (octets varint des écarts, position de chaque liste)"""
+    lengths = np.fromiter((len(ids) for ids in lists), dtype=np.int64, count=len(lists))
+    flat = np.concatenate(lists).astype(np.uint64) if len(lists) else np.empty(0, dtype=np.uint64)
+    deltas = flat.copy()
+    deltas[1:] -= flat[:-1]
+    list_starts = np.cumsum(lengths) - lengths
+    deltas[list_starts[lengths > 0]] = flat[list_starts[lengths > 0]]  # Première valeur de chaque liste
+    data, n_bytes = encode_varints(deltas)
+    byte_ends = np.concatenate([[0], np.cumsum(n_bytes)])
+    return data, byte_ends[np.concatenate([list_starts, [len(flat)]])].astype(np.uint64)
+
+
+def decode_postings(data):
+    return np.cumsum(decode_varints(data)).astype(np.uint32)
+
+
+class Section:
+    """
+    Section d'un fichier projeté ; avec vérification, chaque bloc est comparé à
+    sa somme de contrôle à sa première lecture
+    """
+
+    def __init__(self, path, name, view, block_crcs, verify):
+        self.path = path
+        self.name = name
+        self.view = view
+        self.block_crcs = block_crcs
+        self._checked = np.zeros(len(block_crcs), dtype=bool) if verify else None
+
+    def __len__(self):
+        return len(self.view)
+
+    def read(self, start=0, stop=None):
+        """Octets [start, stop[ de la section, après vérification des blocs qui les contiennent"""
+        stop = len(self.view) if stop is None else stop
+        if self._checked is not None and stop > start:
+            first = start // BLOCK_SIZE
+            for block in np.flatnonzero(~self._checked[first:(stop - 1) // BLOCK_SIZE + 1]) + first:
+                data = self.view[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]
+                if zlib.crc32(data) != self.block_crcs[block]:
+                    raise IndexFormatError(f"{self.path} : somme de contrôle de la section {self.name} "
+                                           f"invalide (bloc {block})")
+                self._checked[block] = True
+        return self.view[start:stop]
+
+
+class PackedPostings:
+    """Listes de lignes d'une section projetée, décodées à la première utilisation de chaque liste"""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        self._decoded = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __call__(self, i):
+        ids = self._decoded.get(i)
+        if ids is None:
+            ids = self._decoded[i] = decode_postings(self.data.read(self.offsets[i], self.offsets[i + 1]))
+        return ids
+
+
+# ==================== ÉCRITURE ====================
+def _postings_sections(name, terms, lists):
+    data, offsets = encode_postings(lists)
+    return {f"{name}.dict": encode_terms(terms), f"{name}.offs": offsets.tobytes(), f"{name}.post": data.tobytes()}
+
+
+def index_sections(indexes, text_index):
+    """Sections du fichier pour les index d'un moteur (indexes["temporal"], indexes["sources"], texte)"""
+    temporal = indexes["temporal"]
+    sources = indexes["sources"]
+    sections = {"meta": json.dumps({"created_at": time.time()}).encode("utf-8")}
+    sections["time.ns"] = np.ascontiguousarray(temporal.sorted_ns, dtype=np.int64).tobytes()
+    sections["time.ids"] = np.ascontiguousarray(temporal.row_ids, dtype=np.uint32).tobytes()
+    for name, postings in [("src.label", sources.labels), ("src.node", sources.nodes)]:
+        terms = sorted(postings)
+        sections.update(_postings_sections(name, terms, [postings[term] for term in terms]))
+    terms = text_index.terms
+    sections.update(_postings_sections("text", terms, [text_index.postings(i) for i in range(len(terms))]))
+    sections["text.df"] = np.ascontiguousarray(text_index.doc_freq, dtype=np.uint32).tobytes()
+    return sections
+
+
+def write_index_file(path, n_rows, sections):
+    """Écrit les sections dans `path` (fichier temporaire puis renommage atomique)"""
+    table = bytearray()
+    block_crcs = []
+    n_blocks = sum(-(-len(data) // BLOCK_SIZE) for data in sections.values())
+    offset = _HEADER.size + _SECTION.size * len(sections) + 4 * n_blocks
+    layout = []
+    for name, data in sections.items():
+        offset += -offset % _ALIGNMENT
+        table += _SECTION.pack(name.encode("ascii"), offset, len(data), len(block_crcs))
+        block_crcs += [zlib.crc32(data[k:k + BLOCK_SIZE]) for k in range(0, len(data), BLOCK_SIZE)]
+        layout.append((offset, data))
+        offset += len(data)
+    table += np.array(block_crcs, dtype="<u4").tobytes()
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), n_rows, 0, n_blocks)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), n_rows, zlib.crc32(header + table), n_blocks)
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(table)
+        for offset, data in layout:
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return offset
+
+
+def write_indexes(path, engine):
+    """Écrit les index du moteur (index du texte construit si nécessaire) ; retourne la taille du fichier"""
+    text_index = engine.indexes.get("text")
+    if text_index is None:
+        text_index = hdh_indexes.TextIndex.build(engine.df["search_text"])
+    return write_index_file(path, len(engine.df), index_sections(engine.indexes, text_index))
+
+
+# ==================== LECTURE ====================
+def read_index_file(path, verify="lazy"):
+    """
+    Projette le fichier en mémoire -> (nombre de lignes, {nom: Section}) ;
+    lève IndexFormatError si l'en-tête ou les tables sont invalides. Les blocs
+    des sections sont vérifiés à leur première lecture (verify="lazy"), tous au
+    chargement (verify="full") ou jamais (verify=None).
+    """
+    if verify not in ("lazy", "full", None):
+        raise ValueError(f"verify : 'lazy', 'full' ou None attendu, pas {verify!r}")
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Fichier vide
+            raise IndexFormatError(f"{path} : fichier vide") from None
+    view = memoryview(mapped)
+    if len(view) < _HEADER.size:
+        raise IndexFormatError(f"{path} : en-tête tronqué")
+    magic, version, n_sections, n_rows, header_crc, n_blocks = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise IndexFormatError(f"{path} : pas un fichier d'index HDH")
+    if version != FORMAT_VERSION:
+        raise IndexFormatError(f"{path} : version de format {version} non prise en charge")
+    table_end = _HEADER.size + _SECTION.size * n_sections + 4 * n_blocks
+    if len(view) < table_end:
+        raise IndexFormatError(f"{path} : table des sections tronquée")
+    table = bytes(view[_HEADER.size:table_end])
+    if zlib.crc32(_HEADER.pack(magic, version, n_sections, n_rows, 0, n_blocks) + table) != header_crc:
+        raise IndexFormatError(f"{path} : somme de contrôle de l'en-tête invalide")
+    block_crcs = np.frombuffer(table, dtype="<u4", offset=_SECTION.size * n_sections)
+
+    sections = {}
+    for i in range(n_sections):
+        name, offset, length, first_block = _SECTION.unpack_from(table, i * _SECTION.size)
+        name = name.rstrip(b"\0").decode("ascii")
+        blocks = block_crcs[first_block:first_block - (-length // BLOCK_SIZE)]
+        if offset + length > len(view) or len(blocks) != -(-length // BLOCK_SIZE):
+            raise IndexFormatError(f"{path} : section {name} tronquée")
+        sections[name] = Section(path, name, view[offset:offset + length], blocks, verify)
+        if verify == "full":
+            sections[name].read()
+    return n_rows, sections
+
+
+def _packed(sections, name):
+    offsets = np.frombuffer(sections[f"{name}.offs"].read(), dtype=np.uint64).astype(np.int64)
+    return PackedPostings(offsets, sections[f"{name}.post"])
+
+
+def _postings_dict(sections, name):
+    postings = _packed(sections, name)
+    terms = decode_terms(sections[f"{name}.dict"].read())
+    return {term: postings(i) for i, term in enumerate(terms)}
+
+
+def load_indexes(path, verify="lazy"):
+    """
+    Index d'un fichier (dictionnaire au format de SearchEngine.indexes, avec
+    l'index du texte sous la clé "text") ; le dictionnaire des mots et les listes
+    du texte sont décodés (et vérifiés) à la première recherche, les index
+    temporel et des sources dès le chargement
+    """
+    n_rows, sections = read_index_file(path, verify)
+    try:
+        temporal = hdh_indexes.TemporalIndex.from_arrays(
+            np.frombuffer(sections["time.ns"].read(), dtype=np.int64),
+            np.frombuffer(sections["time.ids"].read(), dtype=np.uint32), n_rows)
+        sources = hdh_indexes.SourceIndex.from_postings(
+            n_rows, _postings_dict(sections, "src.label"), _postings_dict(sections, "src.node"))
+        text_dict = sections["text.dict"]
+        text = hdh_indexes.TextIndex(n_rows, lambda: decode_terms(text_dict.read()), _packed(sections, "text"),
+                                     np.frombuffer(sections["text.df"].read(), dtype=np.uint32))
+    except KeyError as e:
+        raise IndexFormatError(f"{path} : section {e} absente") from None
+    return {"temporal": temporal, "sources": sources, "text": text}
@@ -0,0 +1,386 @@
+"""
+Index construits une fois par version du jeu de données et utilisés par le plan
+de requête à la place d'un parcours complet des colonnes.
+"""
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# ==================== STATUT ====================
+STATUS_LABELS = ["En cours", "Terminé"]
+
+
+def compute_status(values):
+    """
+    Statut des projets : "Terminé" si la cellule "Etape  : Complétude" contient
+    une date (non vide, différente de "nan"), "En cours" sinon. Retourne une
+    colonne catégorielle (un code uint8 par projet).
+    """
+    as_text = values.astype(str)
+    empty = values.isna() | as_text.str.strip().eq("") | as_text.str.lower().eq("nan")
+    codes = np.where(empty.to_numpy(dtype=bool, na_value=True), 0, 1).astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=STATUS_LABELS)
+
+
+# ==================== INDEX TEMPOREL ====================
+class TemporalIndex:
+    """
+    Dates de début triées (int64, nanosecondes) et permutation vers les
+    identifiants de lignes : un intervalle de dates se résout par deux
+    recherches dichotomiques, sans parcourir la colonne
+    """
+
+    def __init__(self, dates):
+        values = pd.to_datetime(dates, errors="coerce").to_numpy(dtype="datetime64[ns]")
+        valid = ~np.isnat(values)
+        ns = values.view(np.int64)[valid]
+        order = np.argsort(ns, kind="stable")
+        self.sorted_ns = ns[order]
+        self.row_ids = np.flatnonzero(valid)[order].astype(np.uint32)
+        self.n_rows = len(values)
+
+    @classmethod
+    def from_arrays(cls, sorted_ns, row_ids, n_rows):
+        """Index déjà construit (relu depuis un fichier d'index, voir hdh_index_file.py)"""
+        index = cls.__new__(cls)
+        index.sorted_ns, index.row_ids, index.n_rows = sorted_ns, row_ids, n_rows
+        return index
+
+    @classmethod
+    def merge(cls, parts):
+        """
+        Index des blocs consécutifs `parts` (identifiants locaux à chaque bloc)
+        → index de l'ensemble, identique à celui construit en une fois : le tri
+        stable des suites déjà triées conserve l'ordre des lignes à date égale
+        """
+        if len(parts) == 1:
+            return parts[0]
+        offsets = np.cumsum([0] + [part.n_rows for part in parts])
+        ns = np.concatenate([part.sorted_ns for part in parts])
+        row_ids = np.concatenate([part.row_ids + np.uint32(offset) for part, offset in zip(parts, offsets)])
+        order = np.argsort(ns, kind="stable")
+        return cls.from_arrays(ns[order], row_ids[order], int(offsets[-1]))
+
+    def _bounds(self, start=None, end=None):
+        lo = 0 if start is None else np.searchsorted(self.sorted_ns, pd.Timestamp(start).value, side="left")
+        hi = len(self.sorted_ns) if end is None else np.searchsorted(self.sorted_ns, pd.Timestamp(end).value, side="left")
+        return lo, max(lo, hi)
+
+    def range(self, start=None, end=None):
+        """Identifiants des projets démarrés dans [start, end[ (bornes optionnelles)"""
+        lo, hi = self._bounds(start, end)
+        return self.row_ids[lo:hi]
+
+    def count(self, start=None, end=None):
+        lo, hi = self._bounds(start, end)
+        return int(hi - lo)
+
+    def years(self, years):
+        """Identifiants des projets démarrés pendant l'une des années données"""
+        parts = [self.range(f"{int(year)}-01-01", f"{int(year) + 1}-01-01") for year in years]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint32)
+
+    def mask(self, row_ids):
+        """Identifiants → masque booléen sur toutes les lignes"""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[row_ids] = True
+        return mask
+
+
+def month_range(year, month):
+    start = pd.Timestamp(year=int(year), month=int(month), day=1)
+    return start, start + pd.DateOffset(months=1)
+
+
+def quarter_range(year, quarter):
+    return month_range(year, 3 * (int(quarter) - 1) + 1)[0], month_range(year, 3 * int(quarter))[1]
+
+
+def last_months_range(months, today=None):
+    """Intervalle [aujourd'hui - N mois, demain[ (projets démarrés ces N derniers mois)"""
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    return today - pd.DateOffset(months=int(months)), today + pd.Timedelta(days=1)
+
+
+# ==================== TAXONOMIE DES SOURCES ====================
+TAXONOMY_FILE = os.environ.get(
+    "HDH_TAXONOMY_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources_taxonomy.json")
+)
+
+
+class SourceTaxonomy:
+    """
+    Hiérarchie des sources (SNDS → DCIR/PMSI/ESND/…, HDH → bases du catalogue,
+    Hors SNDS et HDH) chargée depuis sources_taxonomy.json.
+
+    Chaque nœud a un libellé complet ("SNDS", "SNDS - PMSI") ; une source enrichie
+    "SNDS - PMSI MCO" est rattachée au premier enfant de SNDS dont un mot-clé
+    apparaît dans son nom, sinon directement à SNDS. Les sources sans racine
+    connue sont rattachées à la racine par défaut (Hors SNDS et HDH), dont le nom
+    ne doit pas être celui d'une source enrichie : un nœud masquerait la source
+    de même nom dans les filtres (la source enrichie "Autres" est distincte).
+    """
+
+    def __init__(self, config):
+        self.separator = config.get("separator", " - ")
+        self.roots = [root["name"] for root in config["roots"]]
+        self.default_root = next((root["name"] for root in config["roots"] if root.get("default")), None)
+        self.parents = {}    # libellé de nœud -> libellé du parent (None pour une racine)
+        self.keywords = {}   # racine -> [(mot-clé, libellé du nœud enfant)]
+        for root in config["roots"]:
+            self.parents[root["name"]] = None
+            self.keywords[root["name"]] = []
+            for child in root.get("children", []):
+                label = f"{root['name']}{self.separator}{child['name']}"
+                self.parents[label] = root["name"]
+                for keyword in child.get("keywords", [child["name"]]):
+                    self.keywords[root["name"]].append((keyword.lower(), label))
+        # Mots-clés de chaque racine réunis en une alternative (une seule recherche par source)
+        self.component_patterns = {
+            root: re.compile("|".join(re.escape(keyword) for keyword, _ in keywords)) if keywords else None
+            for root, keywords in self.keywords.items()
+        }
+
+    @classmethod
+    def load(cls, path=TAXONOMY_FILE):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def component_keywords(self, root):
+        """Mots-clés des composantes d'une racine (ex. composantes du SNDS)"""
+        return [keyword for keyword, _ in self.keywords.get(root, [])]
+
+    def is_component(self, root, source_name):
+        pattern = self.component_patterns.get(root)
+        return pattern is not None and pattern.search(source_name.lower()) is not None
+
+    def node_of(self, label):
+        """Nœud de la taxonomie auquel une source enrichie est rattachée"""
+        if label in self.parents:
+            return label
+        for root in self.roots:
+            prefix = root + self.separator
+            if label.startswith(prefix):
+                suffix = label[len(prefix):].lower()
+                for keyword, node in self.keywords[root]:
+                    if keyword in suffix:
+                        return node
+                return root
+        return self.default_root
+
+    def ancestors(self, node):
+        while node is not None:
+            yield node
+            node = self.parents.get(node)
+
+
+_taxonomy = None
+
+
+def get_taxonomy():
+    """Taxonomie chargée une fois par processus"""
+    global _taxonomy
+    if _taxonomy is None:
+        _taxonomy = SourceTaxonomy.load()
+    return _taxonomy
+
+
+class SourceIndex:
+    """
+    Listes d'identifiants de lignes par source enrichie et par nœud de la
+    taxonomie. Un nœud parent vaut l'union précalculée des lignes de ses
+    descendants : sélectionner "SNDS" ne parcourt aucune colonne, et
+    "SNDS - PMSI" ne capte plus de voisins textuels non déclarés.
+    """
+
+    def __init__(self, enriched_sources, taxonomy=None):
+        taxonomy = taxonomy or get_taxonomy()
+        self.n_rows = len(enriched_sources)
+        labels = {}
+        nodes = {}
+        for row_id, value in enumerate(enriched_sources.tolist()):
+            if value is None or pd.isna(value) or not value:
+                continue
+            row_labels = {part.strip() for part in str(value).split(",") if part.strip()}
+            row_nodes = set()
+            for label in row_labels:
+                labels.setdefault(label, []).append(row_id)
+                node = taxonomy.node_of(label)
+                if node is not None:
+                    row_nodes.update(taxonomy.ancestors(node))
+            for node in row_nodes:
+                nodes.setdefault(node, []).append(row_id)
+        self.labels = {label: np.asarray(ids, dtype=np.uint32) for label, ids in labels.items()}
+        self.nodes = {node: np.asarray(ids, dtype=np.uint32) for node, ids in nodes.items()}
+
+    @classmethod
+    def from_postings(cls, n_rows, labels, nodes):
+        """Index déjà construit (relu depuis un fichier d'index, voir hdh_index_file.py)"""
+        index = cls.__new__(cls)
+        index.n_rows, index.labels, index.nodes = n_rows, labels, nodes
+        return index
+
+    @classmethod
+    def merge(cls, parts):
+        """Index des blocs consécutifs `parts` → index de l'ensemble (listes décalées et concaténées dans l'ordre des blocs)"""
+        if len(parts) == 1:
+            return parts[0]
+        offsets = np.cumsum([0] + [part.n_rows for part in parts])
+
+        def merge_postings(name):
+            merged = {}
+            for part, offset in zip(parts, offsets):
+                for key, ids in getattr(part, name).items():
+                    merged.setdefault(key, []).append(ids + np.uint32(offset))
+            return {key: np.concatenate(ids) for key, ids in merged.items()}
+
+        return cls.from_postings(int(offsets[-1]), merge_postings("labels"), merge_postings("nodes"))
+
+    def rows(self, selected):
+        """
+        Identifiants (triés, uniques) des projets mobilisant l'une des sources
+        sélectionnées ; un nom de nœud ("SNDS") désigne toute sa famille
+        """
+        parts = [self.nodes.get(s, self.labels.get(s)) for s in selected]
+        parts = [p for p in parts if p is not None]
+        if not parts:
+            return np.empty(0, dtype=np.uint32)
+        return np.unique(np.concatenate(parts))
+
+    def mask(self, selected):
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.rows(selected)] = True
+        return mask
+
+    def node_counts(self):
+        return {node: len(ids) for node, ids in self.nodes.items()}
+
+
+# ==================== INDEX DU TEXTE ====================
+# Mots indexés (et mots d'une requête) : suites de caractères alphanumériques
+TOKEN_PATTERN = re.compile(r"\w+")
+# Requête interprétée comme expression régulière par str.contains : pas de préfiltre
+REGEX_CHARS = set(".^$*+?{}[]\\|()")
+# Au-delà, un mot de la requête (ex. « a ») est trop peu sélectif pour préfiltrer
+MAX_TERMS_PER_WORD = 1000
+
+
+class _FlatPostings:
+    """Listes de lignes de tous les mots bout à bout (numéro de mot → tranche) ; transmissible entre processus"""
+
+    def __init__(self, flat, doc_freq):
+        self.flat = flat
+        self.offsets = np.concatenate([[0], np.cumsum(doc_freq, dtype=np.int64)])
+
+    def __call__(self, term_id):
+        return self.flat[self.offsets[term_id]:self.offsets[term_id + 1]]
+
+
+class TextIndex:
+    """
+    Index inversé des mots de search_text : dictionnaire trié des mots et, pour
+    chacun, identifiants (triés) des lignes qui le contiennent.
+
+    La recherche globale reste une recherche de sous-chaîne (str.contains) ;
+    l'index en calcule un sur-ensemble de lignes candidates. Chaque mot de la
+    requête apparaît forcément à l'intérieur d'un mot du texte d'une ligne
+    correspondante : les candidates sont l'intersection, pour chaque mot de la
+    requête, des lignes des mots du dictionnaire qui le contiennent. Seules ces
+    lignes sont ensuite vérifiées par str.contains.
+    """
+
+    def __init__(self, n_rows, terms, postings, doc_freq):
+        self.n_rows = n_rows
+        self._terms = terms           # liste triée, ou fonction qui la fournit (décodage différé)
+        self._postings = postings     # numéro de mot -> identifiants de lignes (uint32 triés)
+        self.doc_freq = doc_freq      # nombre de lignes par mot
+        self.corrupted = False        # fichier d'index altéré : le moteur reconstruit l'index
+        self._joined = None
+        self._starts = None
+
+    @classmethod
+    def build(cls, search_text):
+        """Découpe search_text en mots et construit les listes de lignes de chaque mot"""
+        search_text = search_text.astype(str).reset_index(drop=True)
+        tokens = search_text.str.findall(TOKEN_PATTERN.pattern).explode().dropna()
+        pairs = pd.DataFrame({"term": tokens.to_numpy(dtype=object),
+                              "row": np.asarray(tokens.index, dtype=np.uint32)}).drop_duplicates()
+        codes, terms = pd.factorize(pairs["term"], sort=True)
+        rows = pairs["row"].to_numpy()
+        order = np.lexsort((rows, codes))
+        flat = rows[order]
+        doc_freq = np.bincount(codes, minlength=len(terms)).astype(np.uint32)
+        return cls._from_flat(len(search_text), list(terms), flat, doc_freq)
+
+    @classmethod
+    def _from_flat(cls, n_rows, terms, flat, doc_freq):
+        return cls(n_rows, terms, _FlatPostings(flat, doc_freq), doc_freq)
+
+    @classmethod
+    def merge(cls, parts):
+        """
+        Index des blocs consécutifs `parts` (construits par build) → index de
+        l'ensemble, identique à celui construit en une fois : dictionnaire trié
+        de l'union des mots, et pour chaque mot, listes des blocs décalées de
+        leur première ligne et mises bout à bout dans l'ordre des blocs
+        """
+        if len(parts) == 1:
+            return parts[0]
+        terms = sorted(set().union(*(part.terms for part in parts)))
+        lookup = np.array(terms, dtype=object)
+        codes, rows = [], []
+        offset = 0
+        for part in parts:
+            # Numéro global de chaque mot du bloc (dictionnaires triés tous deux)
+            global_ids = np.searchsorted(lookup, np.array(part.terms, dtype=object))
+            codes.append(np.repeat(global_ids, part.doc_freq))
+            rows.append(part._postings.flat + np.uint32(offset))
+            offset += part.n_rows
+        codes = np.concatenate(codes)
+        # Tri stable par mot : les lignes de chaque mot restent dans l'ordre des blocs, donc triées
+        order = np.argsort(codes, kind="stable")
+        doc_freq = np.bincount(codes, minlength=len(terms)).astype(np.uint32)
+        return cls._from_flat(offset, terms, np.concatenate(rows)[order], doc_freq)
+
+    @property
+    def terms(self):
+        if callable(self._terms):
+            self._terms = self._terms()
+        return self._terms
+
+    def postings(self, term_id):
+        return self._postings(term_id)
+
+    def matching_terms(self, word):
+        """Numéros des mots du dictionnaire contenant `word`"""
+        if self._joined is None:
+            lengths = np.fromiter((len(term) + 1 for term in self.terms), dtype=np.int64, count=len(self.terms))
+            self._starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+            self._joined = "\n".join(self.terms)
+        positions = np.fromiter((m.start() for m in re.finditer(re.escape(word), self._joined)), dtype=np.int64)
+        return np.unique(np.searchsorted(self._starts, positions, side="right") - 1)
+
+    def candidates(self, query):
+        """
+        Identifiants (triés) des lignes pouvant contenir `query` (en minuscules),
+        ou None si l'index ne permet pas de préfiltrer (expression régulière,
+        requête sans mot ou mots trop fréquents)
+        """
+        if REGEX_CHARS.intersection(query):
+            return None
+        result = None
+        for word in sorted(set(TOKEN_PATTERN.findall(query)), key=len, reverse=True):
+            term_ids = self.matching_terms(word)
+            if len(term_ids) > MAX_TERMS_PER_WORD:
+                continue
+            if len(term_ids) == 0:
+                return np.empty(0, dtype=np.uint32)
+            rows = np.unique(np.concatenate([self.postings(i) for i in term_ids]))
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result
@@ -0,0 +1,122 @@
+"""
+Normalisation des libellés pilotée par un fichier de règles déclaratif
+(normalization_rules.json).
+
+Chaque règle associe un motif, un remplacement et une portée ("valeurs" pour
+clean_value, "autres" pour les colonnes listées dans la portée). Les règles
+d'une portée sont compilées une fois en une seule expression régulière
+(alternative de groupes) avec une table de correspondance groupe → remplacement :
+chaque valeur est normalisée en un seul passage de gauche à droite. Une règle
+s'applique donc au texte d'origine et non au résultat des règles précédentes ;
+les règles qui se chaînaient (parenthèse orpheline après « Autres ») sont
+fusionnées dans le fichier.
+
+Les catégories (SNDS, HDH, Autres) sont détectées de la même façon : une seule
+recherche, la catégorie la plus prioritaire (ordre du fichier) l'emporte.
+"""
+import json
+import os
+import re
+
+RULES_FILE = os.environ.get(
+    "HDH_NORMALIZATION_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "normalization_rules.json")
+)
+
+# \1, \g<1> ou \g<nom> dans un remplacement
+_GROUP_REFERENCE = re.compile(r"\\(\d+)|\\g<(\w+)>")
+
+
+def _combine(patterns):
+    """
+    Alternative des motifs, chacun dans un groupe englobant ; retourne
+    (regex, numéro du groupe englobant de chaque motif)
+    """
+    parts, offsets = [], []
+    group = 1
+    for pattern in patterns:
+        offsets.append(group)
+        parts.append(f"({pattern})")
+        group += 1 + re.compile(pattern).groups
+    return re.compile("|".join(parts), re.IGNORECASE), offsets
+
+
+def _shift_references(replacement, offset):
+    """Renumérote les références de groupes d'un remplacement dans l'expression combinée"""
+    def shift(match):
+        name = match.group(1) or match.group(2)
+        return f"\\g<{offset + int(name)}>" if name.isdigit() else match.group(0)
+    return _GROUP_REFERENCE.sub(shift, replacement)
+
+
+class RuleSet:
+    """Règles d'une portée compilées en une expression et une table de remplacements"""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.regex, offsets = _combine([rule["pattern"] for rule in rules])
+        # Groupe englobant (dernier groupe fermé, m.lastindex) -> remplacement
+        self.dispatch = {}
+        for rule, offset in zip(rules, offsets):
+            replacement = rule["replacement"]
+            if _GROUP_REFERENCE.search(replacement):
+                template = _shift_references(replacement, offset)
+                self.dispatch[offset] = lambda m, template=template: m.expand(template)
+            else:
+                self.dispatch[offset] = lambda m, replacement=replacement: replacement
+
+    def _replace(self, match):
+        return self.dispatch[match.lastindex](match)
+
+    def apply(self, text):
+        return self.regex.sub(self._replace, text) if self.rules else text
+
+
+class NormalizationRules:
+    """Règles de normalisation par portée et motifs de détection des catégories"""
+
+    def __init__(self, config):
+        self.scopes = config.get("scopes", {})
+        by_scope = {}
+        for rule in config.get("rules", []):
+            by_scope.setdefault(rule["scope"], []).append(rule)
+        self.rule_sets = {scope: RuleSet(rules) for scope, rules in by_scope.items()}
+
+        self.categories = [category["name"] for category in config.get("categories", [])]
+        self.category_regex, offsets = _combine([category["pattern"] for category in config.get("categories", [])])
+        self._category_of_group = dict(zip(offsets, range(len(offsets))))
+
+    @classmethod
+    def load(cls, path=RULES_FILE):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def apply(self, scope, text):
+        rule_set = self.rule_sets.get(scope)
+        return rule_set.apply(text) if rule_set is not None else text
+
+    def columns(self, scope):
+        """Colonnes du jeu de données normalisées par les règles d'une portée"""
+        return self.scopes.get(scope, {}).get("columns", [])
+
+    def category(self, text):
+        """Catégorie la plus prioritaire mentionnée dans le texte (None si aucune)"""
+        best = None
+        for match in self.category_regex.finditer(text):
+            rank = self._category_of_group[match.lastindex]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        return self.categories[best] if best is not None else None
+
+
+_rules = None
+
+
+def get_rules():
+    """Règles chargées et compilées une fois par processus"""
+    global _rules
+    if _rules is None:
+        _rules = NormalizationRules.load()
+    return _rules
@@ -0,0 +1,361 @@
+"""
+Recherches enregistrées : spécification de filtres canonique et ensemble des
+projets correspondants, matérialisé et maintenu d'une version à l'autre.
+
+L'ensemble de résultats est conservé sous forme de `Référence` (stables d'une
+version à l'autre). Quand le jeu de données change, seuls les projets ajoutés
+ou modifiés depuis la version évaluée (voir hdh_changes.py) repassent dans le
+plan de requête ; les projets supprimés ou modifiés sortent de l'ensemble. Avec
+les pages détaillées (HDH_DETAILS), la recherche texte les consulte aussi : la
+génération de l'index des pages évaluée est conservée, et les projets dont la
+page a changé depuis repassent également dans le plan. Les
+références vues lors de la dernière ouverture permettent de signaler les
+nouveaux résultats ; leur nombre est enregistré avec la recherche, si bien que
+la barre latérale ne fait que le lire. Les recherches en retard sur la version
+du moteur sont réévaluées une fois par version, en arrière-plan.
+
+Le répertoire peut être partagé par plusieurs processus (workers attachés aux
+instantanés) : chaque modification relit index.json sous un verrou exclusif
+(fcntl.flock) et n'y remplace que sa propre recherche, et chaque lecture
+recharge l'index dès qu'un autre processus l'a réécrit.
+
+Organisation du répertoire (.cache/saved_searches) :
+    index.json          nom -> spécification, version évaluée, dates
+    <clé>.npz           références correspondantes et références déjà vues
+    .lock               verrou des modifications entre processus
+"""
+import contextlib
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus (un seul worker)
+    fcntl = None
+
+import hdh_changes
+import hdh_engine
+
+DEFAULT_DIR = os.path.join(
+    os.environ.get("HDH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")),
+    "saved_searches"
+)
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = ".lock"
+
+logger = logging.getLogger(__name__)
+
+# Critères globaux (top-k sur tout le corpus) : pas de réévaluation incrémentale possible
+GLOBAL_CRITERIA = ["semantic_query"]
+
+
+def canonical_spec(spec):
+    """
+    Spécification canonique : critères vides ou "TOUT" retirés, listes triées ;
+    deux combinaisons de filtres équivalentes donnent la même spécification
+    """
+    canonical = {}
+    for key, value in spec.items():
+        if key == "date_range":
+            if value and any(value):
+                canonical[key] = [bound or None for bound in value]
+        elif isinstance(value, (list, tuple, set)):
+            values = sorted({str(v) for v in value} - {"TOUT"})
+            if values:
+                canonical[key] = values
+        elif isinstance(value, str):
+            if value.strip() and value != "TOUT":
+                canonical[key] = value
+        elif value is not None:
+            canonical[key] = value
+    return canonical
+
+
+def spec_key(spec):
+    return json.dumps(canonical_spec(spec), sort_keys=True, ensure_ascii=False)
+
+
+def _file_key(name):
+    return hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
+
+
+class SavedSearch:
+    """Recherche enregistrée ; `references` : projets correspondants à la version `version`"""
+
+    def __init__(self, name, spec, version=None, references=None, seen=None, created_at=None, viewed_at=None,
+                 new_count=None, details_version=None):
+        self.name = name
+        self.spec = canonical_spec(spec)
+        self.version = version
+        self.details_version = details_version  # Génération de l'index des pages évaluée (recherche texte)
+        self.references = references if references is not None else np.empty(0, dtype=str)
+        self.seen = seen if seen is not None else np.empty(0, dtype=str)
+        self.created_at = created_at or time.time()
+        self.viewed_at = viewed_at
+        self.new_count = len(self.new_references()) if new_count is None else new_count
+
+    def metadata(self):
+        return {"spec": self.spec, "version": self.version, "details_version": self.details_version,
+                "created_at": self.created_at,
+                "viewed_at": self.viewed_at, "new_count": self.new_count, "file": _file_key(self.name)}
+
+    def new_references(self):
+        """Références correspondantes non vues lors de la dernière ouverture"""
+        return self.references[~np.isin(self.references, self.seen)]
+
+
+def _detail_index(search, engine):
+    """Index des pages détaillées consulté par la recherche texte de `search`, ou None"""
+    if "query_global" not in search.spec or not hdh_engine.details_enabled():
+        return None
+    return engine.detail_index()
+
+
+def is_current(search, engine):
+    """
+    True si l'ensemble de résultats de `search` est évalué pour la version de
+    `engine` (et pour l'état de l'index des pages détaillées qu'elle consulte)
+    """
+    details = _detail_index(search, engine)
+    return (search.version == engine.manifest().version
+            and (details is None or search.details_version == details.generation))
+
+
+def evaluate(search, engine):
+    """
+    Met à jour l'ensemble de résultats de `search` pour la version de `engine` :
+    réévaluation des seuls projets ajoutés ou modifiés depuis la version évaluée
+    (et de ceux dont la page détaillée a changé), ou évaluation complète si cette
+    version n'est plus dans l'historique
+    """
+    manifest = engine.manifest()
+    if is_current(search, engine):
+        return False
+    details = _detail_index(search, engine)
+    # Génération lue avant l'évaluation : une page arrivée pendant sera reprise la fois suivante
+    details_version = details.generation if details is not None else None
+
+    previous = None
+    if search.version is not None and not any(key in search.spec for key in GLOBAL_CRITERIA) \
+            and (details is None or search.details_version is not None):
+        previous = hdh_changes.get_feed().get(search.version)
+
+    if previous is None:
+        matched = engine.plan(**search.spec).row_ids()
+        references = np.unique(manifest.references[matched])
+    else:
+        changes = hdh_changes.diff(previous, manifest)
+        changed = np.union1d(changes["modified"], details.changed_since(search.details_version)) \
+            if details is not None else changes["modified"]
+        candidates = np.union1d(changes["added"], changed)
+        matched = engine.plan(**search.spec).row_ids(candidates) if len(candidates) else candidates
+        stale = np.concatenate([changes["removed"], manifest.references[changed]])
+        kept = search.references[~np.isin(search.references, stale)]
+        references = np.union1d(kept, manifest.references[matched])
+
+    search.references = references.astype(str)
+    search.version = manifest.version
+    search.details_version = details_version
+    return True
+
+
+def row_ids(search, engine):
+    """Identifiants de lignes (version de `engine`) des projets de l'ensemble de résultats"""
+    positions, ids = engine.manifest().lookup(search.references)
+    return np.sort(ids[positions[positions >= 0]])
+
+
+class SavedSearchStore:
+    """Recherches enregistrées d'un répertoire (partagées par toutes les sessions)"""
+
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+        self._searches = None
+        self._signature = None
+        self._lock = threading.RLock()
+        self._refresher = None
+
+    # ==================== PERSISTANCE ====================
+    def _index_signature(self):
+        # index.json est remplacé (os.replace) à chaque écriture : nouvel inode
+        try:
+            stat = os.stat(os.path.join(self.directory, INDEX_FILENAME))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        """Recherches du répertoire, relues si un autre processus a réécrit l'index"""
+        signature = self._index_signature()
+        if self._searches is not None and signature == self._signature:
+            return self._searches
+        index = {}
+        if signature is not None:
+            try:
+                with open(os.path.join(self.directory, INDEX_FILENAME), encoding="utf-8") as f:
+                    index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                pass
+        previous = self._searches or {}
+        searches = {}
+        for name, meta in index.items():
+            if name in previous and previous[name].metadata() == meta:
+                searches[name] = previous[name]  # Inchangée : ensemble déjà en mémoire
+                continue
+            references = seen = None
+            try:
+                with np.load(os.path.join(self.directory, f"{meta['file']}.npz")) as data:
+                    references, seen = data["references"], data["seen"]
+            except (FileNotFoundError, ValueError, KeyError):
+                meta = dict(meta, version=None)  # Ensemble perdu : réévaluation complète
+            searches[name] = SavedSearch(name, meta["spec"], meta["version"], references, seen,
+                                         meta.get("created_at"), meta.get("viewed_at"),
+                                         meta.get("new_count") if references is not None else None,
+                                         meta.get("details_version"))
+        self._searches, self._signature = searches, signature
+        return self._searches
+
+    @contextlib.contextmanager
+    def _modifying(self):
+        """
+        Lecture-modification-écriture de l'index : verrou du processus et verrou
+        exclusif du répertoire, index relu pour ne pas écraser les recherches
+        enregistrées entre-temps par un autre processus
+        """
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, LOCK_FILENAME), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)  # Libéré à la fermeture du fichier
+                yield self._load()
+
+    def _write(self, search=None):
+        """Écrit l'ensemble de `search` puis l'index (appelé dans _modifying)"""
+        if search is not None:
+            search.new_count = len(search.new_references())
+            path = os.path.join(self.directory, f"{_file_key(search.name)}.npz")
+            tmp_path = os.path.join(self.directory, f".tmp{os.getpid()}.npz")
+            np.savez(tmp_path, references=search.references, seen=search.seen)
+            os.replace(tmp_path, path)
+        index = {name: s.metadata() for name, s in self._searches.items()}
+        path = os.path.join(self.directory, INDEX_FILENAME)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        self._signature = self._index_signature()
+
+    # ==================== OPÉRATIONS ====================
+    def names(self):
+        with self._lock:
+            return sorted(self._load())
+
+    def get(self, name):
+        with self._lock:
+            return self._load().get(name)
+
+    def find(self, spec):
+        """Nom d'une recherche enregistrée de même spécification, ou None"""
+        key = spec_key(spec)
+        with self._lock:
+            return next((name for name, s in self._load().items() if spec_key(s.spec) == key), None)
+
+    def save(self, name, spec, engine):
+        """Enregistre (ou remplace) une recherche ; ses résultats actuels sont considérés comme vus"""
+        search = SavedSearch(name, spec)
+        evaluate(search, engine)
+        search.seen = search.references
+        search.viewed_at = time.time()
+        with self._modifying() as searches:
+            searches[name] = search
+            self._write(search)
+        return search
+
+    def delete(self, name):
+        with self._modifying() as searches:
+            if searches.pop(name, None) is None:
+                return
+            try:
+                os.remove(os.path.join(self.directory, f"{_file_key(name)}.npz"))
+            except OSError:
+                pass
+            self._write()
+
+    def refresh(self, name, engine):
+        """
+        Recherche à jour pour la version de `engine` (réévaluation incrémentale si
+        nécessaire) ; l'évaluation se fait hors des verrous, sur une copie, et
+        n'est enregistrée que si la recherche n'a pas changé entre-temps
+        """
+        search = self.get(name)
+        if search is None or is_current(search, engine):
+            return search
+        updated = copy.copy(search)
+        evaluate(updated, engine)
+        with self._modifying() as searches:
+            current = searches.get(name)
+            if current is None or current.spec != updated.spec or current.version != search.version:
+                return current  # Supprimée, remplacée ou déjà réévaluée par un autre processus
+            current.references, current.version = updated.references, updated.version
+            current.details_version = updated.details_version
+            self._write(current)
+            return current
+
+    def refresh_all(self, engine):
+        """Réévalue les recherches en retard sur la version de `engine`"""
+        for name in self.names():
+            search = self.get(name)
+            if search is not None and not is_current(search, engine):
+                try:
+                    self.refresh(name, engine)
+                except Exception as e:
+                    logger.warning(f"Recherche enregistrée « {name} » non réévaluée : {e}", exc_info=True)
+
+    def new_counts(self, engine):
+        """
+        Nombre de nouveaux résultats non vus de chaque recherche enregistrée, tel
+        qu'enregistré (lecture seule) ; les recherches en retard sur la version
+        de `engine` sont réévaluées en arrière-plan et leur nombre mis à jour
+        pour les réexécutions suivantes
+        """
+        with self._lock:
+            searches = self._load()
+            counts = {name: searches[name].new_count for name in sorted(searches)}
+            stale = any(not is_current(search, engine) for search in searches.values())
+            if stale and (self._refresher is None or not self._refresher.is_alive()):
+                # Un seul thread par processus ; entre processus, la première
+                # réévaluation enregistrée rend les suivantes inutiles
+                self._refresher = threading.Thread(target=self.refresh_all, args=(engine,), daemon=True,
+                                                   name="hdh-saved-refresh")
+                self._refresher.start()
+        return counts
+
+    def mark_viewed(self, name):
+        """Les résultats actuels deviennent les résultats vus"""
+        with self._modifying() as searches:
+            search = searches.get(name)
+            if search is None:
+                return
+            search.seen = search.references
+            search.viewed_at = time.time()
+            self._write(search)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Recherches enregistrées partagées du processus"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SavedSearchStore()
+        return _store
@@ -0,0 +1,165 @@
+"""
+Recherche sémantique locale sur les descriptions de projets (LSA).
+
+Les textes (titre, finalité, objectifs) sont vectorisés par TF-IDF puis
+réduits par SVD tronquée en vecteurs float32 normalisés ; la similarité cosinus
+devient un simple produit matriciel NumPy. Tout s'exécute sur CPU, sans accès
+réseau. Les vecteurs sont enregistrés sur disque (une fois par contenu du jeu de
+données) et rechargés en projection mémoire.
+
+Sur un corpus trop petit ou sans vocabulaire exploitable (textes vides, mots
+vides seulement), aucun index n'est construit : le moteur se replie sur une
+recherche lexicale des mots de la requête (voir lexical_terms).
+"""
+import hashlib
+import logging
+import os
+import pickle
+import re
+import unicodedata
+
+import numpy as np
+
+SEMANTIC_COLUMNS = ["title", "Finalité de l'étude", "Objectifs poursuivis"]
+N_COMPONENTS = 256
+# En dessous, le filtrage des mots rares (min_df) et fréquents (max_df) viderait le vocabulaire
+SMALL_CORPUS = 50
+
+logger = logging.getLogger(__name__)
+DEFAULT_CACHE_DIR = os.environ.get(
+    "HDH_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+
+# Mots vides français, sans accents comme les textes après strip_accents
+# (le vectoriseur ne fournit qu'une liste anglaise)
+STOP_WORDS = [
+    "a", "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "elle", "en", "et", "eux",
+    "il", "je", "la", "le", "les", "leur", "lui", "ma", "mais", "me", "meme", "mes", "moi", "mon",
+    "ne", "nos", "notre", "nous", "on", "ou", "par", "pas", "pour", "qu", "que", "qui", "sa", "se",
+    "ses", "son", "sur", "ta", "te", "tes", "toi", "ton", "tu", "un", "une", "vos", "votre", "vous",
+    "c", "d", "j", "l", "m", "n", "s", "t", "y", "ete", "etre", "est", "sont", "chez", "entre",
+    "afin", "selon", "lors", "cette", "cet", "via", "non",
+]
+
+
+def project_texts(df):
+    """Texte décrivant chaque projet (colonnes absentes ignorées)"""
+    columns = [col for col in SEMANTIC_COLUMNS if col in df.columns]
+    texts = df[columns].astype(str).replace({"nan": "", "<NA>": "", "None": ""})
+    return texts.apply(lambda x: " ".join(x), axis=1).tolist()
+
+
+def lexical_terms(text):
+    """Mots significatifs d'une requête (hors mots vides), pour la recherche lexicale de repli"""
+    stripped = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    return [word for word, plain in zip(re.findall(r"\w+", text.lower()), re.findall(r"\w+", stripped))
+            if plain not in STOP_WORDS]
+
+
+def corpus_fingerprint(texts):
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class SemanticIndex:
+    """Vecteurs LSA normalisés (float32, une ligne par projet) et modèle de projection des requêtes"""
+
+    def __init__(self, vectorizer, svd, vectors):
+        self.vectorizer = vectorizer
+        self.svd = svd
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, texts, n_components=N_COMPONENTS):
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        small = len(texts) < SMALL_CORPUS
+        vectorizer = TfidfVectorizer(strip_accents="unicode", lowercase=True, stop_words=STOP_WORDS,
+                                     min_df=1 if small else 2, max_df=1.0 if small else 0.5,
+                                     sublinear_tf=True, ngram_range=(1, 2),
+                                     max_features=100000, dtype=np.float32)
+        tfidf = vectorizer.fit_transform(texts)  # ValueError si le vocabulaire est vide
+        n_components = max(1, min(n_components, tfidf.shape[1] - 1, tfidf.shape[0] - 1))
+        svd = TruncatedSVD(n_components=n_components, random_state=0)
+        vectors = svd.fit_transform(tfidf).astype(np.float32)
+        return cls(vectorizer, svd, _normalize(vectors))
+
+    # ==================== PERSISTANCE ====================
+    @staticmethod
+    def paths(cache_dir, fingerprint):
+        base = os.path.join(cache_dir, f"semantic-{fingerprint}")
+        return base + ".npy", base + ".model.pkl"
+
+    def save(self, cache_dir, fingerprint):
+        os.makedirs(cache_dir, exist_ok=True)
+        vectors_path, model_path = self.paths(cache_dir, fingerprint)
+        for path, write in [(vectors_path, lambda f: np.save(f, self.vectors)),
+                            (model_path, lambda f: pickle.dump((self.vectorizer, self.svd), f))]:
+            tmp_path = f"{path}.tmp{os.getpid()}"
+            with open(tmp_path, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, cache_dir, fingerprint):
+        vectors_path, model_path = cls.paths(cache_dir, fingerprint)
+        if not (os.path.exists(vectors_path) and os.path.exists(model_path)):
+            return None
+        # Fichier produit localement par save() : pickle de confiance
+        with open(model_path, "rb") as f:
+            vectorizer, svd = pickle.load(f)
+        return cls(vectorizer, svd, np.load(vectors_path, mmap_mode="r"))
+
+    @classmethod
+    def load_or_build(cls, df, cache_dir=DEFAULT_CACHE_DIR):
+        """Index du jeu de données, ou None si le corpus ne permet pas d'en construire un"""
+        texts = project_texts(df)
+        fingerprint = corpus_fingerprint(texts)
+        index = cls.load(cache_dir, fingerprint)
+        if index is None:
+            try:
+                index = cls.build(texts)
+            except ValueError as e:
+                logger.warning("Index sémantique indisponible (%d projets) : %s", len(texts), e)
+                return None
+            try:
+                index.save(cache_dir, fingerprint)
+            except OSError:
+                pass  # Répertoire en lecture seule : index gardé en mémoire
+        return index
+
+    # ==================== REQUÊTES ====================
+    def embed(self, text):
+        vector = self.svd.transform(self.vectorizer.transform([text])).astype(np.float32)
+        return _normalize(vector)[0]
+
+    def top_k(self, vector, k=10, exclude=None, min_score=0.0):
+        """(identifiants de lignes, scores cosinus) des k projets les plus proches, par score décroissant"""
+        scores = self.vectors @ vector
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        candidates = candidates[scores[candidates] > min_score]
+        return candidates, scores[candidates]
+
+    def query(self, text, k=10, min_score=0.0):
+        return self.top_k(self.embed(text), k, min_score=min_score)
+
+    def similar(self, row_id, k=10):
+        """Projets les plus proches d'un projet donné (lui-même exclu)"""
+        return self.top_k(np.asarray(self.vectors[row_id]), k, exclude=row_id)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
@@ -0,0 +1,79 @@
+"""
+Cache des résultats de recherche par session.
+
+Chaque session ne conserve que sa spécification de filtres ; les résultats sont
+gardés ici sous forme d'identifiants de lignes (tableau uint32) et non de
+DataFrame. Les entrées des sessions inactives sont évincées après un délai
+configurable, puis reconstruites à la demande à partir de la spécification.
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_IDLE_TIMEOUT = float(os.environ.get("HDH_SESSION_IDLE_TIMEOUT", 1800))
+
+
+class ResultCache:
+    """Identifiants de lignes des derniers résultats de chaque session"""
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, sweep_interval=60.0):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        # session -> (spécification, version du jeu de données, identifiants, dernier accès)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    @staticmethod
+    def to_row_ids(index):
+        """Index (positions dans le jeu de données) → tableau compact uint32"""
+        return np.asarray(index, dtype=np.uint32)
+
+    def store(self, session_key, spec, version, index):
+        row_ids = self.to_row_ids(index)
+        with self._lock:
+            self._entries[session_key] = (spec, version, row_ids, time.monotonic())
+        self._maybe_sweep()
+        return row_ids
+
+    def get(self, session_key, spec, version, rebuild):
+        """
+        Identifiants de lignes de la session ; `rebuild()` recalcule l'index des
+        résultats si l'entrée a été évincée, ou si la spécification ou la version
+        du jeu de données ont changé
+        """
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is not None and entry[0] == spec and entry[1] == version:
+                row_ids = entry[2]
+                self._entries[session_key] = (spec, version, row_ids, time.monotonic())
+            else:
+                row_ids = None
+        if row_ids is None:
+            row_ids = self.store(session_key, spec, version, rebuild())
+        self._maybe_sweep()
+        return row_ids
+
+    def discard(self, session_key):
+        with self._lock:
+            self._entries.pop(session_key, None)
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._swept_at < self.sweep_interval:
+            return
+        with self._lock:
+            self._swept_at = now
+            idle = [key for key, entry in self._entries.items() if now - entry[3] > self.idle_timeout]
+            for key in idle:
+                del self._entries[key]
+
+    def stats(self):
+        """Nombre de sessions en cache et mémoire occupée (octets, estimation)"""
+        with self._lock:
+            entries = list(self._entries.values())
+        memory = sum(row_ids.nbytes + sys.getsizeof(spec) for spec, _, row_ids, _ in entries)
+        return {"sessions": len(entries), "memory_bytes": memory}
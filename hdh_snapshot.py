@@ -0,0 +1,263 @@
+"""
+Instantané du jeu de données enrichi, partagé entre processus via des fichiers
+Arrow IPC projetés en mémoire (mmap).
+
+Un seul processus constructeur scrape HDH, enrichit les données et publie une
+nouvelle version ; les workers (Streamlit ou API) s'y attachent sans copie et
+basculent atomiquement sur la version suivante dès qu'elle est publiée.
+
+    # Processus constructeur (republie toutes les heures)
+    python hdh_snapshot.py --dir /dev/shm/hdh --interval 3600
+
+    # Workers
+    HDH_SNAPSHOT_DIR=/dev/shm/hdh streamlit run hdh_code_web.py
+    HDH_SNAPSHOT_DIR=/dev/shm/hdh uvicorn hdh_api:app --workers 8
+
+Placer le répertoire dans /dev/shm garde les pages en mémoire partagée ; un
+répertoire disque classique fonctionne aussi (cache de pages du noyau).
+
+Organisation du répertoire :
+    dataset-00000042.arrow   colonnes enrichies (Arrow IPC non compressé)
+    index-00000042.hdx       index du texte, des sources et des dates (voir hdh_index_file.py)
+    CURRENT                  numéro de la version publiée (compteur)
+    manifest-*.npz           historique des versions (voir hdh_changes.py)
+
+Le constructeur enregistre le manifeste de chaque version et inscrit son numéro
+et son empreinte dans les métadonnées du fichier de données : un worker relit
+ce manifeste au lieu de recalculer les empreintes de tout le jeu de données.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+import hdh_changes
+import hdh_engine
+import hdh_index_file
+
+CURRENT_FILENAME = "CURRENT"
+KEEP_VERSIONS = 3
+
+
+def dataset_path(directory, version):
+    return os.path.join(directory, f"dataset-{version:08d}.arrow")
+
+
+def index_path(directory, version):
+    return os.path.join(directory, f"index-{version:08d}.hdx")
+
+
+def read_current_version(directory):
+    """Numéro de la version publiée, ou None si rien n'a encore été publié"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILENAME), encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _to_arrow_table(df):
+    """
+    Convertit le DataFrame enrichi en table Arrow ; les colonnes objet de l'export
+    Excel mélangent parfois nombres et textes, elles sont donc stockées en texte
+    """
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+# ==================== PUBLICATION ====================
+def publish_snapshot(engine, directory):
+    """
+    Publie le moteur comme nouvelle version du répertoire et retourne son numéro.
+    Le fichier de données est écrit entièrement avant la bascule de CURRENT,
+    si bien qu'un worker ne voit jamais une version partielle.
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = (read_current_version(directory) or 0) + 1
+    # Manifeste de la version (historique des changements lu par les workers)
+    manifest = hdh_changes.ChangeFeed(directory).record(engine.df)
+
+    table = _to_arrow_table(engine.df)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"hdh_options"] = json.dumps(engine.options, ensure_ascii=False, default=str).encode("utf-8")
+    metadata[b"hdh_version"] = str(version).encode("ascii")
+    metadata[b"hdh_manifest"] = json.dumps({"version": manifest.version,
+                                            "fingerprint": manifest.fingerprint}).encode("ascii")
+    table = table.replace_schema_metadata(metadata)
+
+    path = dataset_path(directory, version)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+    # Index sérialisés : les workers les projettent au lieu de les reconstruire
+    hdh_index_file.write_indexes(index_path(directory, version), engine)
+
+    _write_atomic(os.path.join(directory, CURRENT_FILENAME), str(version).encode("ascii"))
+    _remove_old_versions(directory, version)
+    return version
+
+
+def _remove_old_versions(directory, current_version):
+    # Les workers encore attachés à une ancienne version gardent leur projection
+    # valide après la suppression du fichier (sémantique POSIX de unlink)
+    for name in os.listdir(directory):
+        for prefix, extension in [("dataset-", ".arrow"), ("index-", ".hdx")]:
+            if not (name.startswith(prefix) and name.endswith(extension)):
+                continue
+            try:
+                version = int(name[len(prefix):-len(extension)])
+            except ValueError:
+                continue
+            if version <= current_version - KEEP_VERSIONS:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+
+# ==================== ATTACHEMENT (WORKERS) ====================
+def _arrow_types_mapper(pa_type):
+    # Les textes (l'essentiel du volume) restent dans les tampons projetés ;
+    # dates et nombres sont convertis en types numpy habituels
+    if pa.types.is_string(pa_type) or pa.types.is_large_string(pa_type):
+        return pd.ArrowDtype(pa_type)
+    return None
+
+
+def load_snapshot(directory, version):
+    """
+    Projette une version publiée en mémoire et retourne un SearchEngine.
+    Les colonnes texte restent adossées aux tampons Arrow projetés
+    (pd.ArrowDtype), sans copie ni ré-enrichissement ; les index sont relus
+    du fichier d'index de la version (reconstruits s'il est absent ou invalide)
+    et le manifeste de l'historique, d'après les métadonnées.
+    """
+    source = pa.memory_map(dataset_path(directory, version), "r")
+    table = pa.ipc.open_file(source).read_all()
+    metadata = table.schema.metadata or {}
+    options = json.loads(metadata.get(b"hdh_options", b"{}").decode("utf-8"))
+    df = table.to_pandas(types_mapper=_arrow_types_mapper)
+    try:
+        indexes = hdh_index_file.load_indexes(index_path(directory, version))
+        if indexes["text"].n_rows != len(df):
+            raise hdh_index_file.IndexFormatError(f"{len(df)} lignes attendues, {indexes['text'].n_rows} indexées")
+    except (OSError, hdh_index_file.IndexFormatError) as e:
+        hdh_engine.logger.warning(f"Index de la version {version} reconstruits : {e}")
+        indexes = None
+    return hdh_engine.SearchEngine(df, options, version=version, indexes=indexes,
+                                   manifest=_published_manifest(metadata, version))
+
+
+def _published_manifest(metadata, version):
+    """Manifeste inscrit dans les métadonnées de la version, ou None (journalisé) s'il est introuvable"""
+    try:
+        published = json.loads(metadata[b"hdh_manifest"].decode("ascii"))
+    except (KeyError, ValueError):
+        hdh_engine.logger.error(f"Version {version} publiée sans manifeste")
+        return None
+    manifest = hdh_changes.get_feed().get(published["version"])
+    if manifest is None or manifest.fingerprint != published["fingerprint"]:
+        hdh_engine.logger.error(f"Manifeste {published['version']} de la version {version} introuvable "
+                                f"dans l'historique ({hdh_changes.get_feed().directory})")
+        return None
+    return manifest
+
+
+class SnapshotReader:
+    """
+    Suit le fichier CURRENT d'un répertoire d'instantanés et bascule sur la
+    nouvelle version dès sa publication (au plus une vérification par `poll_interval`)
+    """
+
+    def __init__(self, directory, poll_interval=1.0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._engine = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        now = time.monotonic()
+        engine = self._engine
+        if engine is not None and now - self._checked_at < self.poll_interval:
+            return engine
+
+        with self._lock:
+            self._checked_at = now
+            version = read_current_version(self.directory)
+            if version is None:
+                if self._engine is None:
+                    # Rien n'est encore publié : moteur vide plutôt qu'un scraping par worker
+                    return hdh_engine.SearchEngine(pd.DataFrame(), {}, version=0)
+                return self._engine
+            if self._engine is None or self._engine.version != version:
+                # Simple affectation : les requêtes en cours gardent l'ancienne version
+                self._engine = load_snapshot(self.directory, version)
+            return self._engine
+
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def attach(directory):
+    """Lecteur partagé (un par répertoire et par processus)"""
+    with _readers_lock:
+        reader = _readers.get(directory)
+        if reader is None:
+            reader = _readers[directory] = SnapshotReader(directory)
+        return reader
+
+
+# ==================== PROCESSUS CONSTRUCTEUR ====================
+def main():
+    parser = argparse.ArgumentParser(description="Publie le jeu de données HDH enrichi pour les workers")
+    parser.add_argument("--dir", required=True, help="Répertoire des instantanés (ex. /dev/shm/hdh)")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="Republier toutes les N secondes (0 : une seule publication)")
+    args = parser.parse_args()
+
+    # Le constructeur possède le cache des pages détaillées (lu par les workers) :
+    # exploration au premier plan, terminée avant chaque publication
+    cache = None
+    if hdh_engine.details_enabled():
+        import hdh_details
+        cache = hdh_details.PageCache(os.path.join(args.dir, hdh_details.SNAPSHOT_SUBDIR))
+
+    while True:
+        engine = hdh_engine.SearchEngine.from_source(crawl=False, text_index=True)
+        if engine.empty:
+            print("Aucune donnée chargée, version précédente conservée")
+        else:
+            if cache is not None:
+                stats = hdh_details.DetailCrawler(cache, notify=hdh_engine.log_notify).crawl(
+                    engine.df["Référence"].dropna())
+                print(f"{len(cache.records)} pages détaillées en cache ({cache.path}) ; {stats}")
+            version = publish_snapshot(engine, args.dir)
+            print(f"Version {version} publiée ({len(engine.df)} projets)")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()